@@ -29,19 +29,18 @@ def create_app():
         return send_from_directory(HLS_ROOT, filename)
     
     # ─── Rate limiting ───
-    from .security import configure_rate_limiting
+    from .security import configure_rate_limiting, configure_session_bypass
     configure_rate_limiting(app)
+    configure_session_bypass(app)
 
     # ─── CSRF protection ───
     csrf.init_app(app)
     logger.info("CSRF protection enabled (1 h token lifetime)")
 
     # ─── Domain-controller ───
-    db_path = app.config.get("DB_PATH")
-    if not db_path:
-        raise RuntimeError("DB_PATH is missing – add to environment.")
-    app.ctrl = Controller(db_path)  # type: ignore
-    logger.info("Controller init: %s", db_path)
+    app.ctrl = Controller.from_settings(app.config)  # type: ignore
+    logger.info("Controller init: %s (group commit %s ms)",
+                app.config.get("DB_PATH"), app.config.get("DB_GROUP_COMMIT_MS", 0))
     
     # ─── Route all ERROR+ logs into DB ───
     try:
@@ -97,6 +96,18 @@ def create_app():
         """
         try:
             app.ctrl.log_message("Server shutting down", "system")  # type: ignore
+            app.ctrl.flush_api_key_usage()  # type: ignore
+            if getattr(app, "mqtt_ingest", None) is not None:
+                app.mqtt_ingest.stop()  # type: ignore[attr-defined]
+            if getattr(app, "ingest", None) is not None:
+                app.ingest.stop(wait=True)  # type: ignore[attr-defined]
+            app.ctrl.flush_compression()  # type: ignore
+            if getattr(app, "ac_thermostat", None) is not None:
+                app.ac_thermostat.stop()  # type: ignore[attr-defined]
+            if getattr(app, "ac_controller", None) is not None:
+                app.ac_controller.commands.stop(wait=True)  # type: ignore[attr-defined]
+            if getattr(app, "ac_session", None) is not None:
+                app.ac_session.stop()  # type: ignore[attr-defined]
         except Exception as e:
             logging.getLogger(__name__).warning("Shutdown log_message failed: %s", e)
         try:
@@ -4,16 +4,26 @@ import os
 import tempfile
 from datetime import datetime
 import pytz
-from flask import Blueprint, request, jsonify, current_app, send_from_directory, render_template
+from flask import Blueprint, request, jsonify, current_app, send_from_directory, render_template, g
 from flask_login import login_required, current_user
-import threading
 from ...core.controller import Controller
 from ...services.ac.thermostat import ACThermostat
 from typing import Any, Dict
 from datetime import timedelta
 from ...extensions import csrf
 from ...security import require_api_key
+from ...services.ingest.readings import VALID_ESP32_LOCATIONS, live_max_age_s, live_readings, parse_reading
 from datetime import timezone
+import json
+
+try:  # optional compact encodings for batch uploads
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
 
 # In-memory state for ESP32 test telemetry (no DB persistence)
 _esp32_test_last: dict[str, Any] = {
@@ -41,18 +51,170 @@ def get_esp32_temphum():
         "API /esp32_temphum for %s by %s",
         date_str, current_user.get_id()
     )
-    data = ctrl.get_esp32_temphum_for_date(date_str, location)
-    return jsonify([
-        {
-            'timestamp': d.timestamp,
-            'temperature': d.temperature,
-            'humidity': d.humidity,
-            'ac_on': getattr(d, 'ac_on', None)
-        }
-        for d in data
-    ])
 
-ac_check_flag = True
+    def _build():
+        return [
+            {
+                'timestamp': d.timestamp,
+                'temperature': d.temperature,
+                'humidity': d.humidity,
+                'ac_on': getattr(d, 'ac_on', None)
+            }
+            for d in ctrl.get_esp32_temphum_for_date(date_str, location)
+        ]
+
+    try:
+        body, etag = ctrl.get_day_response(location, date_str, 'raw', _build)
+    except ValueError:
+        return jsonify([])
+    return _cached_json(body, etag)
+
+
+def _cached_json(body: bytes, etag: str):
+    """JSON response that browsers revalidate with If-None-Match (304 when unchanged)."""
+    resp = current_app.response_class(body, mimetype='application/json')
+    resp.set_etag(etag)
+    resp.headers['Cache-Control'] = 'private, no-cache'
+    return resp.make_conditional(request)
+
+
+def _parse_range_bound(value: str, finland_tz, is_end: bool = False) -> datetime:
+    """Parse 'YYYY-MM-DD' or an ISO datetime; naive values are Helsinki time.
+
+    A bare date used as the end bound includes that whole day.
+    """
+    value = value.strip()
+    if len(value) == 10:
+        day = datetime.fromisoformat(value)
+        if is_end:
+            day += timedelta(days=1)
+        return finland_tz.localize(day)
+    if value.endswith('Z'):
+        value = value[:-1] + '+00:00'
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        dt = finland_tz.localize(dt)
+    return dt
+
+
+@api_bp.route('/esp32_temphum/range', methods=['GET'])
+@login_required
+def get_esp32_temphum_range():
+    """
+    Readings of several locations over a multi-day range.
+    Query: start, end (date or ISO datetime; default last 24 h),
+    locations (comma separated and/or repeated 'location'),
+    and either bucket (seconds) or points (LTTB target, default 1000).
+    since (epoch ms, the previous response's cursor) narrows the range to
+    what is new, so live charts append deltas instead of reloading.
+    """
+    ctrl: Controller = current_app.ctrl  # type: ignore
+    finland_tz = pytz.timezone('Europe/Helsinki')
+
+    locations: list[str] = []
+    for raw in request.args.getlist('locations') + request.args.getlist('location'):
+        for name in raw.split(','):
+            name = name.strip()
+            if name and name not in locations:
+                locations.append(name)
+    if not locations or len(locations) > 10:
+        return jsonify({
+            'ok': False,
+            'error': 'invalid_params',
+            'message': '1-10 locations required',
+        }), 400
+
+    try:
+        now_local = datetime.now(finland_tz)
+        end = request.args.get('end')
+        start = request.args.get('start')
+        end_dt = _parse_range_bound(end, finland_tz, is_end=True) if end else now_local
+        start_dt = _parse_range_bound(start, finland_tz) if start else end_dt - timedelta(hours=24)
+        bucket = request.args.get('bucket', type=int)
+        points = request.args.get('points', type=int)
+        if bucket is None and points is None:
+            points = 1000
+        if points is not None:
+            points = min(points, 5000)
+        since = request.args.get('since', type=int)
+        if since is not None:
+            since_dt = datetime.fromtimestamp(since / 1000.0, finland_tz)
+            if since_dt > start_dt:
+                # Nothing newer than the range end: an empty (valid) window
+                start_dt = min(since_dt, end_dt - timedelta(milliseconds=1))
+
+        def _build():
+            return ctrl.get_esp32_history(
+                locations,
+                int(start_dt.timestamp() * 1000),
+                int(end_dt.timestamp() * 1000),
+                bucket_s=bucket,
+                points=points,
+            )
+
+        logger.info(
+            "API /esp32_temphum/range %s..%s %s by %s",
+            start_dt.isoformat(), end_dt.isoformat(), locations, current_user.get_id()
+        )
+        # One location over one whole local day (the chart modal): cacheable
+        if (since is None and len(locations) == 1 and start and end
+                and len(start.strip()) == 10 and start.strip() == end.strip()):
+            resolution = f"bucket={bucket}" if bucket is not None else f"points={points}"
+            body, etag = ctrl.get_day_response(locations[0], start.strip(), resolution, _build)
+            return _cached_json(body, etag)
+        result = _build()
+    except ValueError as e:
+        return jsonify({
+            'ok': False,
+            'error': 'invalid_params',
+            'message': str(e),
+        }), 400
+
+    return jsonify(result)
+
+# Upper bound of readings accepted in one batch upload
+MAX_BATCH_READINGS = 1000
+
+
+def _current_ac_on(ctrl: Controller) -> bool | None:
+    """Current AC state from the thermostat, falling back to the persisted phase."""
+    try:
+        ac_thermo: ACThermostat | None = getattr(
+            current_app, 'ac_thermostat', None)  # type: ignore
+        ac_on_val: bool | None = bool(
+            ac_thermo.is_on) if ac_thermo is not None else None
+        if ac_on_val is None:
+            # Fallback to persisted DB flag if thermostat not in memory
+            conf = ctrl.get_thermostat_conf()
+            if conf and conf.current_phase in ('on', 'off'):
+                ac_on_val = (conf.current_phase == 'on')
+    except Exception:
+        ac_on_val = None
+    return ac_on_val
+
+
+def _after_ingest(saved: list) -> None:
+    """Push new readings to views and tell the thermostat which locations are fresh.
+
+    Only the newest live reading per location goes out; old or backfilled
+    ones were just stored.
+    """
+    ac_thermo: ACThermostat | None = getattr(
+        current_app, 'ac_thermostat', None)  # type: ignore
+    saved = live_readings(current_app.ctrl, saved, live_max_age_s(ac_thermo))
+    for rec in saved:
+        current_app.sio_handler.emit_to_views('esp32_temphum', {
+            'location': rec.location,
+            'temperature': rec.temperature,
+            'humidity':    rec.humidity,
+            'ac_on':       rec.ac_on
+        })
+
+    if ac_thermo is not None:
+        # Debounced on the thermostat's own loop, so a burst is checked once
+        for rec in saved:
+            ac_thermo.on_reading(rec.location)
+
 
 @api_bp.route('/esp32_temphum', methods=['POST'])
 @require_api_key
@@ -79,9 +241,7 @@ def post_esp32_temphum():
             'message': 'location, temperature_c, humidity_pct required',
         }), 400
 
-    valid_locations = ["Keittiö", "Makuuhuone",
-                       "Tietokonepöytä", "WC", "Parveke", "test"]
-    if location not in valid_locations:
+    if location not in VALID_ESP32_LOCATIONS:
         logger.warning(f"Invalid esp32 location: {location}")
         return jsonify({
             'ok': False,
@@ -90,41 +250,39 @@ def post_esp32_temphum():
         }), 400
 
     ctrl: Controller = current_app.ctrl
-    # Derive current AC state if available
-    try:
-        ac_thermo: ACThermostat | None = getattr(
-            current_app, 'ac_thermostat', None)  # type: ignore
-        ac_on_val: bool | None = bool(
-            ac_thermo.is_on) if ac_thermo is not None else None
-        if ac_on_val is None:
-            # Fallback to persisted DB flag if thermostat not in memory
-            conf = ctrl.get_thermostat_conf()
-            if conf and conf.current_phase in ('on', 'off'):
-                ac_on_val = (conf.current_phase == 'on')
-    except Exception:
-        ac_on_val = None
+    ingest = getattr(current_app, 'ingest', None)
+    if ingest is not None:
+        # Validate + enqueue; the ingest writer persists and broadcasts
+        try:
+            reading = {
+                'location': location,
+                'temperature': float(temp),
+                'humidity': float(hum),
+                'ts_ms': int(datetime.now(timezone.utc).timestamp() * 1000),
+                'ac_on': _current_ac_on(ctrl),
+            }
+        except (TypeError, ValueError):
+            return jsonify({
+                'ok': False,
+                'error': 'invalid_payload',
+                'message': 'temperature_c and humidity_pct must be numbers',
+            }), 400
+        if not ingest.submit(reading):
+            return _overloaded()
+        return jsonify({
+            'ok': True,
+            'queued': True,
+            'received': {
+                'location': location,
+                'temp': round(reading['temperature'], 2),
+                'hum': round(reading['humidity'], 2)
+            },
+        })
 
     saved = ctrl.record_esp32_temphum(
-        location, temp, hum, ac_on=ac_on_val)
-    current_app.sio_handler.emit_to_views('esp32_temphum', {
-        'location': saved.location,
-        'temperature': saved.temperature,
-        'humidity':    saved.humidity,
-        'ac_on':       saved.ac_on
-    })
-    def reset_flag():
-        global ac_check_flag
-        ac_check_flag = True
-        
-    # Trigger immediate thermostat check once per minute at most
-    global ac_check_flag
-    if ac_check_flag:
-        ac_check_flag = False
-        # Wait a second to make sure all sensors have reported
-        threading.Timer(1, ac_thermo.step_on_off_check).start() if ac_thermo else None
-        # Reset flag after 10 seconds
-        threading.Timer(10, reset_flag).start()
-        
+        location, temp, hum, ac_on=_current_ac_on(ctrl))
+    _after_ingest([saved])
+
     return jsonify({
         'ok': True,
         'received': {
@@ -135,6 +293,132 @@ def post_esp32_temphum():
     })
 
 
+def _overloaded():
+    resp = jsonify({
+        'ok': False,
+        'error': 'overloaded',
+        'message': 'Ingest queue is full, retry later',
+    })
+    resp.status_code = 503
+    resp.headers['Retry-After'] = '5'
+    return resp
+
+
+def _decode_batch_body() -> Any:
+    """Decode the request body by Content-Type (JSON, MessagePack or CBOR)."""
+    ctype = (request.mimetype or '').lower()
+    raw = request.get_data(cache=False)
+    if ctype in ('application/msgpack', 'application/x-msgpack', 'application/vnd.msgpack'):
+        if msgpack is None:
+            raise LookupError('MessagePack support not installed')
+        return msgpack.unpackb(raw, raw=False)
+    if ctype == 'application/cbor':
+        if cbor2 is None:
+            raise LookupError('CBOR support not installed')
+        return cbor2.loads(raw)
+    return json.loads(raw or b'null')
+
+
+@api_bp.route('/esp32_temphum/batch', methods=['POST'])
+@require_api_key
+@csrf.exempt
+def post_esp32_temphum_batch():
+    """
+    Many readings in one request, written in a single transaction.
+    Body: array of { location, temperature_c, humidity_pct, ts?, ac_on? }
+    (or { readings: [...] }) as JSON, MessagePack or CBOR by Content-Type.
+    ts is the device-side time: epoch seconds/ms or ISO 8601; defaults to now.
+    Returns per-item results in input order.
+    """
+    try:
+        body = _decode_batch_body()
+    except LookupError as e:
+        return jsonify({'ok': False, 'error': 'unsupported_media_type', 'message': str(e)}), 415
+    except Exception as e:
+        logger.warning("Bad esp32 batch body: %s", e)
+        return jsonify({'ok': False, 'error': 'invalid_payload', 'message': 'Body could not be decoded'}), 400
+
+    items = body.get('readings') if isinstance(body, dict) else body
+    if not isinstance(items, list):
+        return jsonify({'ok': False, 'error': 'invalid_payload', 'message': 'Expected a list of readings'}), 400
+    if len(items) > MAX_BATCH_READINGS:
+        return jsonify({
+            'ok': False,
+            'error': 'too_many_readings',
+            'message': f'At most {MAX_BATCH_READINGS} readings per request',
+        }), 413
+
+    ctrl: Controller = current_app.ctrl
+    now_ms = int(datetime.now(timezone.utc).timestamp() * 1000)
+    results: list[dict] = []
+    accepted: list[dict] = []
+    accepted_idx: list[int] = []
+    for i, item in enumerate(items):
+        try:
+            parsed = parse_reading(item, now_ms)
+        except (ValueError, TypeError) as e:
+            results.append({'index': i, 'ok': False, 'error': 'invalid_payload', 'message': str(e)})
+            continue
+        results.append({'index': i, 'ok': True})
+        accepted.append(parsed)
+        accepted_idx.append(i)
+
+    # Readings taken "now" get the live AC state; older ones come from the event log
+    live_ac = _current_ac_on(ctrl)
+    for r in accepted:
+        if r['ac_on'] is None and now_ms - r['ts_ms'] < 2 * 60 * 1000:
+            r['ac_on'] = live_ac
+
+    ingest = getattr(current_app, 'ingest', None)
+    if ingest is not None:
+        queued = 0
+        for i, r in zip(accepted_idx, accepted):
+            if ingest.submit(r):
+                results[i]['queued'] = True
+                queued += 1
+            else:
+                results[i].update({'ok': False, 'error': 'overloaded', 'message': 'Ingest queue is full'})
+        logger.info("ESP32 batch: %d queued, %d rejected (key %s)",
+                    queued, len(items) - queued, getattr(g, 'api_key', {}).get('key_id'))
+        if accepted and not queued:
+            return _overloaded()
+        return jsonify({
+            'ok': queued == len(items),
+            'accepted': queued,
+            'rejected': len(items) - queued,
+            'results': results,
+        })
+
+    saved = ctrl.record_esp32_temphum_batch(accepted) if accepted else []
+    for i, rec in zip(accepted_idx, saved):
+        results[i].update({'id': rec.id, 'timestamp': rec.timestamp})
+
+    if saved:
+        _after_ingest(saved)
+
+    logger.info("ESP32 batch: %d accepted, %d rejected (key %s)",
+                len(saved), len(items) - len(saved), getattr(g, 'api_key', {}).get('key_id'))
+    return jsonify({
+        'ok': len(saved) == len(items),
+        'accepted': len(saved),
+        'rejected': len(items) - len(saved),
+        'results': results,
+    })
+
+
+@api_bp.route('/ingest/stats')
+@login_required
+def get_ingest_stats():
+    """Ingest queue depth, throughput and drop counters (plus MQTT, if enabled)."""
+    ingest = getattr(current_app, 'ingest', None)
+    out = {'enabled': False} if ingest is None else {'enabled': True, **ingest.stats()}
+    out['compression'] = current_app.ctrl.compression_stats()  # type: ignore[attr-defined]
+    mqtt_ingest = getattr(current_app, 'mqtt_ingest', None)
+    if mqtt_ingest is not None:
+        out['mqtt'] = mqtt_ingest.stats()
+    return jsonify(out)
+
+
 @api_bp.route('/esp32_test', methods=['GET', 'POST'])
 @csrf.exempt
 def esp32_test():
@@ -214,9 +498,17 @@ def esp32_test():
 @api_bp.route('/ac/status')
 @login_required
 def get_ac_status():
-    """Return current AC on/off status from the running thermostat."""
+    """Return current AC/thermostat state from the in-memory state store (no device I/O).
+
+    ``device`` reports the Tuya session: connection, cache age and poll/push counts;
+    ``commands`` the command queue counters.
+    """
     ac_thermo: ACThermostat = getattr(current_app, 'ac_thermostat', None)  # type: ignore
-    if ac_thermo is None:
+    state = current_app.sio_handler.state  # type: ignore[attr-defined]
+    ac, thermo = state.get('ac'), state.get('thermostat')
+    sleep, conf = state.get('sleep'), state.get('config')
+    session = getattr(current_app, 'ac_session', None)
+    if ac_thermo is None or not ac:
         logger.warning(
             "API /ac/status requested but thermostat not initialized")
         return jsonify({
@@ -231,48 +523,29 @@ def get_ac_status():
             "sleep_time_active": None,
             "sleep_schedule": None,
         }), 503
-    try:
-        enabled = getattr(ac_thermo, '_enabled', True)
-        try:
-            st = ac_thermo.ac.get_status()
-            mode = st.get('mode') if isinstance(st, dict) else None
-            fan = st.get('fan_speed_enum') if isinstance(st, dict) else None
-        except Exception:
-            mode = None
-            fan = None
-        return jsonify({
-            "is_on": bool(ac_thermo.is_on),
-            "thermostat_enabled": bool(enabled),
-            "thermo_active": bool(enabled),
-            "mode": mode,
-            "fan_speed": fan,
-            "sleep_enabled": bool(getattr(ac_thermo.cfg, 'sleep_active', True)),
-            "sleep_start": getattr(ac_thermo.cfg, 'sleep_start', None),
-            "sleep_stop": getattr(ac_thermo.cfg, 'sleep_stop', None),
-            "sleep_time_active": bool(ac_thermo._is_sleep_time),
-            "sleep_schedule": getattr(ac_thermo.cfg, 'sleep_weekly', None),
-            "setpoint_c": float(getattr(ac_thermo.cfg, 'target_temp', 0.0)),
-            "pos_hysteresis": float(getattr(ac_thermo.cfg, 'pos_hysteresis', 0.0)),
-            "neg_hysteresis": float(getattr(ac_thermo.cfg, 'neg_hysteresis', 0.0)),
-            "min_on_s": int(getattr(ac_thermo.cfg, 'min_on_s', 240)),
-            "min_off_s": int(getattr(ac_thermo.cfg, 'min_off_s', 240)),
-            "poll_interval_s": int(getattr(ac_thermo.cfg, 'poll_interval_s', 15)),
-            "smooth_window": int(getattr(ac_thermo.cfg, 'smooth_window', 5)),
-            "max_stale_s": getattr(ac_thermo.cfg, 'max_stale_s', None),
-            "control_locations": getattr(ac_thermo.cfg, 'control_locations', None),
-        })
-    except Exception as e:
-        logger.exception("Error reading AC status: %s", e)
-        return jsonify({
-            "is_on": None,
-            "thermostat_enabled": None,
-            "thermo_active": None,
-            "mode": None,
-            "fan_speed": None,
-            "sleep_enabled": None,
-            "sleep_start": None,
-            "sleep_stop": None,
-        }), 500
+    return jsonify({
+        "is_on": ac.get('is_on'),
+        "thermostat_enabled": thermo.get('enabled'),
+        "thermo_active": thermo.get('thermo_active'),
+        "mode": ac.get('mode'),
+        "fan_speed": ac.get('fan_speed'),
+        "sleep_enabled": sleep.get('sleep_enabled'),
+        "sleep_start": sleep.get('sleep_start'),
+        "sleep_stop": sleep.get('sleep_stop'),
+        "sleep_time_active": sleep.get('sleep_time_active'),
+        "sleep_schedule": sleep.get('sleep_schedule'),
+        "setpoint_c": conf.get('setpoint_c'),
+        "pos_hysteresis": conf.get('pos_hysteresis'),
+        "neg_hysteresis": conf.get('neg_hysteresis'),
+        "min_on_s": conf.get('min_on_s'),
+        "min_off_s": conf.get('min_off_s'),
+        "poll_interval_s": conf.get('poll_interval_s'),
+        "smooth_window": conf.get('smooth_window'),
+        "max_stale_s": conf.get('max_stale_s'),
+        "control_locations": conf.get('control_locations'),
+        "device": session.stats() if session is not None else None,
+        "commands": ac_thermo.ac.commands.stats(),
+    })
 
 
 @api_bp.route('/hvac/avg_rates_today')
@@ -11,17 +11,26 @@ from flask_login import (
 from flask_limiter.errors import RateLimitExceeded
 from ...extensions import limiter, csrf
 from ...core.controller import Controller
+from ...core.models import User
 
 auth_bp = Blueprint('auth', __name__)
 logger = logging.getLogger(__name__)
 
+# Endpoints served without a session (see security.configure_session_bypass)
+SESSIONLESS_ENDPOINTS = frozenset({'static', 'live'})
+
 
 class AuthUser(UserMixin):
-    """Flask-Login user, with admin flag."""
+    """Flask-Login user, with admin flag and the expiry of temporary accounts."""
 
-    def __init__(self, username: str, is_admin: bool = False):
+    def __init__(self, username: str, is_admin: bool = False, user: User | None = None):
         self.id = username
         self.is_admin = is_admin
+        self.user = user
+
+    @property
+    def is_expired(self) -> bool:
+        return bool(self.user and self.user.is_expired)
 
 
 class AuthAnonymous(AnonymousUserMixin):
@@ -31,21 +40,27 @@ class AuthAnonymous(AnonymousUserMixin):
         return False
 
 def kick_if_expired():
-    """Check if the user is temporary and expired."""
-    ctrl: Controller = current_app.ctrl
-    user = ctrl.get_user_by_username(current_user.get_id(), include_pw=False)
-    if user and user.is_expired:
+    """Check if the user is temporary and expired.
+
+    Reuses the user Flask-Login loaded for this request (one lookup, served
+    from the controller's user cache); static files and HLS are skipped.
+    """
+    if request.endpoint in SESSIONLESS_ENDPOINTS:
+        return None
+    if not current_user.is_authenticated:
+        return None
+    if getattr(current_user, 'is_expired', False):
         logout_user()
         flash("Istuntosi on vanhentunut.", "warning")
         return redirect(url_for("auth.login"))
 
 def load_user(user_id: str):
     ctrl: Controller = current_app.ctrl  # type: ignore
-    user = ctrl.get_user_by_username(user_id)
+    user = ctrl.get_user_by_username(user_id, include_pw=False)
     if user:
         is_admin = getattr(user, "is_admin", False)
         logger.debug("Loaded user %s (is_admin=%s)", user_id, is_admin)
-        return AuthUser(user_id, is_admin=is_admin)
+        return AuthUser(user_id, is_admin=is_admin, user=user)
     logger.warning("User %s not found", user_id)
     return None
 
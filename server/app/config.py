@@ -29,6 +29,40 @@ def _json_list(env_var: str, default: list[str]) -> list[str]:
     raise RuntimeError(f"{env_var} isn’t valid JSON list")
 
 
+def _json_dict(env_var: str) -> dict[str, Any]:
+    raw = os.getenv(env_var)
+    if not raw:
+        return {}
+    try:
+        vals = json.loads(raw)
+        if isinstance(vals, dict):
+            return vals
+    except json.JSONDecodeError:
+        pass
+    raise RuntimeError(f"{env_var} isn’t valid JSON object")
+
+
+def load_storage_settings() -> Dict[str, Any]:
+    """Settings of the database and its Controller (see ``Controller.from_settings``).
+
+    Shared by the web app and the standalone ingest consumer, so both write
+    the same way.
+    """
+    return {
+        # DB path
+        "DB_PATH": os.getenv("DB_PATH", os.path.join(tempfile.gettempdir())),
+        # Coalesce writes arriving within this window into one commit (0 = off)
+        "DB_GROUP_COMMIT_MS": int(os.getenv("DB_GROUP_COMMIT_MS", "0") or 0),
+        # Cache of completed-day chart responses (dir defaults to next to the DB)
+        "DAY_CACHE_DIR": os.getenv("DAY_CACHE_DIR", ""),
+        "DAY_CACHE_MAX_MB": int(os.getenv("DAY_CACHE_MAX_MB", "16") or 16),
+        # Ingest-time compression of raw readings, per location ('*' = all):
+        # {"*": {"temp": 0.05, "hum": 0.5}}; keep-alive row at least this often
+        "SENSOR_COMPRESSION": _json_dict("SENSOR_COMPRESSION"),
+        "SENSOR_COMPRESSION_MAX_GAP_S": int(os.getenv("SENSOR_COMPRESSION_MAX_GAP_S", "900") or 900),
+    }
+
+
 def load_settings() -> Dict[str, Any]:
     secret = os.getenv("SECRET_KEY")
     if not secret:
@@ -49,8 +83,37 @@ def load_settings() -> Dict[str, Any]:
         # Auth seeding
         "WEB_USERNAME": os.getenv("WEB_USERNAME"),
         "WEB_PASSWORD": os.getenv("WEB_PASSWORD"),
-        # DB path
-        "DB_PATH": os.getenv("DB_PATH", os.path.join(tempfile.gettempdir())),
+        # DB path, group commit, day cache, compression
+        **load_storage_settings(),
+        # Retention (batched pruning of time-series tables)
+        "RETENTION_INTERVAL_S": int(os.getenv("RETENTION_INTERVAL_S", "600") or 600),
+        "RETENTION_VACUUM_PAGES": int(os.getenv("RETENTION_VACUUM_PAGES", "0") or 0),
+        # Async sensor ingest (bounded queue drained by one writer)
+        "INGEST_ASYNC": os.getenv("INGEST_ASYNC", "1").lower() not in ("0", "false", "no"),
+        "INGEST_QUEUE_SIZE": int(os.getenv("INGEST_QUEUE_SIZE", "1000") or 1000),
+        "INGEST_BATCH_SIZE": int(os.getenv("INGEST_BATCH_SIZE", "200") or 200),
+        # 'queue' (in-process) or 'redis' (Redis Stream + consumer group)
+        "INGEST_BACKEND": os.getenv("INGEST_BACKEND", "queue").strip().lower(),
+        "INGEST_REDIS_URL": os.getenv("INGEST_REDIS_URL", "redis://localhost:6379"),
+        "INGEST_STREAM": os.getenv("INGEST_STREAM", "ingest:esp32"),
+        "INGEST_STREAM_MAXLEN": int(os.getenv("INGEST_STREAM_MAXLEN", "100000") or 100000),
+        # Run the stream consumer inside the web app (0 = separate process)
+        "INGEST_CONSUMER": os.getenv("INGEST_CONSUMER", "1").lower() not in ("0", "false", "no"),
+        # MQTT subscriber (sensors publish to <prefix>/<location>/temphum)
+        "MQTT_ENABLED": os.getenv("MQTT_ENABLED", "0").lower() in ("1", "true", "yes"),
+        "MQTT_HOST": os.getenv("MQTT_HOST", "localhost"),
+        "MQTT_PORT": int(os.getenv("MQTT_PORT", "1883") or 1883),
+        "MQTT_USERNAME": os.getenv("MQTT_USERNAME") or None,
+        "MQTT_PASSWORD": os.getenv("MQTT_PASSWORD") or None,
+        "MQTT_TOPIC_PREFIX": os.getenv("MQTT_TOPIC_PREFIX", "home"),
+        "MQTT_CLIENT_ID": os.getenv("MQTT_CLIENT_ID", "server-ingest"),
+        "MQTT_TLS": os.getenv("MQTT_TLS", "0").lower() in ("1", "true", "yes"),
+        # Telemetry to views is coalesced and flushed this often per room (0 = off);
+        # per-room overrides as JSON, e.g. {"printer": 2, "loc:*": 1}
+        "BROADCAST_INTERVAL_S": float(os.getenv("BROADCAST_INTERVAL_S", "1") or 0),
+        "BROADCAST_ROOM_INTERVALS": _json_dict("BROADCAST_ROOM_INTERVALS"),
+        # View telemetry kept per topic for replay after reconnects
+        "REPLAY_BUFFER_SIZE": int(os.getenv("REPLAY_BUFFER_SIZE", "256") or 256),
         # Rate limit whitelist for request_filter
         "whitelist": whitelist,
         # Sockets
@@ -58,6 +121,16 @@ def load_settings() -> Dict[str, Any]:
         # HVAC / Thermostat shared settings
         "THERMOSTAT_LOCATION": os.getenv("THERMOSTAT_LOCATION", "Tietokonepöytä"),
         "ROOM_THERMAL_CAPACITY_J_PER_K": os.getenv("ROOM_THERMAL_CAPACITY_J_PER_K"),
+        # Thermostat checks this long after the first fresh control reading of a burst
+        "THERMOSTAT_DEBOUNCE_S": float(os.getenv("THERMOSTAT_DEBOUNCE_S", "1") or 0),
+        # Thermostat config edits are written (changed columns only) this long after the first one
+        "THERMOSTAT_PERSIST_DEBOUNCE_S": float(os.getenv("THERMOSTAT_PERSIST_DEBOUNCE_S", "0.5") or 0),
+        # Tuya AC status is cached from device pushes; polled when older than this
+        "AC_STATUS_TTL_S": float(os.getenv("AC_STATUS_TTL_S", "30") or 30),
+        "AC_HEARTBEAT_S": float(os.getenv("AC_HEARTBEAT_S", "10") or 10),
+        # AC commands are queued; a command not applied within the timeout fails
+        "AC_COMMAND_TIMEOUT_S": float(os.getenv("AC_COMMAND_TIMEOUT_S", "10") or 10),
+        "AC_COMMAND_RETRIES": int(os.getenv("AC_COMMAND_RETRIES", "2") or 0),
     }
 
     return settings
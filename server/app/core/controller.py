@@ -2,26 +2,106 @@
 
 import os
 import tempfile
-from typing import Optional, List, Dict, Any
-from datetime import datetime, timedelta
+import dataclasses
+from typing import Optional, List, Dict, Any, Callable, Iterable, Mapping
+from datetime import datetime, timedelta, date, time as dtime
 from flask_login import current_user
 from werkzeug.security import generate_password_hash, check_password_hash
+import json
 import logging
 
-from .models import User, TemperatureHumidity, ESP32TemperatureHumidity, Status, ImageData, TimelapseConf, ThermostatConf, ApiKey
-from .database import DatabaseManager
+from .models import User, TemperatureHumidity, ESP32TemperatureHumidity, ESP32Rollup, LatestReading, Status, ImageData, TimelapseConf, ThermostatConf, ApiKey
+from .database import DatabaseManager, ROLLUP_TABLES
+from .timeseries import lttb, SwingingDoor, interpolate
+from .daycache import DayCache
 import pytz
 import sqlite3
 import secrets
 import hashlib
+import hmac
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
 
 class Controller:
-    def __init__(self, db_path: str = os.getenv("DB_PATH", os.path.join(tempfile.gettempdir(), "timelapse.db"))):
-        self.db = DatabaseManager(db_path)
+    # esp32_temphum stores temperature/humidity as fixed-point integers
+    VALUE_SCALE = 100
+    # User rows are served from memory this long (auth runs on every request)
+    USER_CACHE_TTL_S = 30
+    # Verified API tokens are trusted this long before re-checking the hash
+    API_KEY_CACHE_TTL_S = 300
+    # Spacing of points interpolated into compressed raw day series
+    RAW_FILL_STEP_S = 60
+    # last_used_at updates are batched and written at most this often
+    API_KEY_TOUCH_FLUSH_S = 60
+    _ESP32_SELECT = (
+        "SELECT e.id, l.name AS location, e.ts, e.temp_x100, e.hum_x100, e.ac_on "
+        "FROM esp32_temphum AS e JOIN locations AS l ON l.id = e.location_id"
+    )
+
+    def __init__(
+        self,
+        db_path: str = os.getenv("DB_PATH", os.path.join(tempfile.gettempdir(), "timelapse.db")),
+        group_commit_ms: int = 0,
+        day_cache_dir: str | None = None,
+        day_cache_max_bytes: int = 16 * 1024 * 1024,
+        compression: Dict[str, Dict[str, float]] | None = None,
+        compression_max_gap_s: int = 900,
+    ):
+        self.db = DatabaseManager(db_path, group_commit_ms=group_commit_ms)
+        # Serialized responses of completed days (see get_day_response)
+        self.day_cache = DayCache(day_cache_dir, day_cache_max_bytes)
         self.finland_tz = pytz.timezone('Europe/Helsinki')
+        # Small location dimension table, cached name -> id
+        self._location_ids: Dict[str, int] = {}
+        # Newest reading per location; written through on ingest, warmed here
+        self._latest: Dict[str, LatestReading] = {}
+        self._latest_overall: LatestReading | None = None
+        self._latest_lock = threading.Lock()
+        # Ingest-time compression of raw rows: location ('*' = any) ->
+        # (temp, hum) tolerance in fixed-point units; one door per location
+        self._compression: Dict[str, tuple[int, int]] = {
+            loc: (int(round(float(tol.get('temp', 0)) * self.VALUE_SCALE)),
+                  int(round(float(tol.get('hum', 0)) * self.VALUE_SCALE)))
+            for loc, tol in (compression or {}).items()
+        }
+        self._compression_max_gap_ms = int(compression_max_gap_s) * 1000
+        self._doors: Dict[str, SwingingDoor] = {}
+        self._compress_lock = threading.Lock()
+        self._compress_stats = {'offered': 0, 'stored': 0}
+        # username -> (expires monotonic, User); invalidated by user writes
+        self._user_cache: Dict[str, tuple[float, User]] = {}
+        # Verified API tokens, keyed by HMAC(token) under a per-process key,
+        # and pending last_used_at updates (api_keys.id -> ISO time)
+        self._api_key_hmac_key = secrets.token_bytes(32)
+        self._api_key_cache: Dict[bytes, tuple[float, dict]] = {}
+        self._api_key_touches: Dict[int, str] = {}
+        self._api_key_flushed_at = time.monotonic()
+        self._api_key_lock = threading.Lock()
+        # Bumped on every revoke/delete; a verification that started before
+        # one may not cache the row it read
+        self._api_key_generation = 0
+        self._ensure_rollups()
+        self._warm_latest()
+
+    @classmethod
+    def from_settings(cls, settings: Mapping[str, Any]) -> "Controller":
+        """Build the controller from ``load_storage_settings()`` keys (web app and consumers alike)."""
+        db_path = settings.get("DB_PATH")
+        if not db_path:
+            raise RuntimeError("DB_PATH is missing – add to environment.")
+        day_cache_dir = settings.get("DAY_CACHE_DIR") or os.path.join(
+            os.path.dirname(os.path.abspath(db_path)), "day_cache")
+        return cls(
+            db_path,
+            group_commit_ms=settings.get("DB_GROUP_COMMIT_MS", 0),
+            day_cache_dir=day_cache_dir,
+            day_cache_max_bytes=settings.get("DAY_CACHE_MAX_MB", 16) * 1024 * 1024,
+            compression=settings.get("SENSOR_COMPRESSION"),
+            compression_max_gap_s=settings.get("SENSOR_COMPRESSION_MAX_GAP_S", 900),
+        )
 
     # --- User operations ---
     def register_user(
@@ -56,6 +136,7 @@ class Controller:
              1 if is_root_admin else 0, 1 if is_temporary else 0, expires_at)
         )
         if cursor.rowcount == 1:
+            self.invalidate_user(username)
             logger.debug(f"User '{username}' created successfully.")
         else:
             logger.debug(f"User '{username}' already exists, skipping INSERT.")
@@ -102,6 +183,7 @@ class Controller:
             "UPDATE users SET is_admin = ? WHERE username = ?",
             (is_admin, username)
         )
+        self.invalidate_user(username)
 
     def authenticate_user(self, username: str, password: str) -> bool:
         row = self.db.fetchone(
@@ -134,21 +216,39 @@ class Controller:
         return users
 
     def get_user_by_username(self, username: str, include_pw: bool = True) -> User | None:
-        row = self.db.fetchone(
-            "SELECT id, username, password_hash, is_admin, is_root_admin, is_temporary, expires_at FROM users WHERE username = ?",
-            (username,)
-        )
-        if not row:
+        """Return the user, served from a short-TTL cache (see USER_CACHE_TTL_S)."""
+        if not username:
             return None
-        return User(
-            id=row['id'],
-            username=row['username'],
-            password_hash=row['password_hash'] if include_pw else None,
-            is_admin=row['is_admin'],
-            is_root_admin=row['is_root_admin'],
-            is_temporary=row['is_temporary'],
-            expires_at=row['expires_at']
-        )
+        cached = self._user_cache.get(username)
+        if cached is not None and time.monotonic() < cached[0]:
+            user = cached[1]
+        else:
+            row = self.db.fetchone(
+                "SELECT id, username, password_hash, is_admin, is_root_admin, is_temporary, expires_at FROM users WHERE username = ?",
+                (username,)
+            )
+            if not row:
+                self._user_cache.pop(username, None)
+                return None
+            user = User(
+                id=row['id'],
+                username=row['username'],
+                password_hash=row['password_hash'],
+                is_admin=row['is_admin'],
+                is_root_admin=row['is_root_admin'],
+                is_temporary=row['is_temporary'],
+                expires_at=row['expires_at']
+            )
+            self._user_cache[username] = (time.monotonic() + self.USER_CACHE_TTL_S, user)
+        # Callers get their own copy; the cached one stays untouched
+        return dataclasses.replace(user, password_hash=user.password_hash if include_pw else None)
+
+    def invalidate_user(self, username: str | None = None) -> None:
+        """Forget cached user rows (all of them when ``username`` is None)."""
+        if username is None:
+            self._user_cache.clear()
+        else:
+            self._user_cache.pop(username, None)
 
     def delete_user(self, username: str) -> None:
         """Poistaa käyttäjän annetulla käyttäjätunnuksella."""
@@ -156,6 +256,7 @@ class Controller:
             "DELETE FROM users WHERE username = ?",
             (username,)
         )
+        self.invalidate_user(username)
 
     def delete_temporary_users(self) -> None:
         """Deletes all temporary users."""
@@ -163,6 +264,7 @@ class Controller:
             "DELETE FROM users WHERE is_temporary = 1",
             ()
         )
+        self.invalidate_user()
 
     def delete_expired_temporary_users(self) -> None:
         """Deletes all expired temporary users."""
@@ -171,6 +273,7 @@ class Controller:
             "DELETE FROM users WHERE is_temporary = 1 AND expires_at IS NOT NULL AND expires_at < ?",
             (now,)
         )
+        self.invalidate_user()
 
     def update_user(
         self,
@@ -244,31 +347,770 @@ class Controller:
         except sqlite3.IntegrityError as ie:
             # Likely UNIQUE constraint failure on username
             raise ValueError("Käyttäjätunnus on jo käytössä.") from ie
+        finally:
+            self.invalidate_user(current_username)
+            if new_username:
+                self.invalidate_user(new_username)
 
         return self.get_user_by_username(new_username or current_username)
 
     # --- Sensor data operations ---
 
-    def record_esp32_temphum(self, location: str, temperature: float, humidity: float, ac_on: bool | None = None) -> ESP32TemperatureHumidity:
-        now = datetime.now(self.finland_tz).isoformat()
-        # Insert with optional AC state flag (nullable)
-        self.db.execute_query(
-            "INSERT INTO esp32_temphum (location, timestamp, temperature, humidity, ac_on) VALUES (?, ?, ?, ?, ?)",
-            (location, now, temperature, humidity,
-             None if ac_on is None else (1 if ac_on else 0))
-        )
-        row = self.db.fetchone(
-            "SELECT id, location, timestamp, temperature, humidity, ac_on FROM esp32_temphum ORDER BY id DESC LIMIT 1"
-        )
+    def _to_epoch_ms(self, dt: datetime) -> int:
+        return int(round(dt.timestamp() * 1000))
+
+    def _ms_to_iso(self, ts_ms: int) -> str:
+        return datetime.fromtimestamp(ts_ms / 1000.0, self.finland_tz).isoformat()
+
+    def _local_day_bounds_ms(self, date_str: str) -> tuple[int, int]:
+        """Return [start, end) epoch ms of a local (Helsinki) calendar day.
+
+        Localizing both midnights separately keeps 23 h / 25 h DST days right.
+        """
+        day = date.fromisoformat(date_str)
+        start = self.finland_tz.localize(datetime.combine(day, dtime.min))
+        end = self.finland_tz.localize(
+            datetime.combine(day + timedelta(days=1), dtime.min))
+        return self._to_epoch_ms(start), self._to_epoch_ms(end)
+
+    def _location_id(self, name: str, create: bool = False) -> int | None:
+        loc_id = self._location_ids.get(name)
+        if loc_id is not None:
+            return loc_id
+        if create:
+            self.db.execute_query(
+                "INSERT OR IGNORE INTO locations (name) VALUES (?)", (name,))
+        row = self.db.fetchone("SELECT id FROM locations WHERE name = ?", (name,))
         if row is None:
-            raise RuntimeError(
-                "Failed to retrieve inserted esp32_temphum record")
+            return None
+        self._location_ids[name] = row['id']
+        return row['id']
+
+    def _row_to_esp32(self, row: sqlite3.Row) -> ESP32TemperatureHumidity:
         return ESP32TemperatureHumidity(
-            id=row['id'], location=row['location'], timestamp=row['timestamp'],
-            temperature=row['temperature'], humidity=row['humidity'],
+            id=row['id'],
+            location=row['location'],
+            timestamp=self._ms_to_iso(row['ts']),
+            temperature=row['temp_x100'] / self.VALUE_SCALE,
+            humidity=row['hum_x100'] / self.VALUE_SCALE,
             ac_on=(None if row['ac_on'] is None else bool(row['ac_on']))
         )
 
+    def record_esp32_temphum(self, location: str, temperature: float, humidity: float, ac_on: bool | None = None) -> ESP32TemperatureHumidity:
+        ts_ms = self._to_epoch_ms(datetime.now(self.finland_tz))
+        temp_x100 = int(round(float(temperature) * self.VALUE_SCALE))
+        hum_x100 = int(round(float(humidity) * self.VALUE_SCALE))
+        loc_id = self._location_id(location, create=True)
+        ac_flag = None if ac_on is None else (1 if ac_on else 0)
+        row = (loc_id, ts_ms, temp_x100, hum_x100, ac_flag)
+        (store,), held, undo = self._compress([location], [row])
+
+        def _insert(conn: sqlite3.Connection) -> int | None:
+            self._insert_raw(conn, held)
+            return self._insert_reading(conn, *row, store=store)
+
+        try:
+            row_id = self.db.write(_insert)
+        except Exception:
+            self._compress_rollback(undo)
+            raise
+        self._count_compressed(1, int(store) + len(held))
+        # Held rows forced out now may belong to a day already cached
+        self.invalidate_past_days(h[1] for h in held)
+        saved = ESP32TemperatureHumidity(
+            id=row_id, location=location, timestamp=self._ms_to_iso(ts_ms),
+            temperature=temp_x100 / self.VALUE_SCALE, humidity=hum_x100 / self.VALUE_SCALE,
+            ac_on=(None if ac_on is None else bool(ac_on))
+        )
+        self._remember_latest(saved, ts_ms)
+        return saved
+
+    def _insert_reading(
+        self,
+        conn: sqlite3.Connection,
+        loc_id: int,
+        ts_ms: int,
+        temp_x100: int,
+        hum_x100: int,
+        ac_flag: int | None,
+        store: bool = True,
+    ) -> int | None:
+        # Insert with optional AC state flag (nullable); all values are known
+        # up front, so only the rowid is needed back (no re-SELECT). Readings
+        # dropped by compression still count in the rollups.
+        row_id = None
+        if store:
+            row_id = conn.execute(
+                "INSERT INTO esp32_temphum (location_id, ts, temp_x100, hum_x100, ac_on) VALUES (?, ?, ?, ?, ?)",
+                (loc_id, ts_ms, temp_x100, hum_x100, ac_flag)
+            ).lastrowid
+        # Fold the reading into every rollup in the same transaction
+        for res_s in ROLLUP_TABLES:
+            conn.execute(
+                self._rollup_upsert_sql(res_s, 1),
+                (loc_id, self._bucket_start_ms(ts_ms, res_s),
+                 temp_x100, temp_x100, temp_x100,
+                 hum_x100, hum_x100, hum_x100, 1 if ac_flag else 0)
+            )
+        return row_id
+
+    @staticmethod
+    def _insert_raw(conn: sqlite3.Connection, rows: List[tuple]) -> None:
+        """Store raw rows whose rollups were already folded in (held compression points)."""
+        if rows:
+            conn.executemany(
+                "INSERT INTO esp32_temphum (location_id, ts, temp_x100, hum_x100, ac_on) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+
+    # --- Ingest-time compression (swinging door) ---
+
+    def _compression_for(self, location: str) -> tuple[int, int] | None:
+        tol = self._compression.get(location, self._compression.get('*'))
+        return tol if tol and any(tol) else None
+
+    def _compress(self, locations: List[str], rows: List[tuple]) -> tuple[List[bool], List[tuple], Dict[str, tuple]]:
+        """Decide which ``(loc_id, ts, t, h, ac)`` rows to store raw.
+
+        Returns one store flag per row, earlier held rows that the new
+        readings forced out and that must be inserted as well, and the undo
+        state to pass to ``_compress_rollback`` if that write fails.
+        """
+        flags = [True] * len(rows)
+        held: List[tuple] = []
+        undo: Dict[str, tuple] = {}
+        with self._compress_lock:
+            order = sorted(range(len(rows)), key=lambda i: rows[i][1])
+            for i in order:
+                tol = self._compression_for(locations[i])
+                if tol is None:
+                    continue
+                door = self._doors.get(locations[i])
+                if door is None:
+                    door = self._doors[locations[i]] = SwingingDoor(tol, self._compression_max_gap_ms)
+                if locations[i] not in undo:
+                    undo[locations[i]] = (door, door.save())
+                loc_id, ts_ms, t, h, on = rows[i]
+                flags[i] = False
+                for p_ts, (p_t, p_h), p_on in door.offer((ts_ms, (t, h), on)):
+                    if p_ts == ts_ms and (p_t, p_h, p_on) == (t, h, on):
+                        flags[i] = True
+                    else:
+                        held.append((loc_id, p_ts, p_t, p_h, p_on))
+            # Version each door reached, so a rollback skips doors moved on since
+            undo = {loc: (door, state, door.version) for loc, (door, state) in undo.items()}
+        return flags, held, undo
+
+    def _count_compressed(self, offered: int, stored: int) -> None:
+        """Count a batch's readings and raw rows once its write succeeded."""
+        with self._compress_lock:
+            self._compress_stats['offered'] += offered
+            self._compress_stats['stored'] += stored
+
+    def _compress_rollback(self, undo: Dict[str, tuple]) -> None:
+        """Undo the door advances of a batch whose write failed.
+
+        Its held points stay pending instead of being lost. A door another
+        batch advanced meanwhile is left as it is.
+        """
+        with self._compress_lock:
+            for location, (door, state, version) in undo.items():
+                if door.version == version:
+                    door.restore(state)
+                else:
+                    logger.warning("compression: %s advanced during a failed write; not rolled back", location)
+
+    def flush_compression(self) -> int:
+        """Store every pending (held back) compressed reading; returns how many.
+
+        The doors only treat their points as stored once the write succeeded.
+        """
+        with self._compress_lock:
+            rows = []
+            doors = []
+            for location, door in self._doors.items():
+                if door.held is not None:
+                    ts_ms, (t, h), on = door.held
+                    rows.append((self._location_id(location, create=True), ts_ms, t, h, on))
+                    doors.append(door)
+            if rows:
+                # Under the lock, so no batch can force the same points out meanwhile
+                self.db.write(lambda conn: self._insert_raw(conn, rows))
+                for door in doors:
+                    door.flush()
+                self._compress_stats['stored'] += len(rows)
+        self.invalidate_past_days(row[1] for row in rows)
+        return len(rows)
+
+    def invalidate_past_days(self, ts_list: Iterable[int]) -> None:
+        """Drop cached responses of completed days that just received raw rows."""
+        today = datetime.now(self.finland_tz).date()
+        days = {datetime.fromtimestamp(ts / 1000.0, self.finland_tz).date() for ts in ts_list}
+        for day in sorted(d for d in days if d < today):
+            self.invalidate_days(day, day)
+
+    def compression_stats(self) -> Dict[str, Any]:
+        """Readings offered vs. raw rows stored since start (None when disabled)."""
+        if not self._compression:
+            return {'enabled': False}
+        with self._compress_lock:
+            out = dict(self._compress_stats)
+        out['enabled'] = True
+        out['ratio'] = round(out['offered'] / out['stored'], 2) if out['stored'] else None
+        return out
+
+    def record_esp32_temphum_batch(
+        self, readings: List[Dict[str, Any]], held_ts: List[int] | None = None,
+    ) -> List[ESP32TemperatureHumidity]:
+        """Insert many readings in one transaction.
+
+        Each reading is a dict with ``location``, ``temperature``, ``humidity``,
+        ``ts_ms`` (device-side epoch ms) and optional ``ac_on``; a missing or
+        None ``ac_on`` is taken from the AC event log at that instant.
+        Readings dropped by compression get ``id=None``.
+        Cached responses of past days that received readings are invalidated.
+        ``held_ts``, when given, is extended with the timestamps of earlier
+        held rows the batch forced out (other processes invalidate those days).
+        """
+        if not readings:
+            return []
+        rows = []
+        for r in readings:
+            rows.append((
+                self._location_id(r['location'], create=True),
+                int(r['ts_ms']),
+                int(round(float(r['temperature']) * self.VALUE_SCALE)),
+                int(round(float(r['humidity']) * self.VALUE_SCALE)),
+                r.get('ac_on'),
+            ))
+        missing = [i for i, row in enumerate(rows) if row[4] is None]
+        if missing:
+            states = self._ac_states_at([rows[i][1] for i in missing])
+            for i, state in zip(missing, states):
+                rows[i] = rows[i][:4] + (state,)
+        rows = [row[:4] + (None if row[4] is None else (1 if row[4] else 0),) for row in rows]
+        flags, held, undo = self._compress([r['location'] for r in readings], rows)
+
+        def _insert_all(conn: sqlite3.Connection) -> list[int | None]:
+            self._insert_raw(conn, held)
+            return [
+                self._insert_reading(conn, *row, store=store)
+                for row, store in zip(rows, flags)
+            ]
+
+        try:
+            ids = self.db.write(_insert_all)
+        except Exception:
+            self._compress_rollback(undo)
+            raise
+        self._count_compressed(len(rows), sum(flags) + len(held))
+        saved = []
+        for r, row_id, (_, ts_ms, t, h, on) in zip(readings, ids, rows):
+            rec = ESP32TemperatureHumidity(
+                id=row_id, location=r['location'], timestamp=self._ms_to_iso(ts_ms),
+                temperature=t / self.VALUE_SCALE, humidity=h / self.VALUE_SCALE,
+                ac_on=(None if on is None else bool(on))
+            )
+            self._remember_latest(rec, ts_ms)
+            saved.append(rec)
+        self.invalidate_past_days([row[1] for row in rows] + [row[1] for row in held])
+        if held_ts is not None:
+            held_ts.extend(row[1] for row in held)
+        return saved
+
+    def _ac_states_at(self, ts_list: List[int]) -> List[bool | None]:
+        """AC on/off state at each epoch-ms instant, from the ac_events log."""
+        if not ts_list:
+            return []
+        start_iso = self._ms_to_iso(min(ts_list))
+        end_iso = self._ms_to_iso(max(ts_list))
+        state = self.get_last_ac_state_before(start_iso)
+        events = []
+        for e in self.get_ac_events_between(start_iso, end_iso):
+            try:
+                events.append((self._to_epoch_ms(datetime.fromisoformat(e['timestamp'])), e['is_on']))
+            except ValueError:
+                continue
+        out: List[bool | None] = [None] * len(ts_list)
+        idx = 0
+        for pos in sorted(range(len(ts_list)), key=lambda k: ts_list[k]):
+            while idx < len(events) and events[idx][0] <= ts_list[pos]:
+                state = events[idx][1]
+                idx += 1
+            out[pos] = state
+        return out
+
+    # --- Latest reading per location (in-memory) ---
+
+    def _remember_latest(self, reading: ESP32TemperatureHumidity, ts_ms: int) -> None:
+        entry = LatestReading(reading=reading, ts_ms=ts_ms)
+        with self._latest_lock:
+            current = self._latest.get(reading.location)
+            if current is None or current.ts_ms <= ts_ms:
+                self._latest[reading.location] = entry
+            if self._latest_overall is None or self._latest_overall.ts_ms <= ts_ms:
+                self._latest_overall = entry
+
+    def _warm_latest(self) -> None:
+        """Load the newest reading of every location (one index seek each)."""
+        try:
+            rows = self.db.fetchall(
+                f"""
+                {self._ESP32_SELECT}
+                 WHERE e.id = (
+                    SELECT e2.id
+                      FROM esp32_temphum AS e2
+                     WHERE e2.location_id = l.id
+                     ORDER BY e2.ts DESC
+                     LIMIT 1
+                 )
+                """
+            )
+        except Exception as e:
+            logger.warning("Latest reading warm-up failed: %s", e)
+            return
+        for row in rows:
+            self._remember_latest(self._row_to_esp32(row), row['ts'])
+
+    def get_latest_reading(self, location: str) -> LatestReading | None:
+        """Newest reading of ``location`` with its age, served from memory."""
+        return self._latest.get(location)
+
+    def get_latest_readings(self) -> List[LatestReading]:
+        """Newest reading of every location, sorted by location name."""
+        with self._latest_lock:
+            entries = list(self._latest.values())
+        return sorted(entries, key=lambda x: x.reading.location)
+
+    # --- Rollups (1 min / 15 min / 1 h / 1 day) ---
+
+    def _bucket_start_ms(self, ts_ms: int, resolution_s: int) -> int:
+        if resolution_s % 86400 == 0:
+            # Day buckets start at local midnight (23 h / 25 h on DST days);
+            # multi-day buckets are aligned to Mondays
+            day = datetime.fromtimestamp(ts_ms / 1000.0, self.finland_tz).date()
+            ordinal = day.toordinal() - 1
+            day = date.fromordinal(ordinal - ordinal % (resolution_s // 86400) + 1)
+            return self._to_epoch_ms(self.finland_tz.localize(datetime.combine(day, dtime.min)))
+        step = resolution_s * 1000
+        return ts_ms - ts_ms % step
+
+    @staticmethod
+    def _rollup_upsert_sql(resolution_s: int, count: int | None = None) -> str:
+        """UPSERT merging a partial aggregate into a rollup bucket.
+
+        With ``count`` given, the row count is a literal (single reading);
+        otherwise it is the first parameter after the bucket key.
+        """
+        count_sql = str(int(count)) if count is not None else "?"
+        return f"""
+            INSERT INTO {ROLLUP_TABLES[resolution_s]}
+                (location_id, bucket_ts, count, temp_sum, temp_min, temp_max,
+                 hum_sum, hum_min, hum_max, ac_on_count)
+            VALUES (?, ?, {count_sql}, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(location_id, bucket_ts) DO UPDATE SET
+                count = count + excluded.count,
+                temp_sum = temp_sum + excluded.temp_sum,
+                temp_min = min(temp_min, excluded.temp_min),
+                temp_max = max(temp_max, excluded.temp_max),
+                hum_sum = hum_sum + excluded.hum_sum,
+                hum_min = min(hum_min, excluded.hum_min),
+                hum_max = max(hum_max, excluded.hum_max),
+                ac_on_count = ac_on_count + excluded.ac_on_count
+            """
+
+    def _ensure_rollups(self) -> None:
+        """Backfill rollups from raw readings when they are empty (first start)."""
+        try:
+            if self.db.fetchone(f"SELECT 1 FROM {ROLLUP_TABLES[60]} LIMIT 1") is not None:
+                return
+            if self.db.fetchone("SELECT 1 FROM esp32_temphum LIMIT 1") is None:
+                return
+            self.rebuild_rollups()
+        except Exception as e:
+            logger.warning("Rollup backfill failed: %s", e)
+
+    def rebuild_rollups(self) -> int:
+        """Recompute all rollup buckets covered by raw esp32_temphum rows.
+
+        Buckets older than the raw data are left untouched. Returns the
+        number of raw rows folded in. With compression enabled the raw table
+        only holds the stored points, so rebuilt counts and averages are
+        coarser than the ones maintained at ingest.
+        """
+        rows = self.db.fetchall(
+            "SELECT location_id, ts, temp_x100, hum_x100, ac_on FROM esp32_temphum ORDER BY ts"
+        )
+        if not rows:
+            return 0
+        buckets: Dict[int, Dict[tuple[int, int], list[int]]] = {res: {} for res in ROLLUP_TABLES}
+        for row in rows:
+            t, h = row['temp_x100'], row['hum_x100']
+            on = 1 if row['ac_on'] else 0
+            for res_s, acc in buckets.items():
+                key = (row['location_id'], self._bucket_start_ms(row['ts'], res_s))
+                agg = acc.get(key)
+                if agg is None:
+                    acc[key] = [1, t, t, t, h, h, h, on]
+                    continue
+                agg[0] += 1
+                agg[1] += t
+                agg[2] = min(agg[2], t)
+                agg[3] = max(agg[3], t)
+                agg[4] += h
+                agg[5] = min(agg[5], h)
+                agg[6] = max(agg[6], h)
+                agg[7] += on
+        first_ts = rows[0]['ts']
+
+        def _replace(conn: sqlite3.Connection) -> None:
+            for res_s, acc in buckets.items():
+                table = ROLLUP_TABLES[res_s]
+                conn.execute(
+                    f"DELETE FROM {table} WHERE bucket_ts >= ?",
+                    (self._bucket_start_ms(first_ts, res_s),)
+                )
+                conn.executemany(
+                    self._rollup_upsert_sql(res_s),
+                    [(loc, bucket, *agg) for (loc, bucket), agg in acc.items()]
+                )
+
+        self.db.write(_replace)
+        self.invalidate_days(first=datetime.fromtimestamp(first_ts / 1000.0, self.finland_tz).date())
+        logger.info("Rebuilt rollups from %d raw readings", len(rows))
+        return len(rows)
+
+    def get_esp32_rollups(
+        self,
+        location: str,
+        resolution_s: int,
+        start_ms: int,
+        end_ms: int,
+    ) -> List[ESP32Rollup]:
+        """Rollup buckets of one location with ``start_ms <= bucket < end_ms``."""
+        table = ROLLUP_TABLES.get(int(resolution_s))
+        if table is None:
+            raise ValueError(f"Unsupported resolution {resolution_s}s; allowed: {sorted(ROLLUP_TABLES)}")
+        loc_id = self._location_id(location)
+        if loc_id is None:
+            return []
+        rows = self._rollup_rows(loc_id, table, start_ms, end_ms)
+        scale = float(self.VALUE_SCALE)
+        return [
+            ESP32Rollup(
+                location=location,
+                timestamp=self._ms_to_iso(row['bucket_ts']),
+                resolution_s=int(resolution_s),
+                count=row['count'],
+                temperature_avg=round(row['temp_sum'] / row['count'] / scale, 2),
+                temperature_min=row['temp_min'] / scale,
+                temperature_max=row['temp_max'] / scale,
+                humidity_avg=round(row['hum_sum'] / row['count'] / scale, 2),
+                humidity_min=row['hum_min'] / scale,
+                humidity_max=row['hum_max'] / scale,
+                ac_on_ratio=row['ac_on_count'] / row['count'],
+            )
+            for row in rows
+        ]
+
+    def _rollup_rows(self, loc_id: int, table: str, start_ms: int, end_ms: int) -> List[sqlite3.Row]:
+        return self.db.fetchall(
+            f"""
+            SELECT bucket_ts, count, temp_sum, temp_min, temp_max,
+                   hum_sum, hum_min, hum_max, ac_on_count
+              FROM {table}
+             WHERE location_id = ? AND bucket_ts >= ? AND bucket_ts < ?
+             ORDER BY bucket_ts
+            """,
+            (loc_id, int(start_ms), int(end_ms))
+        )
+
+    def remember_latest(self, reading: ESP32TemperatureHumidity, ts_ms: int) -> None:
+        """Take a reading persisted by another process into the latest-reading cache."""
+        self._remember_latest(reading, int(ts_ms))
+
+    # --- Range history (multi-day, multi-location) ---
+
+    # Upper bound of buckets per location a single history request may produce
+    MAX_HISTORY_BUCKETS = 10000
+
+    def get_esp32_temphum_between(self, location: str, start_ms: int, end_ms: int) -> List[ESP32TemperatureHumidity]:
+        """Raw readings of one location with ``start_ms <= ts < end_ms``."""
+        loc_id = self._location_id(location)
+        if loc_id is None:
+            return []
+        rows = self.db.fetchall(
+            f"""
+            {self._ESP32_SELECT}
+             WHERE e.location_id = ? AND e.ts >= ? AND e.ts < ?
+             ORDER BY e.ts
+            """,
+            (loc_id, int(start_ms), int(end_ms))
+        )
+        return [self._row_to_esp32(row) for row in rows]
+
+    def _history_source(
+        self,
+        loc_id: int,
+        resolution_s: int,
+        start_ms: int,
+        end_ms: int,
+        reconstruct: bool = False,
+    ) -> List[list[int]]:
+        """Rows of one source as ``[ts, count, t_sum, t_min, t_max, h_sum, h_min, h_max, ac_on_count]``.
+
+        ``resolution_s == 0`` reads raw readings (count 1 each). With
+        ``reconstruct`` (compressed locations) the series is also
+        interpolated at both range ends from the stored points just outside,
+        which may lie far apart.
+        """
+        if resolution_s == 0:
+            rows = [
+                [r['ts'], r['temp_x100'], r['hum_x100'], 1 if r['ac_on'] else 0]
+                for r in self.db.fetchall(
+                    """
+                    SELECT ts, temp_x100, hum_x100, ac_on FROM esp32_temphum
+                     WHERE location_id = ? AND ts >= ? AND ts < ?
+                     ORDER BY ts
+                    """,
+                    (loc_id, int(start_ms), int(end_ms))
+                )
+            ]
+            if reconstruct:
+                rows = self._reconstruct_edges(loc_id, rows, int(start_ms), int(end_ms) - 1)
+            return [[ts, 1, t, t, t, h, h, h, on] for ts, t, h, on in rows]
+        rows = self._rollup_rows(loc_id, ROLLUP_TABLES[resolution_s], start_ms, end_ms)
+        return [
+            [r['bucket_ts'], r['count'], r['temp_sum'], r['temp_min'], r['temp_max'],
+             r['hum_sum'], r['hum_min'], r['hum_max'], r['ac_on_count']]
+            for r in rows
+        ]
+
+    def _reconstruct_edges(self, loc_id: int, rows: List[list[int]], first_ms: int, last_ms: int) -> List[list[int]]:
+        """Add points interpolated at ``first_ms`` / ``last_ms`` from the neighbouring stored rows."""
+        before = self.db.fetchone(
+            "SELECT ts, temp_x100, hum_x100, ac_on FROM esp32_temphum "
+            "WHERE location_id = ? AND ts < ? ORDER BY ts DESC LIMIT 1",
+            (loc_id, first_ms)
+        )
+        after = self.db.fetchone(
+            "SELECT ts, temp_x100, hum_x100, ac_on FROM esp32_temphum "
+            "WHERE location_id = ? AND ts > ? ORDER BY ts LIMIT 1",
+            (loc_id, last_ms)
+        )
+        head = [[r['ts'], r['temp_x100'], r['hum_x100'], 1 if r['ac_on'] else 0] for r in (before,) if r]
+        tail = [[r['ts'], r['temp_x100'], r['hum_x100'], 1 if r['ac_on'] else 0] for r in (after,) if r]
+        known = head + rows + tail
+        if len(known) < 2:
+            return rows
+        xs = [r[0] for r in known]
+        out = list(rows)
+        if head and (not rows or rows[0][0] > first_ms):
+            out.insert(0, self._interpolate_row(known, xs, first_ms, head[0][3]))
+        if tail and (not rows or rows[-1][0] < last_ms):
+            out.append(self._interpolate_row(known, xs, last_ms, (rows[-1] if rows else head[0])[3]))
+        return out
+
+    @staticmethod
+    def _interpolate_row(known: List[list[int]], xs: List[int], ts_ms: int, on: int) -> list[int]:
+        return [ts_ms,
+                int(round(interpolate(xs, [r[1] for r in known], ts_ms))),
+                int(round(interpolate(xs, [r[2] for r in known], ts_ms))),
+                on]
+
+    def _fill_history_gaps(self, merged: List[list[int]], source: List[list[int]], bucket_s: int) -> List[list[int]]:
+        """Fill empty buckets between stored points by linear interpolation (compressed raw data)."""
+        if len(source) < 2 or len(merged) < 2:
+            return merged
+        xs = [a[0] for a in source]
+        ts_ = [a[2] for a in source]
+        hs = [a[5] for a in source]
+        step = bucket_s * 1000
+        by_key = {a[0]: a for a in merged}
+        out = []
+        key = merged[0][0]
+        prev = merged[0]
+        while key <= merged[-1][0]:
+            agg = by_key.get(key)
+            if agg is None:
+                # Midpoint of the bucket stands for the dropped readings
+                mid = key + step // 2
+                t = int(round(interpolate(xs, ts_, mid)))
+                h = int(round(interpolate(xs, hs, mid)))
+                on = 1 if prev[8] * 2 >= prev[1] else 0
+                agg = [key, 1, t, t, t, h, h, h, on]
+            out.append(agg)
+            prev = agg
+            key += step
+        return out
+
+    def _merge_history(self, source: List[list[int]], bucket_s: int) -> List[list[int]]:
+        """Fold source aggregates into ``bucket_s`` wide buckets (exact, sums add up)."""
+        merged: Dict[int, list[int]] = {}
+        for ts, count, t_sum, t_min, t_max, h_sum, h_min, h_max, on in source:
+            key = self._bucket_start_ms(ts, bucket_s)
+            agg = merged.get(key)
+            if agg is None:
+                merged[key] = [key, count, t_sum, t_min, t_max, h_sum, h_min, h_max, on]
+                continue
+            agg[1] += count
+            agg[2] += t_sum
+            agg[3] = min(agg[3], t_min)
+            agg[4] = max(agg[4], t_max)
+            agg[5] += h_sum
+            agg[6] = min(agg[6], h_min)
+            agg[7] = max(agg[7], h_max)
+            agg[8] += on
+        return [merged[k] for k in sorted(merged)]
+
+    def _history_point(self, agg: list[int], raw: bool) -> Dict[str, Any]:
+        ts, count, t_sum, t_min, t_max, h_sum, h_min, h_max, on = agg
+        scale = float(self.VALUE_SCALE)
+        point: Dict[str, Any] = {
+            'timestamp': self._ms_to_iso(ts),
+            'temperature': round(t_sum / count / scale, 2),
+            'humidity': round(h_sum / count / scale, 2),
+            'ac_on': on * 2 >= count if count else None,
+        }
+        if not raw:
+            point.update({
+                'temperature_min': t_min / scale,
+                'temperature_max': t_max / scale,
+                'humidity_min': h_min / scale,
+                'humidity_max': h_max / scale,
+                'count': count,
+                'ac_on_ratio': on / count,
+            })
+        return point
+
+    def get_esp32_history(
+        self,
+        locations: List[str],
+        start_ms: int,
+        end_ms: int,
+        bucket_s: int | None = None,
+        points: int | None = None,
+    ) -> Dict[str, Any]:
+        """Readings of several locations over an arbitrary range.
+
+        Either ``bucket_s`` (fixed-width buckets with avg/min/max, served from
+        the coarsest rollup that divides the bucket) or ``points`` (the series
+        is reduced to about that many points with LTTB, starting from the
+        finest source that still yields at least ``points`` samples) must be
+        given. AC on/off transitions inside the range are returned alongside
+        so charts can draw the overlay independent of the sampling. ``cursor``
+        is the timestamp of the newest point; a follow-up request starting
+        there returns that (possibly still filling) point again plus newer ones.
+        """
+        if end_ms <= start_ms:
+            raise ValueError("end must be after start")
+        if (bucket_s is None) == (points is None):
+            raise ValueError("give exactly one of bucket_s or points")
+        span_s = (end_ms - start_ms) / 1000.0
+
+        if bucket_s is not None:
+            bucket_s = int(bucket_s)
+            if bucket_s <= 0:
+                raise ValueError("bucket_s must be positive")
+            if span_s / bucket_s > self.MAX_HISTORY_BUCKETS:
+                raise ValueError(f"too many buckets; at most {self.MAX_HISTORY_BUCKETS} per location")
+            # Merging is exact, so the coarsest dividing rollup gives the same
+            # result as raw data while reading the fewest rows
+            dividing = [r for r in ROLLUP_TABLES if bucket_s % r == 0]
+            sources = [max(dividing)] if dividing else [0]
+        else:
+            points = int(points)
+            if points < 3:
+                raise ValueError("points must be at least 3")
+            per_point_s = span_s / points
+            # Finest source first; fall back to coarser ones when retention
+            # already pruned it for this range
+            sources = [0] + sorted(ROLLUP_TABLES)
+            finest = max(r for r in sources if r <= per_point_s)
+            sources = sources[sources.index(finest):]
+
+        series = []
+        cursor: int | None = None
+        for location in locations:
+            loc_id = self._location_id(location)
+            compressed = self._compression_for(location) is not None
+            data: List[list[int]] = []
+            used = sources[0]
+            if loc_id is not None:
+                for used in sources:
+                    data = self._history_source(loc_id, used, start_ms, end_ms, reconstruct=compressed)
+                    if data:
+                        break
+            if bucket_s is not None:
+                merged = self._merge_history(data, bucket_s)
+                if compressed and used == 0:
+                    merged = self._fill_history_gaps(merged, data, bucket_s)
+                data = merged
+                out = [self._history_point(agg, raw=False) for agg in data]
+            else:
+                data = lttb(data, points, lambda a: a[0],
+                            lambda a: a[2] / a[1], lambda a: a[5] / a[1])
+                out = [self._history_point(agg, raw=(used == 0)) for agg in data]
+            if data:
+                cursor = max(cursor or 0, data[-1][0])
+            series.append({
+                'location': location,
+                'resolution_s': used,
+                'points': out,
+            })
+
+        start_iso = self._ms_to_iso(start_ms)
+        end_iso = self._ms_to_iso(end_ms)
+        return {
+            'start': start_iso,
+            'end': end_iso,
+            'bucket_s': bucket_s,
+            # Epoch ms of the newest point: pass as ``since`` to get what follows
+            'cursor': cursor,
+            'series': series,
+            'ac': {
+                'initial': self.get_last_ac_state_before(start_iso),
+                'events': [
+                    {'timestamp': e['timestamp'], 'is_on': e['is_on']}
+                    for e in self.get_ac_events_between(start_iso, end_iso)
+                ],
+            },
+        }
+
+    # --- Completed-day response cache ---
+
+    def get_day_response(
+        self,
+        location: str,
+        date_str: str,
+        resolution: str,
+        build: Callable[[], Any],
+    ) -> tuple[bytes, str]:
+        """Serialized JSON of ``build()`` for one location and local day, plus its ETag.
+
+        Days before today never change (short of retention or a backfill, which
+        call ``invalidate_days``), so their bodies are cached by
+        (location, day, resolution); today's are built fresh every time.
+        Raises ValueError on a malformed date.
+        """
+        day = date.fromisoformat(date_str)
+        cacheable = day < datetime.now(self.finland_tz).date()
+        if cacheable:
+            hit = self.day_cache.get(location, day, resolution)
+            if hit is not None:
+                return hit
+        body = json.dumps(build(), separators=(',', ':')).encode('utf-8')
+        if cacheable:
+            return body, self.day_cache.put(location, day, resolution, body)
+        return body, DayCache.etag(body)
+
+    def invalidate_days(self, first: date | None = None, last: date | None = None) -> None:
+        """Drop cached day responses within ``[first, last]`` (open ends allowed)."""
+        try:
+            self.day_cache.invalidate(first, last)
+        except Exception as e:
+            logger.warning("Day cache invalidation failed: %s", e)
+
     # --- AC event logging / queries ---
     def record_ac_event(self, is_on: bool, source: str | None = None, note: str | None = None, when_iso: str | None = None) -> None:
         """Insert an AC on/off event.
@@ -310,119 +1152,93 @@ class Controller:
         return bool(row['is_on'])
 
     def get_last_esp32_temphum(self) -> Optional[ESP32TemperatureHumidity]:
-        row = self.db.fetchone(
-            "SELECT id, location, timestamp, temperature, humidity, ac_on FROM esp32_temphum ORDER BY id DESC LIMIT 1"
-        )
-        if row is None:
-            return None
-        return ESP32TemperatureHumidity(
-            id=row['id'], location=row['location'], timestamp=row['timestamp'],
-            temperature=row['temperature'], humidity=row['humidity'],
-            ac_on=(None if row['ac_on'] is None else bool(row['ac_on']))
-        )
+        latest = self._latest_overall
+        return latest.reading if latest is not None else None
 
     def get_esp32_temphum_for_date(self, date_str: str, location: str) -> List[ESP32TemperatureHumidity]:
+        """Readings of one location for a local (Helsinki) calendar day.
+
+        For a compressed location the day is reconstructed like range
+        history: points interpolated at both day edges from the stored rows
+        just outside, and one interpolated point per ``RAW_FILL_STEP_S``
+        between stored rows further apart (those get ``id=None``).
+        """
+        try:
+            start_ms, end_ms = self._local_day_bounds_ms(date_str)
+        except ValueError:
+            return []
+        loc_id = self._location_id(location)
+        if loc_id is None:
+            return []
         rows = self.db.fetchall(
-            """
-            SELECT id, location, timestamp, temperature, humidity, ac_on
-              FROM esp32_temphum
-             WHERE date(timestamp) = ? AND location = ?
-             ORDER BY timestamp
+            f"""
+            {self._ESP32_SELECT}
+             WHERE e.location_id = ? AND e.ts >= ? AND e.ts < ?
+             ORDER BY e.ts
             """,
-            (date_str, location)
+            (loc_id, start_ms, end_ms)
         )
+        if self._compression_for(location) is None:
+            return [self._row_to_esp32(row) for row in rows]
+        known = [[r['ts'], r['temp_x100'], r['hum_x100'], r['ac_on'], r['id']] for r in rows]
+        known = self._fill_raw_gaps(self._reconstruct_edges(loc_id, known, start_ms, end_ms - 1),
+                                    self.RAW_FILL_STEP_S * 1000)
+        scale = float(self.VALUE_SCALE)
         return [
             ESP32TemperatureHumidity(
-                id=row['id'],
-                location=row['location'],
-                timestamp=row['timestamp'],
-                temperature=row['temperature'],
-                humidity=row['humidity'],
-                ac_on=(None if row['ac_on'] is None else bool(row['ac_on']))
+                id=row[4] if len(row) > 4 else None, location=location,
+                timestamp=self._ms_to_iso(row[0]),
+                temperature=row[1] / scale, humidity=row[2] / scale,
+                ac_on=(None if row[3] is None else bool(row[3])),
             )
-            for row in rows
+            for row in known
         ]
 
+    @staticmethod
+    def _fill_raw_gaps(rows: List[list], step_ms: int) -> List[list]:
+        """Insert ``[ts, t, h, on]`` points every ``step_ms`` between rows further apart."""
+        out: List[list] = []
+        for prev, row in zip(rows, rows[1:]):
+            out.append(prev)
+            xs = [prev[0], row[0]]
+            ts = prev[0] + step_ms
+            while ts < row[0]:
+                out.append([ts,
+                            int(round(interpolate(xs, [prev[1], row[1]], ts))),
+                            int(round(interpolate(xs, [prev[2], row[2]], ts))),
+                            prev[3]])
+                ts += step_ms
+        return out + rows[-1:]
+
     def get_last_esp32_temphum_for_location(self, location: str) -> Optional[ESP32TemperatureHumidity]:
         """Return the most recent ESP32TemperatureHumidity row for a given location, or None."""
-        row = self.db.fetchone(
-            """
-            SELECT id, location, timestamp, temperature, humidity, ac_on
-              FROM esp32_temphum
-             WHERE location = ?
-             ORDER BY timestamp DESC, id DESC
-             LIMIT 1
-            """,
-            (location,)
-        )
-        if row is None:
-            return None
-        return ESP32TemperatureHumidity(
-            id=row['id'],
-            location=row['location'],
-            timestamp=row['timestamp'],
-            temperature=row['temperature'],
-            humidity=row['humidity'],
-            ac_on=(None if row['ac_on'] is None else bool(row['ac_on']))
-        )
+        latest = self._latest.get(location)
+        return latest.reading if latest is not None else None
 
     def get_unique_locations(self) -> List[Dict[str, Any]]:
         """
         Return the latest (most recent) reading per unique location,
-        as a list of dicts with keys: location, temp, hum.
+        as a list of dicts with keys: location, temperature, humidity,
+        timestamp and age_s (seconds since the reading).
         """
-        try:
-            # Fast path: use a window function to rank rows per location
-            rows = self.db.fetchall(
-                """
-                SELECT id, location, timestamp, temperature, humidity
-                FROM (
-                  SELECT e.*, ROW_NUMBER() OVER (
-                              PARTITION BY location
-                              ORDER BY timestamp DESC, id DESC
-                            ) AS rn
-                  FROM esp32_temphum AS e
-                )
-                WHERE rn = 1
-                ORDER BY location
-                """
-            )
-        except Exception:
-            # Fallback for older SQLite versions without window functions
-            rows = self.db.fetchall(
-                """
-                SELECT e.id, e.location, e.timestamp, e.temperature, e.humidity
-                FROM esp32_temphum AS e
-                WHERE e.id = (
-                    SELECT e2.id
-                      FROM esp32_temphum AS e2
-                     WHERE e2.location = e.location
-                     ORDER BY e2.timestamp DESC, e2.id DESC
-                     LIMIT 1
-                )
-                ORDER BY e.location
-                """
-            )
-
         return [
             {
-                "location": row["location"],
-                "temperature": float(row["temperature"]) if row["temperature"] is not None else None,
-                "humidity": float(row["humidity"]) if row["humidity"] is not None else None,
-                "timestamp": row["timestamp"],
+                "location": latest.reading.location,
+                "temperature": latest.reading.temperature,
+                "humidity": latest.reading.humidity,
+                "timestamp": latest.reading.timestamp,
+                "age_s": round(latest.age_s, 1),
             }
-            for row in rows
+            for latest in self.get_latest_readings()
         ]
 
     def update_status(self, status: str) -> Status:
         now = datetime.now(self.finland_tz).isoformat()
-        self.db.execute_query(
-            "UPDATE status SET timestamp = ?, status = ?",
+        rows = self.db.execute_returning(
+            "UPDATE status SET timestamp = ?, status = ? RETURNING id, timestamp, status",
             (now, status)
         )
-        row = self.db.fetchone(
-            "SELECT id, timestamp, status FROM status"
-        )
+        row = rows[0] if rows else None
         if row is None:
             raise RuntimeError("Failed to retrieve inserted status record")
         return Status(id=row['id'], timestamp=row['timestamp'], status=row['status'])
@@ -437,16 +1253,11 @@ class Controller:
 
     def record_image(self, image_base64: str) -> ImageData:
         now = datetime.now(self.finland_tz).isoformat()
-        self.db.execute_query(
+        cursor = self.db.execute_query(
             "INSERT INTO images (timestamp, image) VALUES (?, ?)",
             (now, image_base64)
         )
-        row = self.db.fetchone(
-            "SELECT id, timestamp, image FROM images ORDER BY id DESC LIMIT 1"
-        )
-        if row is None:
-            raise RuntimeError("Failed to retrieve inserted image record")
-        return ImageData(id=row['id'], timestamp=row['timestamp'], image=row['image'])
+        return ImageData(id=cursor.lastrowid, timestamp=now, image=image_base64)
 
     def get_last_image(self) -> Optional[ImageData]:
         row = self.db.fetchone(
@@ -531,14 +1342,15 @@ class Controller:
         # Use a password hash to store the secret (includes salt and iterations)
         secret_hash = generate_password_hash(secret)
         now = datetime.now(self.finland_tz).isoformat()
-        self.db.execute_query(
-            "INSERT INTO api_keys (key_id, name, secret_hash, created_at, created_by, revoked, last_used_at) VALUES (?, ?, ?, ?, ?, 0, NULL)",
+        rows = self.db.execute_returning(
+            """
+            INSERT INTO api_keys (key_id, name, secret_hash, created_at, created_by, revoked, last_used_at)
+            VALUES (?, ?, ?, ?, ?, 0, NULL)
+            RETURNING id, key_id, name, created_at, created_by, revoked, last_used_at
+            """,
             (key_id, name.strip(), secret_hash, now, created_by)
         )
-        row = self.db.fetchone(
-            "SELECT id, key_id, name, created_at, created_by, revoked, last_used_at FROM api_keys WHERE key_id = ?",
-            (key_id,)
-        )
+        row = rows[0] if rows else None
         if row is None:
             raise RuntimeError("Failed to create API key")
         api_key = ApiKey(
@@ -548,6 +1360,7 @@ class Controller:
         return api_key, token
 
     def list_api_keys(self) -> list[ApiKey]:
+        self.flush_api_key_usage()
         rows = self.db.fetchall(
             "SELECT id, key_id, name, created_at, created_by, revoked, last_used_at FROM api_keys ORDER BY id DESC",
             ()
@@ -562,15 +1375,66 @@ class Controller:
 
     def delete_api_key(self, key_id: str) -> None:
         self.db.execute_query("DELETE FROM api_keys WHERE key_id = ?", (key_id,))
+        self._forget_api_key(key_id)
 
     def revoke_api_key(self, key_id: str) -> None:
         self.db.execute_query("UPDATE api_keys SET revoked = 1 WHERE key_id = ?", (key_id,))
+        self._forget_api_key(key_id)
+
+    def _forget_api_key(self, key_id: str) -> None:
+        """Drop cached verifications of ``key_id`` so it stops working immediately.
+
+        Called after the DB write, so a verification reading the row later
+        sees the change; one already in flight sees the bumped generation.
+        """
+        with self._api_key_lock:
+            self._api_key_generation += 1
+            for digest in [d for d, (_, meta) in self._api_key_cache.items() if meta['key_id'] == key_id]:
+                del self._api_key_cache[digest]
+
+    def _touch_api_key(self, key_pk: int) -> None:
+        now = datetime.now(self.finland_tz).isoformat()
+        with self._api_key_lock:
+            self._api_key_touches[key_pk] = now
+            due = time.monotonic() - self._api_key_flushed_at >= self.API_KEY_TOUCH_FLUSH_S
+        if due:
+            self.flush_api_key_usage()
+
+    def flush_api_key_usage(self) -> None:
+        """Write pending last_used_at updates in one batch (best-effort)."""
+        with self._api_key_lock:
+            pending, self._api_key_touches = self._api_key_touches, {}
+            self._api_key_flushed_at = time.monotonic()
+        if not pending:
+            return
+        try:
+            self.db.executemany(
+                "UPDATE api_keys SET last_used_at = ? WHERE id = ?",
+                [(ts, pk) for pk, ts in pending.items()]
+            )
+        except Exception as e:
+            logger.debug("API key usage flush failed: %s", e)
 
     def verify_api_key_token(self, token: str) -> dict | None:
         """Verify a presented API key token and return key metadata on success.
 
-        On success, updates last_used_at. Returns dict with key fields; otherwise None.
+        On success, records last_used_at (written in batches, see
+        flush_api_key_usage). Returns dict with key fields; otherwise None.
+        Successful verifications are cached for API_KEY_CACHE_TTL_S so the slow
+        password hash is not re-run on every device request.
         """
+        digest = hmac.new(self._api_key_hmac_key, str(token or '').encode('utf-8'), hashlib.sha256).digest()
+        with self._api_key_lock:
+            cached = self._api_key_cache.get(digest)
+        if cached is not None:
+            expires_at, meta = cached
+            if time.monotonic() < expires_at:
+                self._touch_api_key(meta['id'])
+                return dict(meta)
+            with self._api_key_lock:
+                self._api_key_cache.pop(digest, None)
+        with self._api_key_lock:
+            generation = self._api_key_generation
         try:
             if not token or not token.startswith('sk_'):
                 return None
@@ -593,13 +1457,7 @@ class Controller:
             return None
         if not check_password_hash(row['secret_hash'], secret):
             return None
-        # Update last_used_at best-effort
-        try:
-            now = datetime.now(self.finland_tz).isoformat()
-            self.db.execute_query("UPDATE api_keys SET last_used_at = ? WHERE id = ?", (now, row['id']))
-        except Exception:
-            pass
-        return {
+        meta = {
             'id': row['id'],
             'key_id': row['key_id'],
             'name': row['name'],
@@ -608,6 +1466,12 @@ class Controller:
             'revoked': bool(row['revoked']),
             'last_used_at': row['last_used_at'],
         }
+        with self._api_key_lock:
+            # A revoke/delete since the row was read: answer this request, don't cache
+            if generation == self._api_key_generation:
+                self._api_key_cache[digest] = (time.monotonic() + self.API_KEY_CACHE_TTL_S, meta)
+        self._touch_api_key(row['id'])
+        return dict(meta)
 
     # --- Thermostat configuration operations ---
     def get_thermostat_conf(self) -> ThermostatConf | None:
@@ -623,6 +1487,10 @@ class Controller:
         )
         if row is None:
             return None
+        return self._row_to_thermostat_conf(row)
+
+    @staticmethod
+    def _row_to_thermostat_conf(row: sqlite3.Row) -> ThermostatConf:
         return ThermostatConf(
             id=row['id'],
             sleep_active=bool(row['sleep_active']),
@@ -673,7 +1541,7 @@ class Controller:
         current_phase: str | None = None,
         phase_started_at: str | None = None,
     ) -> ThermostatConf:
-        self.db.execute_query(
+        rows = self.db.execute_returning(
             """
             INSERT INTO thermostat_conf (id, sleep_active, sleep_start, sleep_stop, sleep_weekly, control_locations, target_temp, pos_hysteresis, neg_hysteresis, thermo_active,
                                          total_on_s, total_off_s, min_on_s, min_off_s, poll_interval_s, smooth_window, max_stale_s,
@@ -698,6 +1566,10 @@ class Controller:
                 max_stale_s = excluded.max_stale_s,
                 current_phase = excluded.current_phase,
                 phase_started_at = excluded.phase_started_at
+            RETURNING id, sleep_active, sleep_start, sleep_stop, sleep_weekly, control_locations, target_temp, pos_hysteresis, neg_hysteresis, thermo_active,
+                      total_on_s, total_off_s,
+                      min_on_s, min_off_s, poll_interval_s, smooth_window, max_stale_s,
+                      current_phase, phase_started_at
             """,
             (
                 1 if sleep_active else 0,
@@ -720,11 +1592,36 @@ class Controller:
                 phase_started_at,
             ),
         )
-        conf = self.get_thermostat_conf()
-        if conf is None:
+        if not rows:
             # This should never happen after UPSERT
             raise RuntimeError("Failed to save thermostat configuration")
-        return conf
+        return self._row_to_thermostat_conf(rows[0])
+
+    # Columns update_thermostat_conf may write (everything but the id)
+    THERMOSTAT_CONF_COLUMNS = frozenset({
+        'sleep_active', 'sleep_start', 'sleep_stop', 'sleep_weekly', 'control_locations',
+        'target_temp', 'pos_hysteresis', 'neg_hysteresis', 'thermo_active',
+        'total_on_s', 'total_off_s', 'min_on_s', 'min_off_s', 'poll_interval_s',
+        'smooth_window', 'max_stale_s', 'current_phase', 'phase_started_at',
+    })
+
+    def update_thermostat_conf(self, fields: Dict[str, Any]) -> bool:
+        """Write only the given columns of the config row.
+
+        Booleans are stored as 0/1. Returns False when the row does not exist
+        yet (nothing written); use ``save_thermostat_conf`` to create it.
+        """
+        unknown = set(fields) - self.THERMOSTAT_CONF_COLUMNS
+        if unknown:
+            raise ValueError(f"Unknown thermostat_conf columns: {sorted(unknown)}")
+        if not fields:
+            return True
+        cols = sorted(fields)
+        params = tuple(int(fields[c]) if isinstance(fields[c], bool) else fields[c] for c in cols)
+        assignments = ", ".join(f"{c} = ?" for c in cols)
+        updated = self.db.write(lambda conn: conn.execute(
+            f"UPDATE thermostat_conf SET {assignments} WHERE id = 1", params).rowcount)
+        return updated > 0
 
     def ensure_thermostat_conf_seeded_from(self, cfg: object | None = None) -> ThermostatConf:
         """
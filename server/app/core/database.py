@@ -3,30 +3,238 @@
 import sqlite3
 from sqlite3 import Connection, Cursor
 import threading
-from typing import Any, List, Optional, Tuple
+import queue
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# Pre-aggregated ESP32 readings: bucket size in seconds -> table name.
+# Buckets up to 1 h are epoch-aligned (= local, Helsinki offsets are whole
+# hours); daily buckets start at local midnight.
+ROLLUP_TABLES = {
+    60: 'esp32_rollup_1m',
+    900: 'esp32_rollup_15m',
+    3600: 'esp32_rollup_1h',
+    86400: 'esp32_rollup_1d',
+}
+
+
+class _CommitGroup:
+    """Writes sharing one group-commit transaction; set when it is durable."""
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.error: Optional[BaseException] = None
 
 class DatabaseManager:
+    """Process-wide SQLite gateway backed by a small connection pool.
+
+    Every call checks out its own connection (and its own cursor), so request
+    greenlets, the thermostat thread, timers and the DB log handler never share
+    cursor state. The database runs in WAL mode: readers proceed concurrently
+    with the single writer, and writers are serialized in-process by
+    ``_write_lock`` instead of spinning on ``SQLITE_BUSY``.
+
+    With ``group_commit_ms > 0`` single-statement writes arriving within that
+    window share one transaction (one fsync); each caller still blocks until
+    its write is committed. ``transaction()`` commits an open group first,
+    because the group holds SQLite's write lock on its own connection.
+    """
     _instance = None
     _lock = threading.Lock()
 
-    def __new__(cls, db_path: str):
+    # Idle connections kept around for reuse; extra ones are closed on release
+    POOL_SIZE = 8
+    # Per-connection pragmas (journal_mode=WAL is persistent and set once)
+    PRAGMAS: Tuple[Tuple[str, Any], ...] = (
+        ("synchronous", "NORMAL"),      # WAL-safe; fsync only at checkpoints
+        ("busy_timeout", 5000),         # ms to wait on a locked database
+        ("cache_size", -8000),          # negative = KiB → 8 MiB page cache
+        ("mmap_size", 64 * 1024 * 1024),
+        ("temp_store", "MEMORY"),
+    )
+
+    def __new__(cls, db_path: str, *args, **kwargs):
         with cls._lock:
             if cls._instance is None:
                 cls._instance = super(DatabaseManager, cls).__new__(cls)
                 cls._instance._initialized = False
         return cls._instance
 
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, group_commit_ms: int = 0):
         if getattr(self, '_initialized', False):
             return
         self._initialized = True
         self.db_path = db_path
-        self.conn: Connection = sqlite3.connect(self.db_path, check_same_thread=False)
-        self.conn.row_factory = sqlite3.Row
-        self.cursor: Cursor = self.conn.cursor()
+        self.group_commit_ms = max(0, int(group_commit_ms or 0))
+        self._pool: "queue.LifoQueue[Connection]" = queue.LifoQueue(maxsize=self.POOL_SIZE)
+        # Connection currently checked out by this thread/greenlet (re-entrancy)
+        self._local = threading.local()
+        self._write_lock = threading.RLock()
+        self.journal_mode: Optional[str] = None
+        # Group-commit state: dedicated writer connection + open group
+        self._writer_conn: Optional[Connection] = None
+        self._group: Optional[_CommitGroup] = None
         self._create_tables()
 
+    # --- Connection pool ---
+
+    def _open_connection(self) -> Connection:
+        # isolation_level=None: autocommit; multi-statement writes use transaction()
+        conn = sqlite3.connect(
+            self.db_path, check_same_thread=False, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        for name, value in self.PRAGMAS:
+            try:
+                conn.execute(f"PRAGMA {name} = {value}")
+            except sqlite3.DatabaseError:
+                # Best-effort: older builds may not know every pragma
+                pass
+        if self.journal_mode is None:
+            # Let retention return freed pages via PRAGMA incremental_vacuum.
+            # Must precede WAL/table creation, so it only takes effect on a
+            # fresh database (existing files need one manual VACUUM).
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            row = conn.execute("PRAGMA journal_mode = WAL").fetchone()
+            self.journal_mode = str(row[0]).lower() if row else None
+        return conn
+
+    def _acquire(self) -> Connection:
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            return self._open_connection()
+
+    def _release(self, conn: Connection) -> None:
+        if conn.in_transaction:
+            # Never hand out a connection with a dangling transaction
+            conn.rollback()
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    @contextmanager
+    def connection(self) -> Iterator[Connection]:
+        """Check out a pooled connection for the current thread/greenlet.
+
+        Nested use within the same thread/greenlet reuses the same connection,
+        so helpers can be called inside a ``transaction()`` block.
+        """
+        held = getattr(self._local, 'conn', None)
+        if held is not None:
+            yield held
+            return
+        conn = self._acquire()
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            self._release(conn)
+
+    @contextmanager
+    def transaction(self) -> Iterator[Connection]:
+        """Run several statements as one write transaction (one commit/fsync)."""
+        with self._write_lock, self.connection() as conn:
+            if conn.in_transaction:
+                # Already inside an outer transaction(); let it commit
+                yield conn
+                return
+            # An open commit group holds the database write lock; BEGIN
+            # IMMEDIATE on another connection would wait on it while we hold
+            # the lock its flush needs
+            self._commit_group()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+
+    # --- Group commit ---
+
+    def write(self, fn: Callable[[Connection], T]) -> T:
+        """Run ``fn(conn)`` as one atomic write, coalescing commits when enabled.
+
+        ``fn`` may issue several statements; they commit (or roll back)
+        together. Returns whatever ``fn`` returns.
+        """
+        held = getattr(self._local, 'conn', None)
+        if not self.group_commit_ms or (held is not None and held.in_transaction):
+            # Own transaction, or part of the caller's enclosing transaction()
+            with self.transaction() as conn:
+                return fn(conn)
+
+        with self._write_lock:
+            if self._writer_conn is None:
+                self._writer_conn = self._open_connection()
+            conn = self._writer_conn
+            if self._group is None:
+                conn.execute("BEGIN IMMEDIATE")
+                self._group = _CommitGroup()
+                timer = threading.Timer(
+                    self.group_commit_ms / 1000.0, self._flush_group)
+                timer.daemon = True
+                timer.start()
+            group = self._group
+            # A failing statement must not poison the other writes in the group
+            conn.execute("SAVEPOINT group_write")
+            try:
+                result = fn(conn)
+            except BaseException:
+                conn.execute("ROLLBACK TO group_write")
+                conn.execute("RELEASE group_write")
+                raise
+            conn.execute("RELEASE group_write")
+
+        group.done.wait()
+        if group.error is not None:
+            raise group.error
+        return result
+
+    def _flush_group(self) -> None:
+        with self._write_lock:
+            self._commit_group()
+
+    def _commit_group(self) -> None:
+        """Commit the open group, if any (caller holds ``_write_lock``)."""
+        group, self._group = self._group, None
+        if group is None:
+            return
+        try:
+            self._writer_conn.commit()  # type: ignore[union-attr]
+        except BaseException as e:
+            group.error = e
+            try:
+                self._writer_conn.rollback()  # type: ignore[union-attr]
+            except Exception:
+                pass
+        finally:
+            group.done.set()
+
+    def close(self) -> None:
+        """Flush a pending commit group and close all idle pooled connections."""
+        self._flush_group()
+        with self._write_lock:
+            if self._writer_conn is not None:
+                self._writer_conn.close()
+                self._writer_conn = None
+        while True:
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                conn.close()
+            except Exception:
+                pass
+
     def _create_tables(self) -> None:
+        conn = self._acquire()
+        cur: Cursor = conn.cursor()
         # Ensure all required tables exist
         tables = {
             'users': (
@@ -48,12 +256,18 @@ class DatabaseManager:
                 'revoked BOOLEAN NOT NULL DEFAULT 0, '
                 'last_used_at TEXT'
             ),
+            'locations': (
+                'id INTEGER PRIMARY KEY, '
+                'name TEXT UNIQUE NOT NULL'
+            ),
+            # Compact time series: epoch-ms timestamps, location dictionary id,
+            # values as fixed-point integers (x100). See Controller helpers.
             'esp32_temphum': (
-                'id INTEGER PRIMARY KEY AUTOINCREMENT, '
-                'location TEXT NOT NULL, '
-                'timestamp TEXT NOT NULL, '
-                'temperature REAL NOT NULL, '
-                'humidity REAL NOT NULL, '
+                'id INTEGER PRIMARY KEY, '
+                'location_id INTEGER NOT NULL REFERENCES locations (id), '
+                'ts INTEGER NOT NULL, '
+                'temp_x100 INTEGER NOT NULL, '
+                'hum_x100 INTEGER NOT NULL, '
                 'ac_on BOOLEAN'
             ),
             'ac_events': (
@@ -108,104 +322,73 @@ class DatabaseManager:
                 'message TEXT NOT NULL'
             )
         }
+        for table in ROLLUP_TABLES.values():
+            tables[table] = (
+                'location_id INTEGER NOT NULL, '
+                'bucket_ts INTEGER NOT NULL, '
+                'count INTEGER NOT NULL, '
+                'temp_sum INTEGER NOT NULL, '
+                'temp_min INTEGER NOT NULL, '
+                'temp_max INTEGER NOT NULL, '
+                'hum_sum INTEGER NOT NULL, '
+                'hum_min INTEGER NOT NULL, '
+                'hum_max INTEGER NOT NULL, '
+                'ac_on_count INTEGER NOT NULL DEFAULT 0, '
+                'PRIMARY KEY (location_id, bucket_ts)'
+            )
         for name, schema in tables.items():
-            self.cursor.execute(f"CREATE TABLE IF NOT EXISTS {name} ({schema})")
+            cur.execute(f"CREATE TABLE IF NOT EXISTS {name} ({schema})")
+
+        self._migrate_esp32_temphum(conn, tables['esp32_temphum'])
 
         # Clean up test data if present
-        self.cursor.execute("DELETE FROM esp32_temphum WHERE location='Test' OR location='test'")
+        cur.execute(
+            "DELETE FROM esp32_temphum WHERE location_id IN "
+            "(SELECT id FROM locations WHERE name IN ('Test', 'test'))"
+        )
 
         # Insert default values for status and timelapse_conf if they don't exist
-        self.cursor.execute("""
+        cur.execute("""
         INSERT OR IGNORE INTO status (id, timestamp, status)
         VALUES (1, datetime('now'), 'IDLE')
         """)
 
-        self.cursor.execute("""
+        cur.execute("""
         INSERT OR IGNORE INTO timelapse_conf (id, image_delay, temphum_delay, status_delay)
         VALUES (1, 5, 10, 15)
         """)
 
-        triggers = {
-            'keep_only_last_10_images': """
-            CREATE TRIGGER IF NOT EXISTS keep_only_last_10_images
-            AFTER INSERT ON images
-            FOR EACH ROW
-            BEGIN
-                DELETE FROM images
-                WHERE id NOT IN (
-                    SELECT id
-                    FROM images
-                    ORDER BY timestamp DESC
-                    LIMIT 10
-                );
-            END;
-            """,
-            'cleanup_temphum_after_insert':"""  
-            CREATE TRIGGER IF NOT EXISTS cleanup_temphum_after_insert
-            AFTER INSERT ON temphum
-            BEGIN
-                DELETE FROM temphum
-                WHERE timestamp < datetime('now', '-7 days');
-            END;
-            """,
-            'cleanup_esp32_temphum_after_insert':"""  
-            CREATE TRIGGER IF NOT EXISTS cleanup_esp32_temphum_after_insert
-            AFTER INSERT ON esp32_temphum
-            BEGIN
-                DELETE FROM esp32_temphum
-                WHERE timestamp < datetime('now', '-7 days');
-            END;
-            """
-            ,
-            'cleanup_ac_events_after_insert':"""
-            CREATE TRIGGER IF NOT EXISTS cleanup_ac_events_after_insert
-            AFTER INSERT ON ac_events
-            BEGIN
-                DELETE FROM ac_events
-                WHERE timestamp < datetime('now', '-30 days');
-            END;
-            """
-        }
-
-        for name, trigger_sql in triggers.items():
-            self.cursor.executescript(trigger_sql)
+        # Retention used to run as AFTER INSERT triggers, turning every insert
+        # into a range scan; it is now done in batches by the retention service
+        # (services/retention). Drop the legacy triggers from existing databases.
+        for name in (
+            'keep_only_last_10_images',
+            'cleanup_temphum_after_insert',
+            'cleanup_esp32_temphum_after_insert',
+            'cleanup_ac_events_after_insert',
+        ):
+            cur.execute(f"DROP TRIGGER IF EXISTS {name}")
 
         # --- Indexes for performance-critical queries ---
-        # Speed up latest-per-location lookups used by Controller.get_unique_locations()
-        # Pattern: WHERE location = ? ORDER BY timestamp DESC, id DESC LIMIT 1
-        # This composite index allows an efficient seek to the newest row per location.
-        try:
-            self.cursor.execute(
-                """
-                CREATE INDEX IF NOT EXISTS idx_esp32_temphum_loc_ts_id
-                ON esp32_temphum (location, timestamp DESC, id DESC)
-                """
-            )
-        except Exception:
-            # Best-effort: ignore if SQLite version doesn't support DESC in index columns
-            try:
-                self.cursor.execute(
-                    "CREATE INDEX IF NOT EXISTS idx_esp32_temphum_loc_ts_id ON esp32_temphum (location, timestamp, id)"
-                )
-            except Exception:
-                pass
+        # Latest-per-location and local-day reads are pure range scans:
+        # WHERE location_id = ? AND ts >= ? AND ts < ? / ORDER BY ts DESC LIMIT 1
+        cur.execute(
+            "CREATE INDEX IF NOT EXISTS idx_esp32_temphum_loc_ts ON esp32_temphum (location_id, ts)"
+        )
+        # Age-based retention: WHERE ts < ? seeks instead of scanning
+        cur.execute(
+            "CREATE INDEX IF NOT EXISTS idx_esp32_temphum_ts ON esp32_temphum (ts)"
+        )
 
-        # Optional: help date-based reads per location
-        # Pattern: WHERE date(timestamp) = ? AND location = ?
-        # Expression indexes are supported by SQLite; if not, ignore.
-        try:
-            self.cursor.execute(
-                """
-                CREATE INDEX IF NOT EXISTS idx_esp32_temphum_date_loc
-                ON esp32_temphum (date(timestamp), location)
-                """
+        # Rollup retention: WHERE bucket_ts < ?
+        for table in ROLLUP_TABLES.values():
+            cur.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_{table}_ts ON {table} (bucket_ts)"
             )
-        except Exception:
-            pass
 
         # Indexes for ac_events
         try:
-            self.cursor.execute(
+            cur.execute(
                 "CREATE INDEX IF NOT EXISTS idx_ac_events_ts ON ac_events (timestamp)"
             )
         except Exception:
@@ -213,7 +396,7 @@ class DatabaseManager:
 
         # Indexes for API keys
         try:
-            self.cursor.execute(
+            cur.execute(
                 "CREATE UNIQUE INDEX IF NOT EXISTS idx_api_keys_key_id ON api_keys (key_id)"
             )
         except Exception:
@@ -221,46 +404,110 @@ class DatabaseManager:
 
         # Try to add weekly sleep column for thermostat_conf if missing
         try:
-            self.cursor.execute("ALTER TABLE thermostat_conf ADD COLUMN sleep_weekly TEXT")
+            cur.execute("ALTER TABLE thermostat_conf ADD COLUMN sleep_weekly TEXT")
         except Exception:
             # Ignore if already exists
             pass
         try:
-            self.cursor.execute("ALTER TABLE thermostat_conf ADD COLUMN control_locations TEXT")
+            cur.execute("ALTER TABLE thermostat_conf ADD COLUMN control_locations TEXT")
         except Exception:
             pass
+        for column in ("current_phase TEXT", "phase_started_at TEXT"):
+            try:
+                cur.execute(f"ALTER TABLE thermostat_conf ADD COLUMN {column}")
+            except Exception:
+                pass
 
-        self.conn.commit()
+        self._release(conn)
+
+    def _migrate_esp32_temphum(self, conn: Connection, schema: str) -> None:
+        """Convert a legacy esp32_temphum table (ISO text timestamps, location
+        names, REAL values) into the compact layout, in one transaction."""
+        cols = {row['name'] for row in conn.execute("PRAGMA table_info(esp32_temphum)")}
+        if 'location' not in cols:
+            return
+        with self._write_lock:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "INSERT OR IGNORE INTO locations (name) "
+                    "SELECT DISTINCT location FROM esp32_temphum"
+                )
+                conn.execute(f"CREATE TABLE esp32_temphum_compact ({schema})")
+                # julianday() understands the stored '+02:00'/'+03:00' offsets
+                conn.execute(
+                    """
+                    INSERT INTO esp32_temphum_compact (id, location_id, ts, temp_x100, hum_x100, ac_on)
+                    SELECT e.id, l.id,
+                           CAST(ROUND((julianday(e.timestamp) - 2440587.5) * 86400000) AS INTEGER),
+                           CAST(ROUND(e.temperature * 100) AS INTEGER),
+                           CAST(ROUND(e.humidity * 100) AS INTEGER),
+                           e.ac_on
+                      FROM esp32_temphum AS e
+                      JOIN locations AS l ON l.name = e.location
+                     WHERE julianday(e.timestamp) IS NOT NULL
+                    """
+                )
+                conn.execute("DROP TABLE esp32_temphum")
+                conn.execute("ALTER TABLE esp32_temphum_compact RENAME TO esp32_temphum")
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
 
     def execute_query(
         self,
         query: str,
         params: Tuple[Any, ...] = ()
     ) -> Cursor:
-        self.cursor.execute(query, params)
-        self.conn.commit()
-        return self.cursor
+        return self.write(lambda conn: conn.execute(query, params))
+
+    def execute_returning(
+        self,
+        query: str,
+        params: Tuple[Any, ...] = ()
+    ) -> List[sqlite3.Row]:
+        """Run an ``INSERT/UPDATE ... RETURNING`` write and return its rows.
+
+        Rows are fetched before the statement is committed, so the written
+        values come back in the same round trip.
+        """
+        return self.write(lambda conn: conn.execute(query, params).fetchall())
 
     def executemany(
         self,
         query: str,
         param_list: List[Tuple[Any, ...]]
     ) -> None:
-        self.cursor.executemany(query, param_list)
-        self.conn.commit()
+        with self.transaction() as conn:
+            conn.executemany(query, param_list)
+
+    def incremental_vacuum(self, pages: int) -> bool:
+        """Return up to ``pages`` free pages to the filesystem.
+
+        Returns False when the database is not in ``auto_vacuum=INCREMENTAL``.
+        """
+        row = self.fetchone("PRAGMA auto_vacuum")
+        if row is None or int(row[0]) != 2:
+            return False
+        with self._write_lock, self.connection() as conn:
+            self._commit_group()
+            # executescript steps the pragma to completion; execute() frees one page
+            conn.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+        return True
 
     def fetchone(
         self,
         query: str,
         params: Tuple[Any, ...] = ()
     ) -> Optional[sqlite3.Row]:
-        self.cursor.execute(query, params)
-        return self.cursor.fetchone()
+        with self.connection() as conn:
+            return conn.execute(query, params).fetchone()
 
     def fetchall(
         self,
         query: str,
         params: Tuple[Any, ...] = ()
     ) -> List[sqlite3.Row]:
-        self.cursor.execute(query, params)
-        return self.cursor.fetchall()
+        with self.connection() as conn:
+            return conn.execute(query, params).fetchall()
@@ -0,0 +1,133 @@
+# daycache.py
+
+"""Cache of serialized responses for completed (immutable) local days.
+
+Entries are keyed by (location, day, resolution) and hold the exact bytes sent
+to the client together with their ETag. A byte-bounded LRU sits in front of an
+optional on-disk tier laid out as ``<cache_dir>/<YYYY-MM-DD>/<key>.json``, so a
+whole day can be dropped by removing its directory.
+"""
+
+import hashlib
+import logging
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Key = Tuple[str, str, str]  # (location, ISO day, resolution)
+
+
+class DayCache:
+    """Two-tier (memory LRU + disk) cache of per-day response bodies.
+
+    :param cache_dir: directory of the disk tier; None keeps memory only
+    :param max_bytes: memory budget of the LRU tier
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: int = 16 * 1024 * 1024) -> None:
+        self.cache_dir = cache_dir
+        self.max_bytes = max(0, int(max_bytes))
+        self._mem: "OrderedDict[Key, tuple[bytes, str]]" = OrderedDict()
+        self._mem_bytes = 0
+        self._lock = threading.Lock()
+        if cache_dir:
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+            except OSError as e:
+                logger.warning("Day cache dir %s unusable, memory only: %s", cache_dir, e)
+                self.cache_dir = None
+
+    @staticmethod
+    def etag(body: bytes) -> str:
+        return hashlib.sha1(body).hexdigest()
+
+    # --- Lookup / store ---
+
+    def get(self, location: str, day: date, resolution: str) -> Optional[tuple[bytes, str]]:
+        """Return ``(body, etag)`` or None."""
+        key = (location, day.isoformat(), resolution)
+        with self._lock:
+            hit = self._mem.get(key)
+            if hit is not None:
+                self._mem.move_to_end(key)
+                return hit
+        path = self._path(key)
+        if path is None or not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as fh:
+                body = fh.read()
+        except OSError:
+            return None
+        entry = (body, self.etag(body))
+        self._remember(key, entry)
+        return entry
+
+    def put(self, location: str, day: date, resolution: str, body: bytes) -> str:
+        """Store ``body`` and return its ETag."""
+        key = (location, day.isoformat(), resolution)
+        entry = (body, self.etag(body))
+        self._remember(key, entry)
+        path = self._path(key)
+        if path is not None:
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp, 'wb') as fh:
+                    fh.write(body)
+                os.replace(tmp, path)
+            except OSError as e:
+                logger.debug("Day cache write failed for %s: %s", key, e)
+        return entry[1]
+
+    # --- Invalidation ---
+
+    def invalidate(self, first: Optional[date] = None, last: Optional[date] = None) -> None:
+        """Drop every entry whose day is within ``[first, last]`` (open ends allowed)."""
+        lo = first.isoformat() if first else None
+        hi = last.isoformat() if last else None
+
+        def _hit(day: str) -> bool:
+            return (lo is None or day >= lo) and (hi is None or day <= hi)
+
+        with self._lock:
+            for key in [k for k in self._mem if _hit(k[1])]:
+                body, _ = self._mem.pop(key)
+                self._mem_bytes -= len(body)
+        if not self.cache_dir:
+            return
+        try:
+            days = os.listdir(self.cache_dir)
+        except OSError:
+            return
+        for day in days:
+            if len(day) == 10 and _hit(day):
+                shutil.rmtree(os.path.join(self.cache_dir, day), ignore_errors=True)
+
+    # --- Internals ---
+
+    def _remember(self, key: Key, entry: tuple[bytes, str]) -> None:
+        size = len(entry[0])
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._mem.pop(key, None)
+            if old is not None:
+                self._mem_bytes -= len(old[0])
+            self._mem[key] = entry
+            self._mem_bytes += size
+            while self._mem_bytes > self.max_bytes and self._mem:
+                _, (body, _) = self._mem.popitem(last=False)
+                self._mem_bytes -= len(body)
+
+    def _path(self, key: Key) -> Optional[str]:
+        if not self.cache_dir:
+            return None
+        location, day, resolution = key
+        name = hashlib.sha1(f"{location}\0{resolution}".encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, day, f"{name}.json")
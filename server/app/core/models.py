@@ -2,6 +2,7 @@
 
 from dataclasses import dataclass
 from datetime import datetime
+import time
 import pytz
 
 # --- Data classes for domain models ---
@@ -53,6 +54,31 @@ class ESP32TemperatureHumidity:
     humidity: float
     ac_on: bool | None = None
 
+@dataclass
+class LatestReading:
+    """Newest ESP32 reading of a location, as kept in memory by the controller."""
+    reading: ESP32TemperatureHumidity
+    ts_ms: int  # epoch ms of the reading
+
+    @property
+    def age_s(self) -> float:
+        return max(0.0, time.time() - self.ts_ms / 1000.0)
+
+@dataclass
+class ESP32Rollup:
+    """Aggregate of ESP32 readings for one location and time bucket."""
+    location: str
+    timestamp: str  # ISO start of the bucket
+    resolution_s: int
+    count: int
+    temperature_avg: float
+    temperature_min: float
+    temperature_max: float
+    humidity_avg: float
+    humidity_min: float
+    humidity_max: float
+    ac_on_ratio: float  # share of readings taken while the AC was on
+
 @dataclass
 class Status:
     id: int
@@ -0,0 +1,65 @@
+# state.py
+
+"""In-memory store of the live state shown to views.
+
+Producers (thermostat notifications, printer status, sensor ingest) update
+it as a side effect of broadcasting, so page loads, reconnects and status
+requests are answered from memory without device round trips.
+"""
+
+import copy
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+# View event -> state section it updates (payload fields are merged)
+EVENT_SECTIONS = {
+    'ac_status': 'ac',
+    'ac_state': 'ac',
+    'thermostat_status': 'thermostat',
+    'sleep_status': 'sleep',
+    'thermo_config': 'config',
+    'status': 'printer',
+}
+
+
+class StateStore:
+    """Sections of merged fields plus the latest reading per location.
+
+    :param readings: returns the newest readings (``Controller.get_latest_readings``)
+    """
+
+    def __init__(self, readings: Optional[Callable[[], List[Any]]] = None) -> None:
+        self._readings = readings
+        self._sections: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def update(self, section: str, fields: Dict[str, Any]) -> None:
+        with self._lock:
+            self._sections.setdefault(section, {}).update(fields)
+
+    def apply(self, event: str, payload: Any) -> None:
+        """Fold a view event into its section (other events are ignored)."""
+        section = EVENT_SECTIONS.get(event)
+        if section is not None and isinstance(payload, dict):
+            self.update(section, payload)
+
+    def get(self, section: str) -> Dict[str, Any]:
+        with self._lock:
+            return copy.deepcopy(self._sections.get(section, {}))
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Every section plus ``readings`` (one entry per location)."""
+        with self._lock:
+            out: Dict[str, Any] = copy.deepcopy(self._sections)
+        out['readings'] = []
+        if self._readings is not None:
+            for entry in self._readings():
+                rec = entry.reading
+                out['readings'].append({
+                    'location': rec.location,
+                    'temperature': rec.temperature,
+                    'humidity': rec.humidity,
+                    'ac_on': rec.ac_on,
+                    'timestamp': rec.timestamp,
+                })
+        return out
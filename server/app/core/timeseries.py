@@ -0,0 +1,168 @@
+# timeseries.py
+
+"""Pure helpers for shaping sensor time series (no DB access)."""
+
+from typing import Callable, List, Sequence, TypeVar
+
+T = TypeVar("T")
+
+
+def lttb_indices(xs: Sequence[float], ys: Sequence[float], threshold: int) -> List[int]:
+    """Largest-Triangle-Three-Buckets downsampling.
+
+    Returns the sorted indices of at most ``threshold`` points that best keep
+    the visual shape of ``(xs, ys)``. First and last points are always kept.
+    """
+    n = len(xs)
+    if threshold >= n or n <= 2:
+        return list(range(n))
+    if threshold < 3:
+        return [0, n - 1][:max(threshold, 0)]
+
+    selected = [0]
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # Average of the next bucket is the third triangle vertex
+        nxt_start = int((i + 1) * every) + 1
+        nxt_end = min(int((i + 2) * every) + 1, n)
+        span = nxt_end - nxt_start
+        avg_x = sum(xs[nxt_start:nxt_end]) / span
+        avg_y = sum(ys[nxt_start:nxt_end]) / span
+
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        ax, ay = xs[a], ys[a]
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        selected.append(best)
+        a = best
+    selected.append(n - 1)
+    return selected
+
+
+def lttb(items: Sequence[T], threshold: int, x: Callable[[T], float], *ys: Callable[[T], float]) -> List[T]:
+    """Downsample ``items`` to about ``threshold`` entries with LTTB.
+
+    With several ``ys`` accessors, each metric gets an equal share of the
+    budget and the union of the picks is returned, so peaks of every metric
+    survive.
+    """
+    if threshold >= len(items):
+        return list(items)
+    xs = [x(it) for it in items]
+    share = max(threshold // max(len(ys), 1), 3)
+    keep: set[int] = set()
+    for y in ys:
+        keep.update(lttb_indices(xs, [y(it) for it in items], share))
+    return [items[i] for i in sorted(keep)]
+
+
+class SwingingDoor:
+    """Swinging-door (deadband on the linear trend) compressor of one series.
+
+    Points are ``(ts, values, tag)``: a timestamp, a tuple of channels (one
+    tolerance each) and a tag that must not change silently (e.g. AC on/off).
+    ``offer`` returns the points to store. A point is dropped while the line
+    from the last stored point to it stays within the tolerance of every
+    point in between, so linear interpolation between stored points
+    (``interpolate``) reconstructs every dropped point within tolerance. A
+    tag change or ``max_gap`` since the last stored point forces a store.
+
+    ``save``/``restore`` undo offers whose points could not be written;
+    ``version`` changes with every offer or flush.
+    """
+
+    def __init__(self, tolerances: Sequence[float], max_gap: float) -> None:
+        self.tolerances = tuple(tolerances)
+        self.max_gap = max_gap
+        self.archived: tuple | None = None
+        self.held: tuple | None = None
+        self._lo: List[float] = []
+        self._hi: List[float] = []
+        self.version = 0
+
+    def save(self) -> tuple:
+        return (self.archived, self.held, list(self._lo), list(self._hi), self.version)
+
+    def restore(self, state: tuple) -> None:
+        self.archived, self.held, lo, hi, self.version = state
+        self._lo, self._hi = list(lo), list(hi)
+
+    def _reset(self, point: tuple) -> None:
+        self.archived, self.held = point, None
+        self._lo = [float('-inf')] * len(self.tolerances)
+        self._hi = [float('inf')] * len(self.tolerances)
+
+    def _fits(self, point: tuple) -> bool:
+        a_ts, a_vals, a_tag = self.archived
+        if point[2] != a_tag:
+            return False
+        dt = point[0] - a_ts
+        for k, v in enumerate(point[1]):
+            if not self._lo[k] <= (v - a_vals[k]) / dt <= self._hi[k]:
+                return False
+        return True
+
+    def offer(self, point: tuple) -> List[tuple]:
+        """Feed the next point; returns the points that must be stored now."""
+        self.version += 1
+        last = self.held or self.archived
+        if last is None:
+            self._reset(point)
+            return [point]
+        if point[0] <= last[0]:
+            # Out of order (backfill): store as is, trend state unchanged
+            return [point]
+        out = []
+        if not self._fits(point):
+            if self.held is not None:
+                out.append(self.held)
+                self._reset(self.held)
+            if point[2] != self.archived[2]:
+                out.append(point)
+                self._reset(point)
+                return out
+        a_ts, a_vals, _ = self.archived
+        dt = point[0] - a_ts
+        if dt >= self.max_gap:
+            # Keep-alive: bounds the age of the newest stored point
+            out.append(point)
+            self._reset(point)
+            return out
+        for k, v in enumerate(point[1]):
+            tol = self.tolerances[k]
+            self._lo[k] = max(self._lo[k], (v - tol - a_vals[k]) / dt)
+            self._hi[k] = min(self._hi[k], (v + tol - a_vals[k]) / dt)
+        self.held = point
+        return out
+
+    def flush(self) -> tuple | None:
+        """Pending (not yet stored) point, which is then treated as stored."""
+        held = self.held
+        if held is not None:
+            self.version += 1
+            self._reset(held)
+        return held
+
+
+def interpolate(xs: Sequence[float], ys: Sequence[float], x: float) -> float:
+    """Linear interpolation of ``y`` at ``x`` over sorted ``xs`` (clamped at the ends)."""
+    if x <= xs[0]:
+        return ys[0]
+    if x >= xs[-1]:
+        return ys[-1]
+    lo, hi = 0, len(xs) - 1
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if xs[mid] <= x:
+            lo = mid
+        else:
+            hi = mid
+    span = xs[hi] - xs[lo]
+    if span == 0:
+        return ys[lo]
+    return ys[lo] + (ys[hi] - ys[lo]) * (x - xs[lo]) / span
@@ -4,6 +4,7 @@ from __future__ import annotations
 
 import logging
 from flask import request, current_app, jsonify, g
+from flask.sessions import SecureCookieSessionInterface
 from functools import wraps
 from .extensions import limiter
 
@@ -102,3 +103,27 @@ def require_api_key(view_func):
             logger.exception("API key auth error: %s", e)
             return jsonify({'ok': False, 'error': 'auth_error'}), 500
     return _wrapped
+
+
+class _SessionBypassInterface(SecureCookieSessionInterface):
+    """Cookie sessions, except for path prefixes that never need one.
+
+    Requests under those prefixes get a null session: the cookie is neither
+    parsed nor re-issued, and Flask-Login sees an anonymous user without
+    touching the database.
+    """
+
+    def __init__(self, prefixes: tuple[str, ...]) -> None:
+        super().__init__()
+        self.prefixes = prefixes
+
+    def open_session(self, app, request):
+        if request.path.startswith(self.prefixes):
+            return self.make_null_session(app)
+        return super().open_session(app, request)
+
+
+def configure_session_bypass(app, prefixes: tuple[str, ...] = ('/static/', '/live/')) -> None:
+    """Serve static files and HLS segments without loading the session/user."""
+    app.session_interface = _SessionBypassInterface(tuple(prefixes))
+    logger.info("Session bypass for %s", ", ".join(prefixes))
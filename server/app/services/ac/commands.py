@@ -0,0 +1,224 @@
+"""Non-blocking command worker for one Tuya device.
+
+Callers ``submit`` DP values and return at once. A single worker sends
+everything pending as one multi-DP frame (``set_multiple_values``), so a
+value submitted later for the same DP replaces the earlier one (the last
+power/mode/fan wins) and commands issued together share a frame. A command
+that was never sent because later ones replaced all of its DPs is reported
+as ``superseded``; so is one of which only some DPs were replaced (its
+other DPs still go out, but what it asked for as a whole was not applied).
+One that is still pending when its timeout passes is
+reported as ``timeout`` and is not sent. A failed frame is retried within
+the retry budget while its commands have time left. Each result goes to the
+command's ``on_result`` callback and to ``wait()``.
+"""
+
+from __future__ import annotations
+
+import itertools
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Command:
+    """One submitted set of DP values and, once finished, its result."""
+
+    def __init__(
+        self,
+        cid: int,
+        values: Dict[int, Any],
+        deadline: float,
+        on_result: Optional[Callable[["Command"], None]] = None,
+    ) -> None:
+        self.id = cid
+        self.values = dict(values)
+        self.deadline = deadline
+        self.on_result = on_result
+        # 'done' | 'failed' | 'timeout' | 'superseded' | 'rejected'
+        self.status: Optional[str] = None
+        self.error: Optional[str] = None
+        self.attempts = 0
+        self._done = threading.Event()
+
+    @property
+    def ok(self) -> bool:
+        return self.status in ('done', 'superseded')
+
+    def result(self) -> Dict[str, Any]:
+        return {'id': self.id, 'ok': self.ok, 'status': self.status,
+                'error': self.error, 'attempts': self.attempts}
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until finished; False if ``timeout`` passed first."""
+        return self._done.wait(timeout)
+
+    def _finish(self, status: str, error: Optional[str] = None) -> None:
+        self.status = status
+        self.error = error
+        self._done.set()
+        if self.on_result is not None:
+            try:
+                self.on_result(self)
+            except Exception as e:
+                logger.debug("ac commands: result callback of #%s failed: %s", self.id, e)
+
+
+class CommandQueue:
+    """Coalesce pending commands into single frames sent by one worker.
+
+    :param send: ``send(values)`` sends one frame; a dict with ``Err`` (or an
+        exception) is a failure
+    :param timeout_s: default time a command may wait or be retried
+    :param retries: extra attempts for a failed frame
+    :param retry_delay_s: pause before a retry (doubles each time)
+    :param maxsize: pending commands accepted before ``submit`` rejects
+    """
+
+    def __init__(
+        self,
+        send: Callable[[Dict[int, Any]], Any],
+        timeout_s: float = 10.0,
+        retries: int = 2,
+        retry_delay_s: float = 1.0,
+        maxsize: int = 32,
+    ) -> None:
+        self.send = send
+        self.timeout_s = max(0.1, float(timeout_s))
+        self.retries = max(0, int(retries))
+        self.retry_delay_s = max(0.0, float(retry_delay_s))
+        self.maxsize = max(1, int(maxsize))
+        self._pending: List[Command] = []
+        self._ids = itertools.count(1)
+        self._cond = threading.Condition()
+        self._stop_evt = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.metrics: Dict[str, int] = {
+            'submitted': 0, 'frames': 0, 'done': 0, 'failed': 0,
+            'timeout': 0, 'superseded': 0, 'rejected': 0, 'retries': 0,
+        }
+
+    def submit(
+        self,
+        values: Dict[int, Any],
+        on_result: Optional[Callable[[Command], None]] = None,
+        timeout_s: Optional[float] = None,
+    ) -> Command:
+        """Queue ``values`` (DP index -> value); a full queue finishes the command as ``rejected``."""
+        cmd = Command(next(self._ids), values,
+                      time.monotonic() + (self.timeout_s if timeout_s is None else timeout_s), on_result)
+        with self._cond:
+            self.metrics['submitted'] += 1
+            full = len(self._pending) >= self.maxsize
+            if not full:
+                self._pending.append(cmd)
+                self._cond.notify()
+        if full:
+            self._count('rejected')
+            cmd._finish('rejected', 'command queue full')
+        return cmd
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._cond:
+            self.metrics[name] += n
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return dict(self.metrics, pending=len(self._pending))
+
+    # --- Worker ---
+
+    def _take(self) -> List[Command]:
+        with self._cond:
+            while not self._pending and not self._stop_evt.is_set():
+                self._cond.wait(0.5)
+            batch, self._pending = self._pending, []
+        return batch
+
+    def _run_batch(self, batch: List[Command]) -> None:
+        now = time.monotonic()
+        live = []
+        for cmd in batch:
+            if cmd.deadline <= now:
+                self._count('timeout')
+                cmd._finish('timeout', 'timed out before it was sent')
+            else:
+                live.append(cmd)
+        if not live:
+            return
+
+        # Later values win; a command none of whose DPs survive is superseded
+        # now, one that lost only some of them once its frame is applied
+        frame: Dict[int, Any] = {}
+        owner: Dict[int, Command] = {}
+        for cmd in live:
+            frame.update(cmd.values)
+            owner.update((dp, cmd) for dp in cmd.values)
+        sending = [cmd for cmd in live if any(owner[dp] is cmd for dp in cmd.values)]
+        partial = [cmd for cmd in sending if not all(owner[dp] is cmd for dp in cmd.values)]
+        for cmd in live:
+            if cmd not in sending:
+                self._count('superseded')
+                cmd._finish('superseded')
+
+        deadline = max(cmd.deadline for cmd in sending)
+        delay = self.retry_delay_s
+        error = None
+        for attempt in range(1 + self.retries):
+            if attempt:
+                self._count('retries')
+                if self._stop_evt.wait(min(delay, max(0.0, deadline - time.monotonic()))):
+                    break
+                delay *= 2
+            for cmd in sending:
+                cmd.attempts += 1
+            self._count('frames')
+            try:
+                resp = self.send(frame)
+            except Exception as e:
+                resp = {'Err': 'exception', 'Error': str(e)}
+            if not (isinstance(resp, dict) and 'Err' in resp):
+                for cmd in sending:
+                    status = 'superseded' if cmd in partial else 'done'
+                    self._count(status)
+                    cmd._finish(status)
+                return
+            error = str(resp.get('Error') or resp.get('Err'))
+            logger.warning("ac commands: frame %s failed (attempt %d): %s", frame, attempt + 1, error)
+            if time.monotonic() >= deadline:
+                break
+        for cmd in sending:
+            self._count('failed')
+            cmd._finish('failed', error)
+
+    def _loop(self) -> None:
+        while not self._stop_evt.is_set():
+            batch = self._take()
+            if batch:
+                try:
+                    self._run_batch(batch)
+                except Exception as e:
+                    logger.exception("ac commands: batch failed: %s", e)
+        # Anything left will not be sent
+        with self._cond:
+            batch, self._pending = self._pending, []
+        for cmd in batch:
+            cmd._finish('failed', 'command worker stopped')
+
+    def start(self) -> None:
+        """Start the worker (idempotent)."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_evt.clear()
+        self._thread = threading.Thread(target=self._loop, name="ACCommandQueue", daemon=True)
+        self._thread.start()
+
+    def stop(self, wait: bool = False) -> None:
+        self._stop_evt.set()
+        with self._cond:
+            self._cond.notify_all()
+        if wait and self._thread:
+            self._thread.join()
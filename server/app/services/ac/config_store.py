@@ -0,0 +1,105 @@
+"""Dirty-tracked, debounced persistence of the thermostat configuration.
+
+Setters change the in-memory config at once and call ``schedule``. The
+first change of a burst starts a timer, and when it fires only the columns
+whose value differs from what was last written go out in one ``UPDATE``.
+Phase transitions call ``flush`` directly, so they reach the database
+before the call returns.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from ...core.controller import Controller
+
+logger = logging.getLogger(__name__)
+
+
+class ThermostatConfStore:
+    """Write changed ``thermostat_conf`` columns after a short debounce.
+
+    :param ctrl: domain controller (``update_thermostat_conf``)
+    :param values: returns every column's current in-memory value
+    :param debounce_s: delay between the first change of a burst and its flush
+    :param on_flush: called after each debounced flush (e.g. one config notification)
+    :param saved: column values the row already holds (e.g. as loaded); when
+        omitted the first flush writes every column
+    """
+
+    def __init__(
+        self,
+        ctrl: Controller,
+        values: Callable[[], Dict[str, Any]],
+        debounce_s: float = 0.5,
+        on_flush: Optional[Callable[[], None]] = None,
+        saved: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        self.ctrl = ctrl
+        self.values = values
+        self.debounce_s = max(0.0, float(debounce_s))
+        self.on_flush = on_flush
+        # Column values as last written (or loaded)
+        self._saved: Dict[str, Any] = dict(saved or {})
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._timer: threading.Timer | None = None
+        self.metrics: Dict[str, int] = {'scheduled': 0, 'flushes': 0, 'columns_written': 0}
+
+    def dirty(self) -> Dict[str, Any]:
+        """Columns whose in-memory value differs from the last write."""
+        current = self.values()
+        with self._lock:
+            return {k: v for k, v in current.items() if k not in self._saved or self._saved[k] != v}
+
+    def schedule(self) -> None:
+        """Flush within ``debounce_s``; changes made meanwhile join that flush."""
+        with self._lock:
+            self.metrics['scheduled'] += 1
+            if self._timer is not None:
+                return
+            self._timer = threading.Timer(self.debounce_s, self._fire)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _fire(self) -> None:
+        with self._lock:
+            self._timer = None
+        try:
+            self.flush()
+        except Exception as e:
+            logger.warning("thermo: config flush failed: %s", e)
+        if self.on_flush is not None:
+            try:
+                self.on_flush()
+            except Exception as e:
+                logger.debug("thermo: config on_flush failed: %s", e)
+
+    def flush(self) -> int:
+        """Write the dirty columns now; returns how many were written."""
+        with self._flush_lock:
+            fields = self.dirty()
+            if not fields:
+                return 0
+            if not self.ctrl.update_thermostat_conf(fields):
+                # No row yet: create it with every column
+                self.ctrl.save_thermostat_conf(**self.values())
+                fields = self.values()
+            with self._lock:
+                self._saved.update(fields)
+                self.metrics['flushes'] += 1
+                self.metrics['columns_written'] += len(fields)
+            return len(fields)
+
+    def stop(self) -> None:
+        """Cancel the pending timer and write what is dirty."""
+        with self._lock:
+            timer, self._timer = self._timer, None
+        if timer is not None:
+            timer.cancel()
+        try:
+            self.flush()
+        except Exception as e:
+            logger.warning("thermo: final config flush failed: %s", e)
@@ -1,7 +1,11 @@
 import logging
-from typing import Any, Dict, List, Optional
+import time
+from typing import Any, Callable, Dict, List, Optional
 import tinytuya
 
+from .commands import Command, CommandQueue
+from .session import DeviceSession
+
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
@@ -26,6 +30,13 @@ class ACController:
         ac.set_fan_speed("high")
         ac.set_temperature(23)
         print(ac.get_status())
+
+    With a ``DeviceSession`` the status comes from its cache (kept current by
+    the device's DP pushes) and commands share its persistent socket.
+
+    Commands go through a ``CommandQueue`` worker. ``submit`` returns at once
+    and reports through a callback. The single-DP methods above wait for
+    their result.
     """
 
     # Enumerations and ranges from your provided specs
@@ -46,19 +57,31 @@ class ACController:
         # tinytuya device credentials (if not passing an existing Device instance)
         DEV_ID: str = "",
         IP: str = "",
-        LOCALKEY: str = ""
-
+        LOCALKEY: str = "",
+        session: Optional[DeviceSession] = None,
+        command_timeout_s: float = 10.0,
+        command_retries: int = 2,
+        command_wait_slack_s: float = 5.0,
     ) -> None:
         """
         Initialize the controller.
 
         You can either pass an existing tinytuya `Device` instance via `tinytuya_device`
         OR supply the device id, ip and local key and this class will build the connection.
+        A `session` wraps the device instead and takes precedence.
+        `set_values` waits at most until a command's deadline plus
+        `command_wait_slack_s` (a frame still in flight at the deadline).
         """
-        if tinytuya_device:
+        self.session = session
+        if session is not None:
+            self.ac = session.device
+        elif tinytuya_device:
             self.ac = tinytuya_device
         else:
             self.ac = tinytuya.Device(DEV_ID, IP, LOCALKEY)
+        self.commands = CommandQueue(
+            self._send_frame, timeout_s=command_timeout_s, retries=command_retries)
+        self.command_wait_slack_s = max(0.0, float(command_wait_slack_s))
 
     # -------------------------
     # Public control operations
@@ -84,7 +107,33 @@ class ACController:
         self._validate_temperature(celsius)
         return self._send_commands(self.TEMP_SET, celsius)
 
-    def get_status(self) -> Dict[str, Any]:
+    def submit(
+        self,
+        values: Dict[int, Any],
+        on_result: Optional[Callable[[Command], None]] = None,
+    ) -> Command:
+        """Queue DP values (e.g. ``{POWER: True, TEMP_SET: 16}``) to go out in one frame.
+
+        Raises ValueError for invalid values; delivery is reported to `on_result`.
+        """
+        self._validate_values(values)
+        self.commands.start()
+        return self.commands.submit(values, on_result)
+
+    def set_values(self, values: Dict[int, Any]) -> Dict[str, Any]:
+        """Send DP values in one frame and wait for the result (`Command.result()`).
+
+        Returns a `timeout` result when none arrived in time (e.g. the worker
+        hangs in a send), so the caller's loop is never blocked for good.
+        """
+        cmd = self.submit(values)
+        finished = cmd.wait(max(0.0, cmd.deadline - time.monotonic()) + self.command_wait_slack_s)
+        if not finished and cmd.status is None:
+            logger.warning("ac: no result for command #%s %s before its deadline", cmd.id, values)
+            return dict(cmd.result(), ok=False, status='timeout', error='no result before the deadline')
+        return cmd.result()
+
+    def get_status(self, max_age_s: Optional[float] = None) -> Dict[str, Any]:
         """
         Returns a dict keyed by DP code:
           {
@@ -95,9 +144,15 @@ class ACController:
             "temp_current": int,
             ... (other codes if present)
           }
+
+        With a session the cached DPs are used unless older than `max_age_s`
+        (default: the session TTL).
         """
-        resp = self.ac.status()
-        result = resp.get("dps", [])
+        if self.session is not None:
+            result = self.session.status(max_age_s)
+        else:
+            resp = self.ac.status()
+            result = resp.get("dps", {}) if isinstance(resp, dict) else {}
         status_map: Dict[str, Any] = {}
 
         try:
@@ -108,19 +163,40 @@ class ACController:
                 status_map["fan_speed_enum"] = result.get(str(self.FAN))
                 status_map["set_temperature"] = result.get(str(self.TEMP_SET))
             else:
-                logger.warning("AC CONTROLLER: Empty status response:", result)
+                logger.warning("AC CONTROLLER: Empty status response: %s", result)
 
             return status_map
         except Exception as e:
-            logger.exception("AC CONTROLLER: Error while fetching status:", e)
+            logger.exception("AC CONTROLLER: Error while fetching status: %s", e)
 
     # -------------------------
     # Internals / validation
     # -------------------------
 
     def _send_commands(self, index: int, value: Any) -> Dict[str, Any]:
-        resp = self.ac.set_value(index, value)
-        return resp
+        return self.set_values({index: value})
+
+    def _send_frame(self, values: Dict[int, Any]) -> Any:
+        data = {str(k): v for k, v in values.items()}
+        if self.session is not None:
+            return self.session.call(self.ac.set_multiple_values, data)
+        return self.ac.set_multiple_values(data)
+
+    def _validate_values(self, values: Dict[int, Any]) -> None:
+        if not values:
+            raise ValueError("No DP values given")
+        for index, value in values.items():
+            if index == self.POWER:
+                if not isinstance(value, bool):
+                    raise ValueError(f"Invalid switch value {value!r}")
+            elif index == self.MODE:
+                self._validate_mode(value)
+            elif index == self.FAN:
+                self._validate_fan_speed(value)
+            elif index == self.TEMP_SET:
+                self._validate_temperature(value)
+            else:
+                raise ValueError(f"DP {index} is not writable")
 
     def _validate_mode(self, mode: str) -> None:
         if mode not in self.MODES:
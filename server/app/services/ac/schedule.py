@@ -0,0 +1,159 @@
+"""Compiled thermostat sleep schedule.
+
+The sleep configuration (single ``start``/``stop`` or a weekly JSON of
+``{mon: {start, stop}, ...}``) is compiled once into a sorted table of
+active intervals in seconds from Monday 00:00 local time. Lookups bisect
+the table, and the next transition comes from the same table. Temporary
+overrides ("no sleep until T") are absolute entries kept next to it.
+
+A day's window belongs to that day: ``23:00``–``07:00`` on Monday covers
+Monday 00:00–07:00 and 23:00–24:00, matching how the window was always
+evaluated. A weekly entry for a day replaces the single window on that day;
+a day missing from the weekly schedule falls back to the single window.
+"""
+
+from __future__ import annotations
+
+import bisect
+import json
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+DAY_S = 24 * 3600
+WEEK_S = 7 * DAY_S
+WEEKDAYS = ['mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun']
+
+
+def parse_hhmm(s: Any) -> Optional[int]:
+    """Minutes after midnight for ``HH:MM``, or None if invalid."""
+    if not isinstance(s, str) or not s.strip():
+        return None
+    parts = s.strip().split(":", 1)
+    if len(parts) != 2:
+        return None
+    try:
+        h, m = int(parts[0]), int(parts[1])
+    except ValueError:
+        return None
+    if not (0 <= h < 24 and 0 <= m < 60):
+        return None
+    return h * 60 + m
+
+
+def _day_windows(start: Any, stop: Any) -> List[Tuple[int, int]]:
+    """Active (start, end) seconds within one day; a wrapping window splits in two."""
+    start_m, stop_m = parse_hhmm(start), parse_hhmm(stop)
+    if start_m is None or stop_m is None or start_m == stop_m:
+        return []
+    if start_m < stop_m:
+        return [(start_m * 60, stop_m * 60)]
+    return [w for w in ((0, stop_m * 60), (start_m * 60, DAY_S)) if w[0] < w[1]]
+
+
+class SleepSchedule:
+    """Sorted weekly interval table plus absolute override entries.
+
+    :param enabled: ``sleep_active``; a disabled schedule is never active
+    :param start: default window start (``HH:MM``)
+    :param stop: default window stop (``HH:MM``)
+    :param weekly: weekly schedule as dict or JSON string, or None
+    """
+
+    def __init__(self, enabled: bool = True, start: Any = None, stop: Any = None, weekly: Any = None) -> None:
+        self.enabled = bool(enabled)
+        self.weekly: Optional[Dict[str, Any]] = None
+        if weekly:
+            try:
+                loaded = json.loads(weekly) if isinstance(weekly, str) else weekly
+                self.weekly = loaded if isinstance(loaded, dict) else None
+            except ValueError:
+                self.weekly = None
+        intervals: List[Tuple[int, int]] = []
+        if self.enabled:
+            for i, key in enumerate(WEEKDAYS):
+                if self.weekly is not None and key in self.weekly:
+                    day = self.weekly.get(key) or {}
+                    windows = _day_windows(day.get('start'), day.get('stop'))
+                else:
+                    windows = _day_windows(start, stop)
+                intervals.extend((i * DAY_S + a, i * DAY_S + b) for a, b in windows)
+        # Merge touching intervals so every boundary left is a real transition
+        merged: List[List[int]] = []
+        for a, b in sorted(intervals):
+            if merged and a <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], b)
+            else:
+                merged.append([a, b])
+        self._starts = [a for a, _ in merged]
+        self._ends = [b for _, b in merged]
+        # Every start/stop is a transition, except a window running through
+        # Sunday midnight into Monday
+        boundaries = sorted(self._starts + self._ends)
+        if merged and self._starts[0] == 0 and self._ends[-1] == WEEK_S:
+            boundaries = [b for b in boundaries if b not in (0, WEEK_S)]
+        self._boundaries = boundaries
+        # Absolute (since, until) epochs during which sleep is suppressed
+        self._overrides: List[Tuple[float, float]] = []
+
+    @classmethod
+    def from_conf(cls, cfg: Any) -> "SleepSchedule":
+        return cls(
+            enabled=getattr(cfg, 'sleep_active', True),
+            start=getattr(cfg, 'sleep_start', None),
+            stop=getattr(cfg, 'sleep_stop', None),
+            weekly=getattr(cfg, 'sleep_weekly', None),
+        )
+
+    @property
+    def intervals(self) -> List[Tuple[int, int]]:
+        return list(zip(self._starts, self._ends))
+
+    @staticmethod
+    def week_offset(now: float) -> float:
+        """Seconds since Monday 00:00 local time."""
+        lt = time.localtime(now)
+        return lt.tm_wday * DAY_S + lt.tm_hour * 3600 + lt.tm_min * 60 + lt.tm_sec + (now % 1)
+
+    def _in_weekly(self, pos: float) -> bool:
+        i = bisect.bisect_right(self._starts, pos) - 1
+        return i >= 0 and pos < self._ends[i]
+
+    # --- Overrides ---
+
+    def suppress(self, until: float, since: Optional[float] = None) -> None:
+        """Add an override entry: not active from ``since`` (default now) until ``until``."""
+        since = time.time() if since is None else since
+        bisect.insort(self._overrides, (float(since), float(until)))
+
+    def copy_overrides(self, other: "SleepSchedule", now: Optional[float] = None) -> None:
+        """Carry the unexpired overrides of ``other`` over (after a recompile)."""
+        now = time.time() if now is None else now
+        self._overrides = [o for o in other._overrides if o[1] > now]
+
+    def override_until(self, now: float) -> Optional[float]:
+        """End of the override in force at ``now``, or None."""
+        self._overrides = [o for o in self._overrides if o[1] > now]
+        ends = [until for since, until in self._overrides if since <= now]
+        return max(ends) if ends else None
+
+    # --- Lookups ---
+
+    def is_active(self, now: float) -> bool:
+        if not self._starts or self.override_until(now) is not None:
+            return False
+        return self._in_weekly(self.week_offset(now))
+
+    def next_transition(self, now: float) -> Optional[float]:
+        """Epoch of the next weekly window start/stop or override change after ``now``."""
+        candidates: List[float] = []
+        for since, until in self._overrides:
+            if since > now:
+                candidates.append(since)
+            if until > now:
+                candidates.append(until)
+        if self._boundaries:
+            pos = self.week_offset(now)
+            i = bisect.bisect_right(self._boundaries, pos)
+            nxt = self._boundaries[i] if i < len(self._boundaries) else self._boundaries[0] + WEEK_S
+            candidates.append(now + (nxt - pos))
+        return min(candidates) if candidates else None
@@ -0,0 +1,179 @@
+"""Persistent tinytuya session with a cached DP status.
+
+One socket to the device stays open. A listener thread reads the DP updates
+the device pushes whenever something changes (remote, app, our own
+commands) and sends heartbeats to keep the socket alive. Readers get the
+cached DPs, and the device is polled only when the cache is older than
+``ttl_s``. All device I/O goes through one lock, because a tinytuya
+``Device`` is not safe to share between threads.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+import tinytuya
+
+logger = logging.getLogger(__name__)
+
+
+class DeviceSession:
+    """Cached DP status of a tinytuya device, refreshed by pushes.
+
+    :param device: tinytuya ``Device``; switched to a persistent socket
+    :param ttl_s: poll the device when the cache is older than this
+    :param heartbeat_s: seconds between heartbeats on the idle socket
+    :param recv_timeout_s: socket timeout of one listener read
+
+    ``on_change(dps)``, if set, is called with the DPs whose value a push changed.
+    """
+
+    def __init__(
+        self,
+        device: tinytuya.Device,
+        ttl_s: float = 30.0,
+        heartbeat_s: float = 10.0,
+        recv_timeout_s: float = 1.0,
+    ) -> None:
+        self.device = device
+        self.ttl_s = max(0.0, float(ttl_s))
+        self.heartbeat_s = max(1.0, float(heartbeat_s))
+        self.device.set_socketPersistent(True)
+        self.device.set_socketTimeout(recv_timeout_s)
+        self._io_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._dps: Dict[str, Any] = {}
+        # time.time() of the last status or push, None until the first one
+        self.updated_at: Optional[float] = None
+        self._stop_evt = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.metrics: Dict[str, Any] = {'polls': 0, 'pushes': 0, 'errors': 0, 'connected': False}
+        self.on_change: Optional[Callable[[Dict[str, Any]], None]] = None
+
+    # --- Cache ---
+
+    def age(self) -> Optional[float]:
+        """Seconds since the cache was last refreshed, or None if never."""
+        return None if self.updated_at is None else max(0.0, time.time() - self.updated_at)
+
+    def _apply(self, data: Any, pushed: bool = False) -> bool:
+        """Merge the ``dps`` of a device response; False for errors and empty reads."""
+        if not isinstance(data, dict):
+            return False
+        if 'Err' in data:
+            with self._lock:
+                self.metrics['errors'] += 1
+                self.metrics['connected'] = False
+            logger.debug("tuya: device error %s: %s", data.get('Err'), data.get('Error'))
+            return False
+        dps = data.get('dps')
+        if not isinstance(dps, dict):
+            return False
+        with self._lock:
+            changed = {k: v for k, v in dps.items() if self._dps.get(k) != v}
+            self._dps.update(dps)
+            self.updated_at = time.time()
+            self.metrics['connected'] = True
+            if pushed:
+                self.metrics['pushes'] += 1
+        if pushed and changed and self.on_change is not None:
+            try:
+                self.on_change(changed)
+            except Exception as e:
+                logger.debug("tuya: on_change failed: %s", e)
+        return True
+
+    def poll(self) -> Dict[str, Any]:
+        """Query the device now and return the refreshed DPs."""
+        with self._io_lock:
+            data = self.device.status()
+        with self._lock:
+            self.metrics['polls'] += 1
+        if not self._apply(data):
+            logger.warning("tuya: status poll failed: %s", data)
+        return self.dps()
+
+    def dps(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._dps)
+
+    def status(self, max_age_s: Optional[float] = None) -> Dict[str, Any]:
+        """Cached DPs, polling first if older than ``max_age_s`` (default ``ttl_s``).
+
+        A failed poll returns the stale cache rather than raising.
+        """
+        limit = self.ttl_s if max_age_s is None else max_age_s
+        age = self.age()
+        if age is None or age > limit:
+            try:
+                return self.poll()
+            except Exception as e:
+                logger.warning("tuya: status poll raised: %s", e)
+        return self.dps()
+
+    def call(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run ``fn(*args)`` (a bound device method) under the I/O lock; DPs in its reply update the cache."""
+        with self._io_lock:
+            resp = fn(*args, **kwargs)
+        self._apply(resp)
+        return resp
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self.metrics)
+        out['age_s'] = self.age()
+        out['ttl_s'] = self.ttl_s
+        return out
+
+    # --- Listener ---
+
+    def _loop(self) -> None:
+        last_beat = time.monotonic()
+        while not self._stop_evt.is_set():
+            try:
+                age = self.age()
+                if age is None or age > self.ttl_s:
+                    self.poll()
+                    last_beat = time.monotonic()
+                    age = self.age()
+                    if age is None or age > self.ttl_s:
+                        # Device unreachable; back off before the next attempt
+                        self._stop_evt.wait(5.0)
+                        continue
+                with self._io_lock:
+                    data = self.device.receive()
+                    if time.monotonic() - last_beat >= self.heartbeat_s:
+                        self.device.heartbeat(nowait=True)
+                        last_beat = time.monotonic()
+                if data is None:
+                    # Let waiting commands take the lock between reads
+                    self._stop_evt.wait(0.05)
+                elif not self._apply(data, pushed=True) and isinstance(data, dict) and 'Err' in data:
+                    self._stop_evt.wait(5.0)
+            except Exception as e:
+                with self._lock:
+                    self.metrics['errors'] += 1
+                    self.metrics['connected'] = False
+                logger.debug("tuya: listener read failed: %s", e)
+                self._stop_evt.wait(5.0)
+
+    def start(self) -> None:
+        """Start the push listener (idempotent)."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_evt.clear()
+        self._thread = threading.Thread(target=self._loop, name="TuyaSession", daemon=True)
+        self._thread.start()
+
+    def stop(self, wait: bool = False) -> None:
+        self._stop_evt.set()
+        if wait and self._thread:
+            self._thread.join()
+        try:
+            with self._io_lock:
+                self.device.close()
+        except Exception:
+            pass
@@ -0,0 +1,435 @@
+"""Offline thermostat replay and parameter sweeps over recorded history.
+
+Recorded ``esp32_temphum`` readings and ``ac_events`` are replayed through
+the real ``ACThermostat`` on a virtual clock. The AC and the controller are
+in-memory fakes, so there is no device I/O and no sleeping, and weeks of
+history take seconds. Checks are scheduled the way ``run_forever`` does it:
+``debounce_s`` after the first control reading of a burst, at min-on/min-off
+expiry and sleep boundaries, and at most ``poll_interval_s`` apart.
+
+The recorded temperatures already include what the real AC did. While the
+simulated AC state differs from the recorded one, a room offset is added to
+every reading. The offset moves at the AC cooling rate and relaxes back
+towards zero with time constant ``relax_h``. The cooling rate is estimated
+from the history (mean slope while off minus mean slope while on) unless
+given.
+
+Run a sweep against the live database::
+
+    DB_PATH=... python -m app.services.ac.simulator --days 14 \\
+        --target 24,24.5,25 --pos-hyst 0.3,0.5 --min-on 240,480 --smooth 1,5
+"""
+
+from __future__ import annotations
+
+import argparse
+import bisect
+import dataclasses
+import itertools
+import json
+import logging
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import pytz
+
+from ...core.controller import Controller
+from ...core.models import ESP32TemperatureHumidity, LatestReading, ThermostatConf
+from . import thermostat as thermostat_module
+from .thermostat import ACThermostat
+
+logger = logging.getLogger(__name__)
+
+TZ = pytz.timezone('Europe/Helsinki')
+
+# Used when the history has too little ON and OFF data to estimate the rate
+DEFAULT_COOLING_C_PER_H = 1.0
+# Minimum seconds of both ON and OFF history for an estimated cooling rate
+MIN_ESTIMATE_S = 3600.0
+
+# Sweepable ThermostatConf fields and their command-line options
+SWEEP_FIELDS = {
+    'target_temp': ('--target', float),
+    'pos_hysteresis': ('--pos-hyst', float),
+    'neg_hysteresis': ('--neg-hyst', float),
+    'min_on_s': ('--min-on', int),
+    'min_off_s': ('--min-off', int),
+    'smooth_window': ('--smooth', int),
+}
+
+
+class VirtualClock:
+    """Callable epoch clock that only moves when told to."""
+
+    def __init__(self, now: float) -> None:
+        self.now = float(now)
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class SimAC:
+    """Stand-in for ``ACController``: applies every frame at once."""
+
+    def __init__(self, is_on: bool) -> None:
+        self.is_on = bool(is_on)
+        self.frames = 0
+
+    def get_status(self, max_age_s: Optional[float] = None) -> Dict[str, Any]:
+        return {'switch': self.is_on, 'mode': 'cold', 'fan_speed_enum': 'low'}
+
+    def set_values(self, values: Dict[int, Any]) -> Dict[str, Any]:
+        self.frames += 1
+        if 1 in values:
+            self.is_on = bool(values[1])
+        return {'ok': True, 'status': 'done', 'error': None, 'attempts': 1}
+
+
+class SimController:
+    """Stand-in for the domain ``Controller``: serves replayed readings, counts AC events."""
+
+    def __init__(self) -> None:
+        # location -> (epoch s, simulated temperature)
+        self.latest: Dict[str, Tuple[float, float]] = {}
+        self.ac_on_events = 0
+        self.ac_off_events = 0
+
+    def get_latest_reading(self, location: str) -> LatestReading | None:
+        entry = self.latest.get(location)
+        if entry is None:
+            return None
+        ts, temp = entry
+        reading = ESP32TemperatureHumidity(
+            id=0, location=location, timestamp=datetime.fromtimestamp(ts, TZ).isoformat(),
+            temperature=temp, humidity=0.0)
+        return LatestReading(reading=reading, ts_ms=int(ts * 1000))
+
+    def record_ac_event(self, is_on: bool, source: str | None = None, **_: Any) -> None:
+        if is_on:
+            self.ac_on_events += 1
+        else:
+            self.ac_off_events += 1
+
+    def log_message(self, message: str, log_type: str = 'info') -> None:
+        pass
+
+    def update_thermostat_conf(self, fields: Dict[str, Any]) -> bool:
+        return True
+
+    def save_thermostat_conf(self, **_: Any) -> None:
+        pass
+
+
+@dataclass
+class Replay:
+    """Recorded history of the control locations over ``[start, end)`` (epoch seconds)."""
+    locations: List[str]
+    start: float
+    end: float
+    # (epoch s, location, temperature), sorted by time
+    readings: List[Tuple[float, str, float]]
+    # Recorded AC transitions (epoch s, is_on), sorted by time
+    ac_events: List[Tuple[float, bool]] = field(default_factory=list)
+    initial_on: bool = False
+
+    @classmethod
+    def load(
+        cls,
+        ctrl: Controller,
+        locations: List[str],
+        start_ms: int,
+        end_ms: int,
+        step_s: float = 60.0,
+        max_gap_s: float = 900.0,
+    ) -> "Replay":
+        """Read raw readings and AC events of ``[start_ms, end_ms)`` from the database.
+
+        Gaps of up to ``max_gap_s`` (left by ingest compression) are filled
+        with readings interpolated every ``step_s``, as the live loop would
+        have seen them.
+        """
+        readings: List[Tuple[float, str, float]] = []
+        for loc in locations:
+            points = [
+                (datetime.fromisoformat(r.timestamp).timestamp(), float(r.temperature))
+                for r in ctrl.get_esp32_temphum_between(loc, start_ms, end_ms)
+                if r.temperature is not None
+            ]
+            readings.extend((t, loc, v) for t, v in _fill_gaps(points, step_s, max_gap_s))
+        readings.sort(key=lambda r: r[0])
+
+        start_iso = datetime.fromtimestamp(start_ms / 1000.0, TZ).isoformat()
+        end_iso = datetime.fromtimestamp(end_ms / 1000.0, TZ).isoformat()
+        events: List[Tuple[float, bool]] = []
+        for e in ctrl.get_ac_events_between(start_iso, end_iso):
+            try:
+                events.append((datetime.fromisoformat(e['timestamp']).timestamp(), bool(e['is_on'])))
+            except ValueError:
+                continue
+        events.sort(key=lambda e: e[0])
+        return cls(
+            locations=list(locations),
+            start=start_ms / 1000.0,
+            end=end_ms / 1000.0,
+            readings=readings,
+            ac_events=events,
+            initial_on=bool(ctrl.get_last_ac_state_before(start_iso)),
+        )
+
+    def estimate_cooling_c_per_h(self) -> float:
+        """Mean temperature slope while the AC was off minus while it was on, in °C/h."""
+        times = [e[0] for e in self.ac_events]
+        sums = {True: [0.0, 0.0], False: [0.0, 0.0]}  # state -> [delta °C, seconds]
+        last: Dict[str, Tuple[float, float]] = {}
+        for t, loc, temp in self.readings:
+            prev = last.get(loc)
+            last[loc] = (t, temp)
+            if prev is None or not 0 < t - prev[0] <= 900:
+                continue
+            i = bisect.bisect_right(times, prev[0])
+            if i < len(times) and times[i] <= t:
+                continue  # the AC switched within this interval
+            state = self.ac_events[i - 1][1] if i > 0 else self.initial_on
+            sums[state][0] += temp - prev[1]
+            sums[state][1] += t - prev[0]
+        if sums[True][1] < MIN_ESTIMATE_S or sums[False][1] < MIN_ESTIMATE_S:
+            return DEFAULT_COOLING_C_PER_H
+        rate = (sums[False][0] / sums[False][1] - sums[True][0] / sums[True][1]) * 3600.0
+        return rate if rate > 0 else DEFAULT_COOLING_C_PER_H
+
+
+def _fill_gaps(points: List[Tuple[float, float]], step_s: float, max_gap_s: float) -> Iterable[Tuple[float, float]]:
+    prev: Optional[Tuple[float, float]] = None
+    for t, v in points:
+        if prev is not None and step_s > 0 and step_s < t - prev[0] <= max_gap_s:
+            x = prev[0] + step_s
+            while x < t:
+                yield x, prev[1] + (v - prev[1]) * (x - prev[0]) / (t - prev[0])
+                x += step_s
+        yield t, v
+        prev = (t, v)
+
+
+def simulate(
+    replay: Replay,
+    params: Optional[Dict[str, Any]] = None,
+    base: Optional[ThermostatConf] = None,
+    cooling_c_per_h: Optional[float] = None,
+    relax_h: float = 3.0,
+    debounce_s: float = 1.0,
+) -> Dict[str, Any]:
+    """Replay ``replay`` through an ``ACThermostat`` configured as ``base`` with ``params`` applied.
+
+    Returns the setting and its metrics: AC on cycles, runtime, and time the
+    control temperature spent outside ``[target - neg_hysteresis, target +
+    pos_hysteresis]``, next to the same metrics for the recorded run.
+    """
+    params = dict(params or {})
+    cfg = dataclasses.replace(base or ThermostatConf(), **params)
+    cfg.control_locations = json.dumps(replay.locations)
+    cfg.thermo_active = True
+    cfg.current_phase = 'on' if replay.initial_on else 'off'
+    cfg.phase_started_at = datetime.fromtimestamp(replay.start, TZ).isoformat()
+
+    rate = (replay.estimate_cooling_c_per_h() if cooling_c_per_h is None else float(cooling_c_per_h)) / 3600.0
+    tau = max(1.0, float(relax_h) * 3600.0)
+    low = float(cfg.target_temp) - float(cfg.neg_hysteresis)
+    high = float(cfg.target_temp) + float(cfg.pos_hysteresis)
+    control = set(replay.locations)
+
+    clock = VirtualClock(replay.start)
+    ac = SimAC(replay.initial_on)
+    ctrl = SimController()
+    # Both clocks virtual: the thermostat's own scheduler decides when to step
+    thermo = ACThermostat(ac, cfg, ctrl, replay.locations[0], debounce_s=debounce_s,  # type: ignore[arg-type]
+                          persist_debounce_s=0.0, clock=clock, monotonic=clock)
+
+    events = replay.ac_events
+    # (t, True) sorts after every event at t, so events at the start count as recorded
+    ev_idx = bisect.bisect_right(events, (replay.start, True))
+    state = {
+        'rec_on': replay.initial_on, 'offset': 0.0,
+        'runtime': 0.0, 'above': 0.0, 'below': 0.0,
+        'rec_runtime': 0.0, 'rec_out': 0.0,
+    }
+    # Latest recorded temperature per control location (the simulated one is in ctrl.latest)
+    recorded: Dict[str, float] = {}
+
+    def band_time(temps: Iterable[float], dt: float) -> Tuple[float, float]:
+        values = list(temps)
+        if not values:
+            return 0.0, 0.0
+        t = sum(values) / len(values)
+        return (dt if t > high else 0.0), (dt if t < low else 0.0)
+
+    def advance(to: float) -> None:
+        nonlocal ev_idx
+        while clock.now < to:
+            seg_end = min(to, events[ev_idx][0]) if ev_idx < len(events) else to
+            dt = seg_end - clock.now
+            if dt > 0:
+                above, below = band_time((v for _, v in ctrl.latest.values()), dt)
+                state['above'] += above
+                state['below'] += below
+                r_above, r_below = band_time(recorded.values(), dt)
+                state['rec_out'] += r_above + r_below
+                if ac.is_on:
+                    state['runtime'] += dt
+                if state['rec_on']:
+                    state['rec_runtime'] += dt
+                # Offset relaxes towards the steady state of the current AC difference
+                target = -(int(ac.is_on) - int(state['rec_on'])) * rate * tau
+                state['offset'] = target + (state['offset'] - target) * math.exp(-dt / tau)
+            clock.now = seg_end
+            while ev_idx < len(events) and events[ev_idx][0] <= clock.now:
+                state['rec_on'] = events[ev_idx][1]
+                ev_idx += 1
+
+    steps = 0
+    i = 0
+    readings = replay.readings
+    while True:
+        now = clock.now
+        due = thermo.next_wake()
+        next_reading = readings[i][0] if i < len(readings) else math.inf
+        if min(due, next_reading) >= replay.end:
+            advance(replay.end)
+            break
+        if next_reading <= due:
+            t, loc, temp = readings[i]
+            i += 1
+            advance(max(now, t))
+            if loc in control:
+                recorded[loc] = temp
+                ctrl.latest[loc] = (t, temp + state['offset'])
+                thermo.on_reading(loc)
+            continue
+        advance(max(now, due))
+        steps += 1
+        thermo.run_check()
+
+    hours = (replay.end - replay.start) / 3600.0
+    recorded_cycles = sum(1 for t, on in events if on and replay.start <= t < replay.end)
+    return dict(
+        params,
+        hours=round(hours, 2),
+        steps=steps,
+        cycles=ctrl.ac_on_events,
+        runtime_h=round(state['runtime'] / 3600.0, 2),
+        duty=round(state['runtime'] / 3600.0 / hours, 3) if hours else 0.0,
+        out_of_band_h=round((state['above'] + state['below']) / 3600.0, 2),
+        above_band_h=round(state['above'] / 3600.0, 2),
+        below_band_h=round(state['below'] / 3600.0, 2),
+        recorded_cycles=recorded_cycles,
+        recorded_runtime_h=round(state['rec_runtime'] / 3600.0, 2),
+        recorded_out_of_band_h=round(state['rec_out'] / 3600.0, 2),
+        cooling_c_per_h=round(rate * 3600.0, 3),
+    )
+
+
+def grid(values: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    """Every combination of the given field values (cartesian product)."""
+    keys = [k for k, v in values.items() if v]
+    return [dict(zip(keys, combo)) for combo in itertools.product(*(values[k] for k in keys))]
+
+
+# Per-process replay and options, set once by the pool initializer
+_worker_args: Dict[str, Any] = {}
+
+
+def _init_worker(replay: Replay, options: Dict[str, Any]) -> None:
+    logging.getLogger(thermostat_module.__name__).setLevel(logging.ERROR)
+    _worker_args['replay'] = replay
+    _worker_args['options'] = options
+
+
+def _run_point(params: Dict[str, Any]) -> Dict[str, Any]:
+    return simulate(_worker_args['replay'], params, **_worker_args['options'])
+
+
+def sweep(
+    replay: Replay,
+    points: List[Dict[str, Any]],
+    workers: Optional[int] = None,
+    **options: Any,
+) -> List[Dict[str, Any]]:
+    """Simulate every parameter set in ``points`` across a process pool.
+
+    ``options`` are passed to ``simulate``. The replay is sent to each worker
+    once; with ``workers=1`` everything runs in this process.
+    """
+    if options.get('cooling_c_per_h') is None:
+        # Estimate once instead of in every run
+        options['cooling_c_per_h'] = replay.estimate_cooling_c_per_h()
+    if workers == 1 or len(points) <= 1:
+        _init_worker(replay, options)
+        return [_run_point(p) for p in points]
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(replay, options)) as pool:
+        return list(pool.map(_run_point, points, chunksize=max(1, len(points) // (workers * 4))))
+
+
+def _parse_list(kind: type, text: Optional[str]) -> List[Any]:
+    return [kind(x) for x in text.split(',') if x.strip()] if text else []
+
+
+def main() -> None:
+    """Load history from DB_PATH and print a sweep, best settings first."""
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING"))
+    parser = argparse.ArgumentParser(description="Replay recorded history through the thermostat.")
+    parser.add_argument('--days', type=float, default=7.0, help="history to replay, ending now")
+    parser.add_argument('--locations', help="comma-separated control locations (default: configured)")
+    for name, (flag, kind) in SWEEP_FIELDS.items():
+        parser.add_argument(flag, dest=name, help=f"comma-separated {name} values ({kind.__name__})")
+    parser.add_argument('--cooling', type=float, help="AC cooling rate in °C/h (default: estimated)")
+    parser.add_argument('--relax-h', type=float, default=3.0, help="room offset time constant in hours")
+    parser.add_argument('--workers', type=int, help="process pool size (default: CPU count)")
+    parser.add_argument('--json', action='store_true', help="print results as JSON lines")
+    args = parser.parse_args()
+
+    db_path = os.getenv("DB_PATH")
+    if not db_path:
+        raise RuntimeError("DB_PATH is missing – add to environment.")
+    ctrl = Controller(db_path)
+    base = ctrl.get_thermostat_conf() or ThermostatConf()
+    if args.locations:
+        locations = [x.strip() for x in args.locations.split(',') if x.strip()]
+    else:
+        try:
+            locations = [str(x) for x in json.loads(base.control_locations or '[]')]
+        except ValueError:
+            locations = []
+        locations = locations or [os.getenv("THERMOSTAT_LOCATION", "Tietokonepöytä")]
+
+    end_ms = int(time.time() * 1000)
+    replay = Replay.load(ctrl, locations, end_ms - int(args.days * 86400 * 1000), end_ms)
+    if not replay.readings:
+        raise SystemExit(f"No readings for {locations} in the last {args.days:g} days")
+    points = grid({name: _parse_list(kind, getattr(args, name)) for name, (_, kind) in SWEEP_FIELDS.items()})
+
+    started = time.monotonic()
+    results = sweep(replay, points, workers=args.workers,
+                    base=base, cooling_c_per_h=args.cooling, relax_h=args.relax_h)
+    results.sort(key=lambda r: (r['out_of_band_h'], r['cycles'], r['runtime_h']))
+    logger.warning("simulator: %d settings over %d readings in %.1fs",
+                   len(results), len(replay.readings), time.monotonic() - started)
+    if args.json:
+        for r in results:
+            print(json.dumps(r))
+        return
+    cols = list(SWEEP_FIELDS) + ['cycles', 'runtime_h', 'duty', 'out_of_band_h',
+                                 'above_band_h', 'below_band_h', 'recorded_out_of_band_h']
+    shown = [c for c in cols if any(c in r for r in results)]
+    print("  ".join(f"{c:>14}" for c in shown))
+    for r in results:
+        print("  ".join(f"{str(r.get(c, '')):>14}" for c in shown))
+
+
+if __name__ == "__main__":
+    main()
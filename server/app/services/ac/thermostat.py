@@ -1,22 +1,43 @@
 import logging
+import threading
 from collections import deque
 import time
 from typing import Any, Dict, List, Optional, Callable
 from datetime import datetime, timedelta
 import pytz
 from ...core.controller import Controller
+from .commands import Command
+from .config_store import ThermostatConfStore
 from .controller import ACController
+from .schedule import SleepSchedule
 from ...core.models import ThermostatConf
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+# Slack added to computed deadlines so the check lands after them
+DEADLINE_SLACK_S = 0.05
+
 # ----------------------------
 # Thermostat loop (no device temp reads)
 # ----------------------------
 
 
 class ACThermostat:
+    """Hysteresis thermostat driving the AC from external sensor readings.
+
+    ``run_forever`` is the only place control steps run. It sleeps until a
+    check is requested (``on_reading`` for control locations, debounced by
+    ``debounce_s``; device pushes; config changes) or the next deadline
+    passes: min-on/min-off expiry, a sleep-window boundary, or at most
+    ``poll_interval_s`` without any event.
+
+    Wall-clock time comes from ``clock`` (``time.time`` by default) and
+    scheduler time from ``monotonic`` (``time.monotonic``). With both on a
+    virtual clock, the loop can be driven by hand: ``next_wake`` says when
+    ``run_check`` is due, exactly as ``run_forever`` decides it.
+    """
+
     def __init__(
         self,
         ac: ACController,
@@ -24,12 +45,29 @@ class ACThermostat:
         ctrl: Controller,
         location: str,
         notify: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+        debounce_s: float = 1.0,
+        persist_debounce_s: float = 0.5,
+        clock: Callable[[], float] = time.time,
+        monotonic: Callable[[], float] = time.monotonic,
     ):
+        self._clock = clock
+        self._monotonic = monotonic
         self.ac = ac
         self.cfg = cfg
         self.ctrl = ctrl
         self.location = location
         self.notify = notify
+        self.debounce_s = max(0.0, float(debounce_s))
+        # Scheduler: monotonic time of the requested check and why
+        self._sched_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop_evt = threading.Event()
+        self._check_due: Optional[float] = None
+        self._check_reasons: set[str] = set()
+        # Status values of applied manual commands (DP code -> value), set on
+        # the command worker and reconciled by the next step
+        self._applied: Dict[str, Any] = {}
+        self._last_check = self._monotonic()
         self._temps = deque(maxlen=max(1, cfg.smooth_window))
         ac_status = self.ac.get_status()
         self._is_on: bool = bool(ac_status.get(
@@ -40,9 +78,10 @@ class ACThermostat:
         self.fan_speed: Optional[str] = ac_status.get(
             "fan_speed_enum") if isinstance(ac_status, dict) else None
         self._enabled: bool = bool(getattr(cfg, 'thermo_active', True))
+        # Sleep windows compiled to an interval table (recompiled on change);
+        # temporary overrides are entries of the same table
+        self._sleep = SleepSchedule.from_conf(cfg)
         self._is_sleep_time = self._is_sleep_time_window_now()
-        # Temporary override to suppress sleep window until given epoch seconds
-        self._sleep_override_until: Optional[float] = None
         self._last_change_ts: float = 0.0
         logger.debug(
             f"thermo: init {cfg} is_on={self._is_on} mode={self.mode} fan={self.fan_speed}")
@@ -53,6 +92,14 @@ class ACThermostat:
             f"thermo: init current_phase={getattr(cfg, 'current_phase', None)} phase_started_at={self._phase_started_at_iso}")
         # Ensure current phase timestamp is sane for accurate deltas across restarts
         self.tz = pytz.timezone('Europe/Helsinki')
+        # Config changes apply in memory at once; changed columns are written
+        # after a short debounce, and one thermo_config goes out per burst
+        self._config_changed = False
+        # Seeded with the row as loaded, so the first flush writes only changes
+        loaded = dict(self._conf_values(), current_phase=getattr(cfg, 'current_phase', None))
+        self._conf = ThermostatConfStore(
+            ctrl, self._conf_values, debounce_s=persist_debounce_s, on_flush=self._flush_config_emit,
+            saved=loaded)
 
         def _parse_iso_to_epoch(s: Optional[str]) -> Optional[float]:
             if not s:
@@ -75,20 +122,20 @@ class ACThermostat:
         started_epoch = _parse_iso_to_epoch(self._phase_started_at_iso)
         logger.debug(
             f"thermo: parsed phase_started_at={self._phase_started_at_iso} -> {started_epoch}")
-        now_epoch = time.time()
+        now_epoch = self._now()
         if self._is_on:
             # If persisted phase mismatches or missing ts, reset start to now
             if getattr(cfg, 'current_phase', None) != 'on' or started_epoch is None:
                 # Persist UTC in RFC3339 format with trailing 'Z'
                 self._phase_started_at_iso = datetime.fromtimestamp(
                     now_epoch, tz=self.tz).isoformat()
-                self._persist_conf()
+                self._persist_conf(sync=True)
         else:
             if getattr(cfg, 'current_phase', None) != 'off' or started_epoch is None:
                 self._phase_started_at_iso = datetime.fromtimestamp(
                     now_epoch, tz=self.tz).isoformat()
 
-                self._persist_conf()
+                self._persist_conf(sync=True)
 
         # Initialize last-change timestamp from the current phase start
         # so min_on/min_off are respected across restarts.
@@ -108,7 +155,7 @@ class ACThermostat:
         )
 
     def _now(self) -> float:
-        return time.time()
+        return self._clock()
 
     def _can_turn_on(self) -> bool:
         ok = (self._now(
@@ -121,29 +168,36 @@ class ACThermostat:
         logger.debug("thermo: _can_turn_off=%s", ok)
         return ok
 
-    def _persist_conf(self) -> None:
-        """Persist current thermostat config to DB."""
+    def _conf_values(self) -> Dict[str, Any]:
+        """Current value of every persisted thermostat config column."""
+        return dict(
+            sleep_active=bool(self.cfg.sleep_active),
+            sleep_start=self.cfg.sleep_start,
+            sleep_stop=self.cfg.sleep_stop,
+            sleep_weekly=getattr(self.cfg, 'sleep_weekly', None),
+            control_locations=getattr(self.cfg, 'control_locations', None),
+            target_temp=float(self.cfg.target_temp),
+            pos_hysteresis=float(self.cfg.pos_hysteresis),
+            neg_hysteresis=float(self.cfg.neg_hysteresis),
+            thermo_active=bool(self._enabled),
+            min_on_s=int(self.cfg.min_on_s),
+            min_off_s=int(self.cfg.min_off_s),
+            poll_interval_s=int(self.cfg.poll_interval_s),
+            smooth_window=int(self.cfg.smooth_window),
+            max_stale_s=None if self.cfg.max_stale_s is None else int(self.cfg.max_stale_s),
+            current_phase=('on' if self._is_on else 'off'),
+            phase_started_at=self._phase_started_at_iso,
+        )
+
+    def _persist_conf(self, sync: bool = False) -> None:
+        """Persist changed config columns: debounced, or now with ``sync`` (phase transitions)."""
+        if not sync:
+            self._conf.schedule()
+            return
         try:
-            self.ctrl.save_thermostat_conf(
-                sleep_active=self.cfg.sleep_active,
-                sleep_start=self.cfg.sleep_start,
-                sleep_stop=self.cfg.sleep_stop,
-                sleep_weekly=getattr(self.cfg, 'sleep_weekly', None),
-                control_locations=getattr(self.cfg, 'control_locations', None),
-                target_temp=self.cfg.target_temp,
-                pos_hysteresis=self.cfg.pos_hysteresis,
-                neg_hysteresis=self.cfg.neg_hysteresis,
-                thermo_active=self._enabled,
-                min_on_s=int(self.cfg.min_on_s),
-                min_off_s=int(self.cfg.min_off_s),
-                poll_interval_s=int(self.cfg.poll_interval_s),
-                smooth_window=int(self.cfg.smooth_window),
-                max_stale_s=self.cfg.max_stale_s,
-                current_phase=('on' if self._is_on else 'off'),
-                phase_started_at=self._phase_started_at_iso,
-            )
+            self._conf.flush()
         except Exception as e:
-            logger.debug("thermo: persist conf failed: %s", e)
+            logger.warning("thermo: persist conf failed: %s", e)
 
     def _compute_phase_duration(self, start_iso: Optional[str], output_format: str = "minutes") -> Optional[int]:
         """Compute phase duration in minutes from ISO timestamp."""
@@ -156,7 +210,7 @@ class ACThermostat:
             dt = datetime.fromisoformat(s)
             if dt.tzinfo is None:
                 dt = dt.replace(tzinfo=self.tz)
-            phase_s = max(0.0, time.time() - dt.timestamp())
+            phase_s = max(0.0, self._now() - dt.timestamp())
             if output_format == "minutes":
                 return int(phase_s) // 60 if phase_s >= 60 else None
             return int(phase_s)
@@ -177,12 +231,13 @@ class ACThermostat:
             logger.debug("thermo: failed to record ac_event: %s", e)
 
         # set persisted phase start (UTC 'Z')
-        self._phase_started_at_iso = datetime.now(self.tz).isoformat()
-        self._persist_conf()
+        self._phase_started_at_iso = datetime.fromtimestamp(self._now(), tz=self.tz).isoformat()
+        # Written before returning so a crash cannot lose the transition
+        self._persist_conf(sync=True)
         return minutes
 
     def _record_external_state(self, new_on: bool) -> None:
-        """Update counters on external device state changes without issuing commands."""
+        """Record a device state change not made by the control logic (remote, app, manual command)."""
         if new_on == self._is_on:
             return
 
@@ -191,34 +246,32 @@ class ACThermostat:
         self._last_change_ts = self._now()
         self._emit_status()
 
-    def turn_on(self) -> int | None:
-        self.ac.turn_on()
+    def turn_on(self, temp_set: Optional[int] = None) -> int | None:
+        """Switch ON (and set the device target in the same frame if given)."""
+        values: Dict[int, Any] = {ACController.POWER: True}
+        if temp_set is not None:
+            values[ACController.TEMP_SET] = temp_set
+        result = self.ac.set_values(values)
+        if result['status'] != 'done':
+            # Failed, or a later command replaced part of it: the device
+            # state is read back on the next check instead of assumed
+            logger.warning("thermo: turn on not applied (%s): %s", result['status'], result['error'])
+            self.request_check('command')
+            return None
         self._is_on = True
         minutes = self._record_transition()
         return minutes
 
     def turn_off(self) -> int | None:
-        self.ac.turn_off()
+        result = self.ac.set_values({ACController.POWER: False})
+        if result['status'] != 'done':
+            logger.warning("thermo: turn off not applied (%s): %s", result['status'], result['error'])
+            self.request_check('command')
+            return None
         self._is_on = False
         minutes = self._record_transition()
         return minutes
 
-    def _parse_hhmm_to_minutes(self, s: Optional[str]) -> Optional[int]:
-        if not s:
-            return None
-        s = s.strip()
-        try:
-            parts = s.split(":", 1)
-            if len(parts) != 2:
-                return None
-            h = int(parts[0])
-            m = int(parts[1])
-            if not (0 <= h < 24 and 0 <= m < 60):
-                return None
-            return h * 60 + m
-        except Exception:
-            return None
-
     def _parse_epoch_to_hhmm(self, epoch: float) -> str:
         try:
             dt = datetime.fromtimestamp(epoch, tz=self.tz)
@@ -226,86 +279,18 @@ class ACThermostat:
         except Exception:
             return "??:??"
 
-    def _now_minutes_local(self) -> int:
-        lt = time.localtime()
-        return lt.tm_hour * 60 + lt.tm_min
+    def _compile_sleep(self) -> None:
+        """Recompile the sleep table from config, keeping unexpired overrides."""
+        compiled = SleepSchedule.from_conf(self.cfg)
+        compiled.copy_overrides(self._sleep, self._now())
+        self._sleep = compiled
 
     def _is_sleep_time_window_now(self) -> bool:
         """Return True if current local time falls within configured sleep window.
-        Supports optional weekly schedule; falls back to single start/stop."""
-        # Weekly schedule JSON in cfg.sleep_weekly, expected shape:
-        # { mon: {start:"HH:MM", stop:"HH:MM"}, tue: {...}, ... }
-        if not getattr(self.cfg, 'sleep_active', True):
-            return False
-        # Honor temporary override: when active, pretend not in sleep window
-        try:
-            if self._sleep_override_until is not None:
-                now = time.time()
-                if now < float(self._sleep_override_until):
-                    return False
-                # Expired -> clear override
-                self._sleep_override_until = None
-        except Exception:
-            self._sleep_override_until = None
-        try:
-            weekly = getattr(self.cfg, 'sleep_weekly', None)
-            if weekly:
-                import json
-                if isinstance(weekly, str):
-                    schedule = json.loads(weekly)
-                else:
-                    schedule = weekly
-                # Map weekday 0=Mon..6=Sun
-                wday = time.localtime().tm_wday  # 0=Mon
-                keys = ['mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun']
-                key = keys[wday] if 0 <= wday < len(keys) else None
-                if key and isinstance(schedule, dict) and key in schedule:
-                    day = schedule.get(key) or {}
-                    start = (day.get('start') or '').strip() or None
-                    stop = (day.get('stop') or '').strip() or None
-                    # Reuse single-day logic
-                    start_m = self._parse_hhmm_to_minutes(start)
-                    stop_m = self._parse_hhmm_to_minutes(stop)
-                    if start_m is None or stop_m is None:
-                        return False
-                    now_m = self._now_minutes_local()
-                    if start_m == stop_m:
-                        return False
-                    if start_m < stop_m:
-                        return start_m <= now_m < stop_m
-                    active = (now_m >= start_m) or (now_m < stop_m)
-                    return active
-        except Exception as e:
-            logger.exception("thermo: failed weekly sleep parse: %s", e)
-        # Fallback: single start/stop
-        start_m = self._parse_hhmm_to_minutes(self.cfg.sleep_start)
-        stop_m = self._parse_hhmm_to_minutes(self.cfg.sleep_stop)
-        if start_m is None or stop_m is None:
-            return False
-        now_m = self._now_minutes_local()
-        if start_m == stop_m:
-            logger.debug("thermo: sleep window start==stop; ignoring sleep")
-            return False
-        if start_m < stop_m:
-            in_sleep = start_m <= now_m < stop_m
-        else:
-            # wraps past midnight
-            in_sleep = (now_m >= start_m) or (now_m < stop_m)
-        logger.debug(
-            "thermo: sleep_check now=%02d:%02d start=%s stop=%s -> %s",
-            now_m // 60,
-            now_m % 60,
-            self.cfg.sleep_start,
-            self.cfg.sleep_stop,
-            in_sleep,
-        )
-        return in_sleep
-
-    def _read_external_temp(self) -> Optional[float]:
-        """Read latest temperature from selected control locations and apply smoothing.
-        If multiple locations are selected, use their average.
-        """
-        # Selected control locations from config (JSON string), fallback to single thermostat location
+        Looked up in the compiled table (weekly schedule or single start/stop)."""
+        return self._sleep.is_active(self._now())
+    def _control_locations(self) -> List[str]:
+        """Selected control locations from config (JSON string), fallback to single thermostat location."""
         locs: list[str] = []
         try:
             import json
@@ -318,53 +303,41 @@ class ACThermostat:
                     locs = [str(x) for x in sel if isinstance(x, str)]
         except Exception:
             locs = []
-        if not locs:
-            locs = [self.location]
+        return locs or [self.location]
+
+    def _read_external_temp(self) -> Optional[float]:
+        """Read latest temperature from selected control locations and apply smoothing.
+        If multiple locations are selected, use their average.
+        """
+        locs = self._control_locations()
 
         temps: list[float] = []
         used_locs: list[str] = []
         latest_ts: Optional[str] = None
         max_stale = self.cfg.max_stale_s
 
-        def _parse_iso_to_epoch(ts: Optional[str]) -> Optional[float]:
-            if not ts:
-                return None
-            s = str(ts).strip()
-            try:
-                if s.endswith('Z'):
-                    s = s[:-1]
-                dt = datetime.fromisoformat(s)
-                if dt.tzinfo is None:
-                    dt = dt.replace(tzinfo=self.tz)
-                return dt.timestamp()
-            except Exception:
-                try:
-                    return float(s)
-                except Exception:
-                    return None
-
         for loc in locs:
-            rec = self.ctrl.get_last_esp32_temphum_for_location(loc)
-            if rec is None or rec.temperature is None:
+            # Served from the controller's in-memory latest-reading cache
+            latest = self.ctrl.get_latest_reading(loc)
+            if latest is None or latest.reading.temperature is None:
                 continue
-            ts_epoch = _parse_iso_to_epoch(getattr(rec, 'timestamp', None))
-            if max_stale is not None and ts_epoch is not None:
-                age = self._now() - ts_epoch
+            if max_stale is not None:
+                age = self._now() - latest.ts_ms / 1000.0
                 if age > max_stale:
                     logger.debug(
                         "thermo: skipping stale reading for %s age=%.1fs > %ss", loc, age, max_stale)
                     continue
             try:
-                temps.append(float(rec.temperature))
+                temps.append(float(latest.reading.temperature))
                 used_locs.append(loc)
                 if latest_ts is None:
-                    latest_ts = getattr(rec, 'timestamp', None)
+                    latest_ts = latest.reading.timestamp
             except Exception:
                 continue
 
         if not temps:
             logger.debug(
-                "thermo: no fresh DB readings for control locations=%s", locs)
+                "thermo: no fresh readings for control locations=%s", locs)
             return None
 
         t = sum(temps) / len(temps)
@@ -413,24 +386,29 @@ class ACThermostat:
                     "sleep_time_active": bool(self._is_sleep_time_window_now()),
                 }
                 # Attach weekly schedule (as dict) if present
-                weekly = getattr(self.cfg, 'sleep_weekly', None)
-                if weekly:
-                    try:
-                        import json
-                        payload["sleep_schedule"] = json.loads(
-                            weekly) if isinstance(weekly, str) else weekly
-                    except Exception:
-                        payload["sleep_schedule"] = None
+                if getattr(self.cfg, 'sleep_weekly', None):
+                    payload["sleep_schedule"] = self._sleep.weekly
                 # Attach temporary override info if active
-                if self._sleep_override_until is not None:
+                override_until = self._sleep.override_until(self._now())
+                if override_until is not None:
                     payload["sleep_override_until"] = self._parse_epoch_to_hhmm(
-                        float(self._sleep_override_until))
+                        override_until)
 
                 self.notify('sleep_status', payload)
         except Exception as e:
             logger.debug("thermo: notify sleep failed: %s", e)
 
     def _emit_config(self) -> None:
+        """Send one thermo_config after the current burst of changes (with its flush)."""
+        self._config_changed = True
+        self._conf.schedule()
+
+    def _flush_config_emit(self) -> None:
+        if self._config_changed:
+            self._config_changed = False
+            self._send_config()
+
+    def _send_config(self) -> None:
         try:
             if self.notify:
                 payload: Dict[str, Any] = {
@@ -469,6 +447,7 @@ class ACThermostat:
             return
         self._persist_conf()
         self._emit_config()
+        self.request_check('config')
 
     def _emit_ac_state(self) -> None:
         try:
@@ -478,25 +457,52 @@ class ACThermostat:
         except Exception as e:
             logger.debug("thermo: notify ac_state failed: %s", e)
 
-    def set_mode(self, mode: str) -> None:
-        """Set AC mode immediately and update thermostat config for future ON events."""
-        mode_l = str(mode).strip().lower()
-        self.ac.set_mode(mode_l)
-        self.mode = mode_l
+    def emit_all(self) -> None:
+        """Notify listeners of the complete current state (seeds the view state store)."""
+        self._emit_status()
+        self._emit_thermostat_status()
         self._emit_ac_state()
+        self._emit_sleep_status()
+        self._send_config()
+
+    def _emit_command(self, action: str, cmd: Command) -> None:
+        try:
+            if self.notify:
+                self.notify('ac_command', {"action": action, **cmd.result()})
+        except Exception as e:
+            logger.debug("thermo: notify ac_command failed: %s", e)
 
-    def set_fan_speed(self, speed: str) -> None:
-        """Set AC fan speed immediately and update thermostat config for future ON events."""
+    def _on_command(self, action: str, code: str, value: Any) -> Callable[[Command], None]:
+        """Result callback of a manual command (runs on the command worker).
+
+        Only records what was applied and asks for a check; the loop thread
+        reconciles state, so pushes and results cannot both record a change.
+        """
+        def _done(cmd: Command) -> None:
+            if cmd.status == 'done':
+                with self._sched_lock:
+                    self._applied[code] = value
+                self.request_check('command')
+            self._emit_command(action, cmd)
+        return _done
+
+    def set_mode(self, mode: str) -> Command:
+        """Queue an AC mode change; state and listeners are updated once it is applied."""
+        mode_l = str(mode).strip().lower()
+        return self.ac.submit({ACController.MODE: mode_l}, self._on_command('set_mode', 'mode', mode_l))
+
+    def set_fan_speed(self, speed: str) -> Command:
+        """Queue an AC fan speed change; state and listeners are updated once it is applied."""
         speed_l = str(speed).strip().lower()
-        self.ac.set_fan_speed(speed_l)
-        self.fan_speed = speed_l
-        self._emit_ac_state()
+        return self.ac.submit({ACController.FAN: speed_l},
+                              self._on_command('set_fan_speed', 'fan_speed_enum', speed_l))
 
     def enable(self) -> None:
         self._enabled = True
         self.cfg.thermo_active = True
         self._persist_conf()
         self._emit_thermostat_status()
+        self.request_check('enabled')
 
     def disable(self) -> None:
         self._enabled = False
@@ -504,29 +510,26 @@ class ACThermostat:
         self._persist_conf()
         self._emit_thermostat_status()
 
-    def set_power(self, on: bool) -> None:
-        if on:
-            self.turn_on()
-            self._is_on = True
-        else:
-            self.turn_off()
-            self._is_on = False
-        # record timestamp of the manual power change
-        self._last_change_ts = self._now()
-        self._emit_status()
+    def set_power(self, on: bool) -> Command:
+        """Queue a manual power change; a superseded one leaves state to the later command."""
+        on = bool(on)
+        return self.ac.submit({ACController.POWER: on},
+                              self._on_command('power_on' if on else 'power_off', 'switch', on))
 
     def set_sleep_enabled(self, enabled: bool) -> None:
         self.cfg.sleep_active = bool(enabled)
+        self._compile_sleep()
         self._persist_conf()
         self._emit_sleep_status()
-        self.step_sleep_check()
+        self.request_check('sleep')
 
     def set_sleep_times(self, start: Optional[str], stop: Optional[str]) -> None:
         self.cfg.sleep_start = start
         self.cfg.sleep_stop = stop
+        self._compile_sleep()
         self._persist_conf()
         self._emit_sleep_status()
-        self.step_sleep_check()
+        self.request_check('sleep')
 
     def set_sleep_schedule(self, schedule: Dict[str, Dict[str, Optional[str]]]) -> None:
         """Set weekly sleep schedule from dict mapping days to {start, stop}."""
@@ -548,9 +551,10 @@ class ACThermostat:
         except Exception as e:
             logger.debug("thermo: set_sleep_schedule failed: %s", e)
             return
+        self._compile_sleep()
         self._persist_conf()
         self._emit_sleep_status()
-        self.step_sleep_check()
+        self.request_check('sleep')
 
     def disable_sleep_for(self, minutes: int) -> None:
         """Temporarily disable sleep enforcement for the given minutes.
@@ -562,12 +566,12 @@ class ACThermostat:
             return
         if m <= 0:
             return
-        self._sleep_override_until = time.time() + (m * 60)
+        self._sleep.suppress(self._now() + (m * 60), self._now())
         logger.info("thermo: sleep override enabled for %d minutes (until %s)",
                     m, (datetime.now() + timedelta(minutes=m)).strftime("%H:%M"))
         # Re-evaluate sleep state and inform listeners
         self._emit_sleep_status()
-        self.step_sleep_check()
+        self.request_check('sleep')
 
     # Thermostat parameters
 
@@ -578,6 +582,7 @@ class ACThermostat:
             return
         self._persist_conf()
         self._emit_config()
+        self.request_check('config')
 
     def set_hysteresis_split(self, pos_h: float, neg_h: float) -> None:
         try:
@@ -591,6 +596,7 @@ class ACThermostat:
             return
         self._persist_conf()
         self._emit_config()
+        self.request_check('config')
 
     # Backward-compatible single-value setter
     def set_hysteresis(self, deadband: float) -> None:
@@ -614,6 +620,7 @@ class ACThermostat:
             return
         self._persist_conf()
         self._emit_config()
+        self.request_check('config')
 
     def set_min_off_s(self, seconds: int) -> None:
         try:
@@ -625,6 +632,7 @@ class ACThermostat:
             return
         self._persist_conf()
         self._emit_config()
+        self.request_check('config')
 
     def set_poll_interval_s(self, seconds: int) -> None:
         try:
@@ -636,6 +644,7 @@ class ACThermostat:
             return
         self._persist_conf()
         self._emit_config()
+        self.request_check('config')
 
     def set_smooth_window(self, n: int) -> None:
         try:
@@ -650,6 +659,7 @@ class ACThermostat:
             return
         self._persist_conf()
         self._emit_config()
+        self.request_check('config')
 
     def set_max_stale_s(self, seconds: Optional[int]) -> bool:
         try:
@@ -662,8 +672,9 @@ class ACThermostat:
             return
         self._persist_conf()
         self._emit_config()
+        self.request_check('config')
 
-    def step_sleep_check(self) -> None:
+    def step_sleep_check(self) -> bool:
         logger.debug("thermo: step_sleep_check: sleep_active=%s is_sleep_time=%s is_on=%s",
                      getattr(self.cfg, 'sleep_active', True), self._is_sleep_time_window_now(), self._is_on)
 
@@ -679,8 +690,9 @@ class ACThermostat:
                 if self._can_turn_off():
                     logger.info("thermo: sleep active — turning OFF")
                     self.turn_off()
-                    self._last_change_ts = self._now()
-                    self._emit_status()
+                    if not self._is_on:
+                        self._last_change_ts = self._now()
+                        self._emit_status()
                 else:
                     wait = self.cfg.min_on_s - \
                         (self._now() - self._last_change_ts)
@@ -688,9 +700,6 @@ class ACThermostat:
                         "thermo: sleep active — waiting min-on %.0fs before OFF", max(0, wait))
             else:
                 logger.debug("thermo: sleep active — staying OFF")
-            logger.debug("thermo: sleeping %ss (sleep mode)",
-                         self.cfg.poll_interval_s)
-            time.sleep(self.cfg.poll_interval_s)
             return False
         return True
 
@@ -699,7 +708,6 @@ class ACThermostat:
         if temp is None:
             logger.warning(
                 "thermo: no valid temp (missing or stale); skipping")
-            time.sleep(self.cfg.poll_interval_s)
             return
 
         on_at, off_at = self._thresholds()
@@ -716,17 +724,14 @@ class ACThermostat:
             # OFF -> consider ON
             if temp >= on_at and self._can_turn_on():
                 # Turn on device and force target device temperature to 16°C (doesn't change target_temp)
-                time_delta = self.turn_on()
+                time_delta = self.turn_on(temp_set=16)
+                if not self._is_on:
+                    return
                 logger.info(
                     f"thermo: ON trigger: temp={temp:.2f} <= {off_at:.2f}; turned on after {time_delta} min")
                 if time_delta:
                     self.ctrl.log_message(
                         (f"AC ON, delta={time_delta} min, on_at={on_at}, off_at={off_at}"), log_type="ac")
-                try:
-                    self.ac.set_temperature(16)
-                except Exception as e:
-                    logger.debug(
-                        "thermo: failed to set device temp to 16: %s", e)
                 self._last_change_ts = now
                 self._emit_status()
                 logger.debug("thermo: state changed -> ON; temp_set=16")
@@ -743,6 +748,8 @@ class ACThermostat:
             # ON -> consider OFF
             if temp <= off_at and self._can_turn_off():
                 time_delta = self.turn_off()
+                if self._is_on:
+                    return
                 logger.info(
                     f"thermo: OFF trigger: temp={temp:.2f} <= {off_at:.2f}; turned off after {time_delta} min")
                 if time_delta:
@@ -763,26 +770,34 @@ class ACThermostat:
                     logger.debug("thermo: staying ON: %s", ", ".join(reasons))
 
     def step(self):
-        """One control step using external temperature."""
+        """One control step using external temperature (run by ``run_forever`` only)."""
         # Refresh actual device state at the very beginning and inform listeners if changed
         try:
-            status = self.ac.get_status()
+            with self._sched_lock:
+                applied, self._applied = self._applied, {}
+            # After a manual command read the device itself rather than the
+            # cache; applied values only fill in what it does not report
+            status = self.ac.get_status(0) if applied else self.ac.get_status()
+            if isinstance(status, dict) or applied:
+                reported = {k: v for k, v in (status or {}).items() if v is not None}
+                status = {**applied, **reported}
             if isinstance(status, dict) and 'switch' in status:
                 new_is_on = bool(status.get('switch', False))
                 if new_is_on != self._is_on:
                     logger.info(
-                        "thermo: device state changed externally -> %s", "ON" if new_is_on else "OFF")
+                        "thermo: device state changed (%s) -> %s",
+                        "command" if 'switch' in applied else "externally", "ON" if new_is_on else "OFF")
                     self._record_external_state(new_is_on)
             # Also track mode/fan changes
             if isinstance(status, dict):
                 changed = False
                 m = status.get('mode')
                 f = status.get('fan_speed_enum')
-                if m is not None and m != self._mode:
-                    self._mode = m
+                if m is not None and m != self.mode:
+                    self.mode = m
                     changed = True
-                if f is not None and f != self._fan_speed:
-                    self._fan_speed = f
+                if f is not None and f != self.fan_speed:
+                    self.fan_speed = f
                     changed = True
                 if changed:
                     self._emit_ac_state()
@@ -791,24 +806,97 @@ class ACThermostat:
 
         # If thermostat is disabled, skip any control actions
         if not self._enabled:
-            time.sleep(self.cfg.poll_interval_s)
             return
 
         # Sleep mode: don't allow turning ON; if currently ON, try to turn OFF respecting min_on
         resume = self.step_sleep_check()
         self.step_on_off_check() if resume else None
 
-        logger.debug("thermo: sleeping %ss", self.cfg.poll_interval_s)
-        time.sleep(self.cfg.poll_interval_s)
+    # --- Scheduler ---
+
+    def request_check(self, reason: str = 'event', delay_s: float = 0.0) -> None:
+        """Have the control loop run a step within ``delay_s``; never runs it on the caller.
+
+        An earlier pending request is kept, so a burst is checked once,
+        ``delay_s`` after its first event.
+        """
+        due = self._monotonic() + max(0.0, float(delay_s))
+        with self._sched_lock:
+            if self._check_due is None or due < self._check_due:
+                self._check_due = due
+            self._check_reasons.add(reason)
+        self._wake.set()
+
+    def on_reading(self, location: str) -> None:
+        """A fresh reading was stored; check soon if it is a control location."""
+        if location in self._control_locations():
+            self.request_check('reading', self.debounce_s)
+
+    def _next_deadline(self, now: float) -> Optional[float]:
+        """Epoch of the next time-driven state change: min-on/min-off expiry or a sleep boundary."""
+        candidates: list[float] = []
+        if self._enabled:
+            hold = self.cfg.min_on_s if self._is_on else self.cfg.min_off_s
+            expiry = self._last_change_ts + float(hold)
+            if expiry > now:
+                candidates.append(expiry)
+        boundary = self._sleep.next_transition(now)
+        if boundary is not None:
+            candidates.append(boundary)
+        return min(candidates) if candidates else None
+
+    def next_wake(self) -> float:
+        """Monotonic time the next step is due: a requested check, the next
+        deadline (plus slack) or the ``poll_interval_s`` fallback."""
+        mono = self._monotonic()
+        due = [self._last_check + float(self.cfg.poll_interval_s)]
+        with self._sched_lock:
+            if self._check_due is not None:
+                due.append(self._check_due)
+        now = self._now()
+        deadline = self._next_deadline(now)
+        if deadline is not None:
+            due.append(mono + deadline - now + DEADLINE_SLACK_S)
+        return min(due)
+
+    def _seconds_to_next_check(self) -> float:
+        return max(0.0, self.next_wake() - self._monotonic())
+
+    def run_check(self) -> None:
+        """Run one step now, taking the pending check requests (what ``run_forever`` does when due)."""
+        with self._sched_lock:
+            reasons = self._check_reasons or {'deadline'}
+            self._check_reasons = set()
+            self._check_due = None
+        self._last_check = self._monotonic()
+        logger.debug("thermo: step (%s)", ", ".join(sorted(reasons)))
+        try:
+            self.step()
+        except Exception as e:
+            logger.exception("thermo: error during control loop: %s", e)
 
     def run_forever(self):
-        logger.info("thermo: starting thermostat loop (external temp source)")
-        while True:
-            try:
-                self.step()
-            except Exception as e:
-                logger.exception("thermo: error during control loop: %s", e)
-                time.sleep(self.cfg.poll_interval_s)
+        """Run control steps when requested or when a deadline passes, until ``stop``."""
+        logger.info("thermo: starting event-driven thermostat loop (external temp source)")
+        self.request_check('start')
+        while not self._stop_evt.is_set():
+            wait = self._seconds_to_next_check()
+            if wait > 0:
+                woken = self._wake.wait(wait)
+                self._wake.clear()
+                # Woken by a request that is not due yet, or by stop; a timeout
+                # means the deadline passed (and no longer shows up as one)
+                if woken and self._seconds_to_next_check() > 0:
+                    continue
+                if self._stop_evt.is_set():
+                    break
+            self.run_check()
+
+    def stop(self) -> None:
+        self._stop_evt.set()
+        self._wake.set()
+        self._conf.stop()
+        self._flush_config_emit()
 
     @property
     def is_on(self) -> bool:
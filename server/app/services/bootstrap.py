@@ -14,9 +14,17 @@ import tinytuya
 
 from .ac.thermostat import ACThermostat
 from .ac.controller import ACController
+from .ac.session import DeviceSession
 from .hue.controller import HueController
+from .retention.engine import RetentionEngine
+from .ingest.queue import IngestQueue
+from .ingest.readings import live_max_age_s, live_readings
+from .ingest.redis_stream import RedisStreamIngest
+from .mqtt.subscriber import MqttIngest
 from ..extensions import socketio
 from ..sockets.handlers import SocketEventHandler
+from ..sockets.coalescer import BroadcastCoalescer
+from ..sockets.replay import ReplayLog
 
 
 logger = logging.getLogger(__name__)
@@ -47,6 +55,35 @@ def init_services(app) -> Dict[str, Any]:
 
     # Ensure Socket event handlers are registered (singleton takes care of idempotency)
     app.sio_handler = SocketEventHandler(socketio, app.ctrl)  # type: ignore[attr-defined]
+    app.sio_handler.replay = ReplayLog(app.config.get("REPLAY_BUFFER_SIZE", 256))  # type: ignore[attr-defined]
+
+    # --- Telemetry broadcast coalescer (latest value per key, flushed per room) ---
+    try:
+        coalescer = BroadcastCoalescer(
+            app.sio_handler.broadcast,  # type: ignore[attr-defined]
+            interval_s=app.config.get("BROADCAST_INTERVAL_S", 1.0),
+            room_intervals=app.config.get("BROADCAST_ROOM_INTERVALS"),
+        )
+        coalescer.start()
+        app.sio_handler.coalescer = coalescer  # type: ignore[attr-defined]
+        services["coalescer"] = coalescer
+    except Exception as e:
+        logger.exception("Failed to start broadcast coalescer: %s", e)
+
+    # --- DB retention (replaces per-insert cleanup triggers) ---
+    try:
+        retention = RetentionEngine(
+            app.ctrl.db,  # type: ignore[attr-defined]
+            interval_s=app.config.get("RETENTION_INTERVAL_S", 600),
+            vacuum_pages=app.config.get("RETENTION_VACUUM_PAGES", 0),
+            # Pruned days are no longer immutable; drop their cached responses
+            on_pruned=lambda policy, cutoff: app.ctrl.invalidate_days(last=cutoff.date()),  # type: ignore[attr-defined]
+        )
+        retention.start()
+        app.retention = retention  # type: ignore[attr-defined]
+        services["retention"] = retention
+    except Exception as e:
+        logger.exception("Failed to start retention engine: %s", e)
 
     # --- AC / Thermostat ---
     AC_DEVICE_ID = os.getenv("AC_DEV_ID")
@@ -57,7 +94,22 @@ def init_services(app) -> Dict[str, Any]:
         if not all([AC_DEVICE_ID, AC_IP, AC_LOCAL_KEY]):
             raise ValueError("Missing one of AC_DEV_ID, AC_IP, or AC_LOCAL_KEY environment variables")
         tinytuya_device = tinytuya.Device(AC_DEVICE_ID, AC_IP, AC_LOCAL_KEY)
-        ac_controller = ACController(tinytuya_device=tinytuya_device)
+        # Persistent socket + cached status; the thermostat reads the cache
+        ac_session = DeviceSession(
+            tinytuya_device,
+            ttl_s=app.config.get("AC_STATUS_TTL_S", 30),
+            heartbeat_s=app.config.get("AC_HEARTBEAT_S", 10),
+        )
+        ac_session.poll()
+        ac_session.start()
+        app.ac_session = ac_session  # type: ignore[attr-defined]
+        services["ac_session"] = ac_session
+        ac_controller = ACController(
+            session=ac_session,
+            command_timeout_s=app.config.get("AC_COMMAND_TIMEOUT_S", 10),
+            command_retries=app.config.get("AC_COMMAND_RETRIES", 2),
+        )
+        app.ac_controller = ac_controller  # type: ignore[attr-defined]
         THERMOSTAT_LOCATION = os.getenv("THERMOSTAT_LOCATION", "Tietokonepöytä")
         # Load thermostat configuration from DB (seed default if missing)
         try:
@@ -78,15 +130,94 @@ def init_services(app) -> Dict[str, Any]:
             ctrl=app.ctrl,  # type: ignore[attr-defined]
             location=THERMOSTAT_LOCATION,
             notify=_make_notify(app.ctrl),  # type: ignore[attr-defined]
+            debounce_s=app.config.get("THERMOSTAT_DEBOUNCE_S", 1.0),
+            persist_debounce_s=app.config.get("THERMOSTAT_PERSIST_DEBOUNCE_S", 0.5),
         )
         app.ac_thermostat = ac_thermostat  # type: ignore[attr-defined]
-        t = threading.Thread(target=ac_thermostat.run_forever, daemon=True)
+        # Seed the view state store; later changes arrive through notify
+        ac_thermostat.emit_all()
+        # Changes made at the unit (remote, app) are picked up right away
+        ac_session.on_change = lambda dps: ac_thermostat.request_check('device')
+        t = threading.Thread(target=ac_thermostat.run_forever, name="ACThermostat", daemon=True)
         t.start()
         services["ac_thermostat"] = ac_thermostat
         logger.info("Tuya AC controller started for device %s", AC_DEVICE_ID)
     except Exception as e:
         logger.exception("Failed to initialize AC thermostat: %s", e)
 
+    # --- Sensor ingest queue (handlers enqueue; one writer persists + fans out) ---
+    if app.config.get("INGEST_ASYNC", True):
+        try:
+            common = dict(
+                emit=app.sio_handler.emit_to_views,  # type: ignore[attr-defined]
+                thermostat=getattr(app, "ac_thermostat", None),
+                batch_size=app.config.get("INGEST_BATCH_SIZE", 200),
+            )
+            if app.config.get("INGEST_BACKEND") == "redis":
+                # Durable: readings survive worker restarts, consumers scale out
+                ingest = RedisStreamIngest(
+                    app.ctrl,  # type: ignore[attr-defined]
+                    redis_url=app.config.get("INGEST_REDIS_URL", "redis://localhost:6379"),
+                    stream=app.config.get("INGEST_STREAM", "ingest:esp32"),
+                    maxlen=app.config.get("INGEST_STREAM_MAXLEN", 100000),
+                    consume=app.config.get("INGEST_CONSUMER", True),
+                    **common,
+                )
+            else:
+                ingest = IngestQueue(
+                    app.ctrl,  # type: ignore[attr-defined]
+                    maxsize=app.config.get("INGEST_QUEUE_SIZE", 1000),
+                    **common,
+                )
+            ingest.start()
+            app.ingest = ingest  # type: ignore[attr-defined]
+            app.sio_handler.ingest = ingest  # type: ignore[attr-defined]
+            services["ingest"] = ingest
+        except Exception as e:
+            logger.exception("Failed to start ingest queue: %s", e)
+
+    # --- MQTT sensor subscriber (same pipeline as the REST endpoint) ---
+    if app.config.get("MQTT_ENABLED"):
+        try:
+            ingest = getattr(app, "ingest", None)
+            if ingest is not None:
+                submit = ingest.submit
+            else:
+                def submit(reading: Dict[str, Any]) -> bool:
+                    thermo = getattr(app, "ac_thermostat", None)
+                    saved = app.ctrl.record_esp32_temphum_batch([reading])  # type: ignore[attr-defined]
+                    for rec in live_readings(app.ctrl, saved, live_max_age_s(thermo)):  # type: ignore[attr-defined]
+                        app.sio_handler.emit_to_views('esp32_temphum', {  # type: ignore[attr-defined]
+                            'location': rec.location,
+                            'temperature': rec.temperature,
+                            'humidity': rec.humidity,
+                            'ac_on': rec.ac_on,
+                        })
+                        if thermo is not None:
+                            thermo.on_reading(rec.location)
+                    return True
+
+            def ac_state() -> Any:
+                thermo = getattr(app, "ac_thermostat", None)
+                return bool(thermo.is_on) if thermo is not None else None
+
+            mqtt_ingest = MqttIngest(
+                submit,
+                host=app.config.get("MQTT_HOST", "localhost"),
+                port=app.config.get("MQTT_PORT", 1883),
+                topic_prefix=app.config.get("MQTT_TOPIC_PREFIX", "home"),
+                client_id=app.config.get("MQTT_CLIENT_ID", "server-ingest"),
+                username=app.config.get("MQTT_USERNAME"),
+                password=app.config.get("MQTT_PASSWORD"),
+                tls=app.config.get("MQTT_TLS", False),
+                ac_state=ac_state,
+            )
+            mqtt_ingest.start()
+            app.mqtt_ingest = mqtt_ingest  # type: ignore[attr-defined]
+            services["mqtt"] = mqtt_ingest
+        except Exception as e:
+            logger.exception("Failed to start MQTT subscriber: %s", e)
+
     # --- Hue time‑based routine ---
     try:
         hue_bridge_ip = os.getenv("HUE_BRIDGE_IP")
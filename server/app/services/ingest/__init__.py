@@ -0,0 +1 @@
+"""Sensor ingest: bounded queue between request handlers and the database."""
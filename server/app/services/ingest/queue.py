@@ -0,0 +1,193 @@
+"""Bounded in-process ingest queue for ESP32 readings.
+
+HTTP and Socket.IO handlers validate a reading, stamp it and ``submit`` it;
+a single writer drains the queue in batches, persists each batch in one
+transaction, then fans the newest values out to views and tells the
+thermostat which locations have fresh data (old or backfilled readings are
+only stored). When the queue is full, ``submit`` waits briefly and then drops
+the reading (counted), so callers can answer 503 instead of piling up.
+"""
+
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from ...core.controller import Controller
+from ...core.models import ESP32TemperatureHumidity
+from .readings import live_max_age_s, live_readings
+
+logger = logging.getLogger(__name__)
+
+
+class IngestQueue:
+    """Decouple reading submission from persistence and fan-out.
+
+    :param ctrl: domain controller (``record_esp32_temphum_batch``)
+    :param emit: ``emit(event, payload)`` to browser views, or None
+    :param thermostat: object with ``on_reading(location)``, or None
+    :param maxsize: queue capacity (readings)
+    :param batch_size: readings written per transaction at most
+    :param put_timeout_s: how long ``submit`` waits on a full queue before dropping
+    """
+
+    def __init__(
+        self,
+        ctrl: Controller,
+        emit: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+        thermostat: Any = None,
+        maxsize: int = 1000,
+        batch_size: int = 200,
+        put_timeout_s: float = 0.5,
+    ) -> None:
+        self.ctrl = ctrl
+        self.emit = emit
+        self.thermostat = thermostat
+        self.batch_size = max(1, int(batch_size))
+        self.put_timeout_s = max(0.0, float(put_timeout_s))
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=max(1, int(maxsize)))
+        self._stop_evt = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, Any] = {
+            'submitted': 0,
+            'written': 0,
+            'dropped': 0,
+            'failed': 0,
+            'batches': 0,
+            'max_depth': 0,
+            'last_batch_size': 0,
+            'last_write_ms': None,
+        }
+
+    # --- Producer side ---
+
+    def submit(self, reading: Dict[str, Any]) -> bool:
+        """Enqueue one reading (dict as for ``record_esp32_temphum_batch``).
+
+        Returns False when the queue stayed full for ``put_timeout_s`` and the
+        reading was dropped.
+        """
+        try:
+            if self.put_timeout_s:
+                self._queue.put(reading, timeout=self.put_timeout_s)
+            else:
+                self._queue.put_nowait(reading)
+        except queue.Full:
+            self._count('dropped')
+            logger.warning("ingest: queue full (%d), dropped reading for %s",
+                           self._queue.maxsize, reading.get('location'))
+            return False
+        with self._lock:
+            self._metrics['submitted'] += 1
+            depth = self._queue.qsize()
+            if depth > self._metrics['max_depth']:
+                self._metrics['max_depth'] = depth
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters plus current depth and capacity."""
+        with self._lock:
+            out = dict(self._metrics)
+        out['depth'] = self._queue.qsize()
+        out['capacity'] = self._queue.maxsize
+        return out
+
+    # --- Writer side ---
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self._metrics[name] += n
+
+    def _drain(self, first: Dict[str, Any]) -> List[Dict[str, Any]]:
+        batch = [first]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: List[Dict[str, Any]], count_failed: bool = True) -> bool:
+        """Persist one batch and fan it out; False if the DB write failed.
+
+        ``count_failed=False`` leaves the ``failed`` counter to a caller that
+        retries the batch.
+        """
+        started = time.monotonic()
+        held_ts: List[int] = []
+        try:
+            saved = self.ctrl.record_esp32_temphum_batch(batch, held_ts=held_ts)
+        except Exception as e:
+            if count_failed:
+                self._count('failed', len(batch))
+            logger.exception("ingest: writing %d readings failed: %s", len(batch), e)
+            return False
+        with self._lock:
+            self._metrics['written'] += len(saved)
+            self._metrics['batches'] += 1
+            self._metrics['last_batch_size'] = len(batch)
+            self._metrics['last_write_ms'] = round((time.monotonic() - started) * 1000, 1)
+        self._fan_out(saved, held_ts)
+        return True
+
+    def _fan_out(self, saved: List[ESP32TemperatureHumidity], held_ts: Sequence[int] = ()) -> None:
+        """Send the newest live readings to views and the thermostat.
+
+        ``held_ts`` are earlier compressed rows stored with the batch; only
+        processes that did not write it need them (see RedisStreamIngest).
+        """
+        # Views and the thermostat only care about the newest live value per location
+        newest = live_readings(self.ctrl, saved, live_max_age_s(self.thermostat))
+        if self.emit is not None:
+            for rec in newest:
+                try:
+                    self.emit('esp32_temphum', {
+                        'location': rec.location,
+                        'temperature': rec.temperature,
+                        'humidity': rec.humidity,
+                        'ac_on': rec.ac_on,
+                    })
+                except Exception as e:
+                    logger.debug("ingest: emit failed: %s", e)
+        if self.thermostat is not None:
+            # The thermostat debounces and runs the check on its own loop
+            for rec in newest:
+                self.thermostat.on_reading(rec.location)
+
+    def _loop(self) -> None:
+        while not self._stop_evt.is_set():
+            try:
+                first = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            self._write(self._drain(first))
+        self.flush()
+
+    def flush(self) -> None:
+        """Write everything still queued (used on stop)."""
+        while True:
+            try:
+                first = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            self._write(self._drain(first))
+
+    # --- Lifecycle ---
+
+    def start(self) -> None:
+        """Start the writer thread (a greenlet under eventlet; idempotent)."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_evt.clear()
+        self._thread = threading.Thread(target=self._loop, name="IngestWriter", daemon=True)
+        self._thread.start()
+
+    def stop(self, wait: bool = False) -> None:
+        """Stop the writer; queued readings are flushed before it exits."""
+        self._stop_evt.set()
+        if wait and self._thread:
+            self._thread.join()
@@ -0,0 +1,100 @@
+"""Validation and live fan-out selection of sensor readings, shared by every
+ingest path (REST, MQTT, Socket.IO)."""
+
+from __future__ import annotations
+
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+import pytz
+
+from ...core.models import ESP32TemperatureHumidity
+
+VALID_ESP32_LOCATIONS = ["Keittiö", "Makuuhuone",
+                         "Tietokonepöytä", "WC", "Parveke", "test"]
+
+# Device clocks may run ahead a little; anything further out is rejected
+MAX_FUTURE_SKEW_MS = 5 * 60 * 1000
+
+# Without a thermostat, readings older than this are history, not live values
+LIVE_MAX_AGE_S = 120
+
+
+def parse_reading(item: Any, now_ms: int, location: Optional[str] = None) -> Dict[str, Any]:
+    """Validate one device reading; raises ValueError with a client-facing message.
+
+    ``item`` is ``{ location, temperature_c, humidity_pct, ts?, ac_on? }``;
+    ``location`` overrides the field (e.g. taken from an MQTT topic). Returns
+    the dict expected by ``Controller.record_esp32_temphum_batch``.
+    """
+    if not isinstance(item, dict):
+        raise ValueError('reading must be an object')
+    if item.get('error'):
+        raise ValueError(f"device error: {item.get('error')}")
+    location = location or item.get('location')
+    temp, hum = item.get('temperature_c'), item.get('humidity_pct')
+    if location is None or temp is None or hum is None:
+        raise ValueError('location, temperature_c, humidity_pct required')
+    if location not in VALID_ESP32_LOCATIONS:
+        raise ValueError('Invalid location')
+    ts = item.get('ts')
+    if ts is None:
+        ts_ms = now_ms
+    elif isinstance(ts, str):
+        dt = datetime.fromisoformat(ts[:-1] + '+00:00' if ts.endswith('Z') else ts)
+        if dt.tzinfo is None:
+            dt = pytz.timezone('Europe/Helsinki').localize(dt)
+        ts_ms = int(dt.timestamp() * 1000)
+    else:
+        ts_num = float(ts)
+        # Device clocks send epoch seconds or milliseconds
+        ts_ms = int(ts_num * 1000) if ts_num < 1e11 else int(ts_num)
+    if ts_ms > now_ms + MAX_FUTURE_SKEW_MS:
+        raise ValueError('timestamp is in the future')
+    ac_on = item.get('ac_on')
+    return {
+        'location': location,
+        'temperature': float(temp),
+        'humidity': float(hum),
+        'ts_ms': ts_ms,
+        'ac_on': None if ac_on is None else bool(ac_on),
+    }
+
+
+def live_max_age_s(thermostat: Any) -> Optional[float]:
+    """Age up to which a reading counts as live: the thermostat's stale window if any."""
+    cfg = getattr(thermostat, 'cfg', None)
+    if cfg is None:
+        return LIVE_MAX_AGE_S
+    return getattr(cfg, 'max_stale_s', LIVE_MAX_AGE_S)
+
+
+def live_readings(
+    ctrl: Any,
+    saved: Iterable[ESP32TemperatureHumidity],
+    max_age_s: Optional[float] = LIVE_MAX_AGE_S,
+    now_ms: Optional[int] = None,
+) -> List[ESP32TemperatureHumidity]:
+    """Newest reading per location among ``saved`` that is worth pushing live.
+
+    A location is skipped when ``ctrl`` already knows a newer reading (an
+    old, buffered upload) or its newest reading is older than ``max_age_s``
+    (a backfill; None means no age limit).
+    """
+    now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+    newest: Dict[str, tuple[int, ESP32TemperatureHumidity]] = {}
+    for rec in saved:
+        ts_ms = int(datetime.fromisoformat(rec.timestamp).timestamp() * 1000)
+        cur = newest.get(rec.location)
+        if cur is None or ts_ms >= cur[0]:
+            newest[rec.location] = (ts_ms, rec)
+    out: List[ESP32TemperatureHumidity] = []
+    for location, (ts_ms, rec) in newest.items():
+        latest = ctrl.get_latest_reading(location)
+        if latest is not None and latest.ts_ms > ts_ms:
+            continue
+        if max_age_s is not None and now_ms - ts_ms > max_age_s * 1000:
+            continue
+        out.append(rec)
+    return out
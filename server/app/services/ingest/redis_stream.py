@@ -0,0 +1,328 @@
+"""Durable ingest log on a Redis Stream with a consumer-group writer.
+
+Drop-in alternative to IngestQueue: ``submit`` XADDs the reading to a
+stream, so it survives a crash or restart of the web worker. A consumer in
+group ``group`` reads entries in batches, writes each batch to SQLite in one
+transaction and XACKs it only after the commit. Entries of a consumer that
+died are claimed by the others after ``claim_idle_ms``. Delivery is
+at-least-once: a crash between commit and ack re-inserts that batch. A batch
+whose entries were delivered ``max_deliveries`` times is written one entry at
+a time; entries that still fail are moved to ``dead_letter`` and acked.
+
+The consumer runs as a greenlet inside the web app (``consume=True``) or as
+a separate process::
+
+    DB_PATH=/opt/app.db python -m app.services.ingest.redis_stream
+
+Every consumer publishes the readings it persisted on ``channel``. Web
+processes subscribe and apply batches written elsewhere as if they had
+written them: the latest-reading cache, cached past days, view events
+(topic rooms, replay, coalescing) and the thermostat's ``on_reading``.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import redis
+
+from ...config import load_storage_settings
+from ...core.controller import Controller
+from ...core.models import ESP32TemperatureHumidity
+from .queue import IngestQueue
+
+logger = logging.getLogger(__name__)
+
+
+class RedisStreamIngest(IngestQueue):
+    """IngestQueue backed by a Redis Stream and a consumer group.
+
+    :param redis_url: Redis connection URL
+    :param stream: stream key
+    :param group: consumer group name (one per database)
+    :param consumer: consumer name; defaults to ``<host>-<pid>``
+    :param maxlen: approximate cap of the stream length (oldest trimmed)
+    :param consume: run the consumer in this process on ``start()``
+    :param claim_idle_ms: claim other consumers' entries pending this long
+    :param channel: pub/sub channel of persisted readings; defaults to ``<stream>:saved``
+    :param listen: apply readings persisted by other processes (web processes)
+    :param max_deliveries: deliveries of an entry before its batch is split up
+    :param dead_letter: stream of entries that could not be written; defaults to ``<stream>:dead``
+    Other keyword arguments are passed to IngestQueue.
+    """
+
+    def __init__(
+        self,
+        ctrl: Controller,
+        redis_url: str = "redis://localhost:6379",
+        stream: str = "ingest:esp32",
+        group: str = "sqlite-writer",
+        consumer: Optional[str] = None,
+        maxlen: int = 100000,
+        consume: bool = True,
+        claim_idle_ms: int = 60000,
+        channel: Optional[str] = None,
+        listen: bool = True,
+        max_deliveries: int = 5,
+        dead_letter: Optional[str] = None,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(ctrl, **kwargs)
+        self.redis = redis.Redis.from_url(redis_url, decode_responses=True)
+        self.stream = stream
+        self.group = group
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        self.maxlen = int(maxlen)
+        self.consume = bool(consume)
+        self.claim_idle_ms = int(claim_idle_ms)
+        self.channel = channel or f"{stream}:saved"
+        self.listen = bool(listen)
+        self.max_deliveries = max(1, int(max_deliveries))
+        self.dead_letter = dead_letter or f"{stream}:dead"
+        self._listener: threading.Thread | None = None
+        self._metrics.update({'acked': 0, 'claimed': 0, 'published': 0, 'received': 0,
+                              'dead_lettered': 0})
+
+    # --- Producer side ---
+
+    def submit(self, reading: Dict[str, Any]) -> bool:
+        """XADD one reading; False (counted as dropped) if Redis is unreachable."""
+        try:
+            self.redis.xadd(self.stream, {'r': json.dumps(reading)},
+                            maxlen=self.maxlen, approximate=True)
+        except redis.RedisError as e:
+            self._count('dropped')
+            logger.warning("ingest: XADD to %s failed, dropped reading for %s: %s",
+                           self.stream, reading.get('location'), e)
+            return False
+        self._count('submitted')
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters plus stream length, pending entries and consumer-group lag."""
+        with self._lock:
+            out = dict(self._metrics)
+        out.update({'backend': 'redis', 'stream': self.stream, 'group': self.group,
+                    'consumer': self.consumer if self.consume else None})
+        try:
+            out['stream_length'] = self.redis.xlen(self.stream)
+            for info in self.redis.xinfo_groups(self.stream):
+                if info.get('name') == self.group:
+                    out['pending'] = info.get('pending')
+                    # Entries not yet delivered to the group (Redis >= 7)
+                    out['lag'] = info.get('lag')
+                    break
+        except redis.RedisError as e:
+            out['redis_error'] = str(e)
+        return out
+
+    # --- Consumer side ---
+
+    def _ensure_group(self) -> None:
+        try:
+            self.redis.xgroup_create(self.stream, self.group, id='0', mkstream=True)
+        except redis.ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+    def _dead_letter(self, entry_id: str, fields: Dict[str, str], reason: str) -> None:
+        """Move an entry that cannot be written to ``dead_letter`` and ack it."""
+        self.redis.xadd(self.dead_letter, {**fields, 'id': entry_id, 'reason': reason},
+                        maxlen=self.maxlen, approximate=True)
+        self.redis.xack(self.stream, self.group, entry_id)
+        self._count('failed')
+        self._count('dead_lettered')
+        logger.warning("ingest: moved stream entry %s to %s (%s)", entry_id, self.dead_letter, reason)
+
+    def _process(self, entries: List[Tuple[str, Dict[str, str]]],
+                 deliveries: Optional[Dict[str, int]] = None) -> None:
+        """Write ``entries`` as one batch and ack them after the commit.
+
+        A failed batch stays pending and is retried via XAUTOCLAIM, without
+        counting as failed. Once an entry was delivered ``max_deliveries``
+        times (``deliveries``: entry id -> count) the batch is written entry
+        by entry, so one bad reading cannot hold back the others.
+        """
+        ids: List[str] = []
+        raw: List[Dict[str, str]] = []
+        batch: List[Dict[str, Any]] = []
+        trimmed: List[str] = []
+        for entry_id, fields in entries:
+            if not fields:
+                # Trimmed while pending; nothing left to write
+                trimmed.append(entry_id)
+                continue
+            try:
+                batch.append(json.loads(fields['r']))
+                raw.append(fields)
+                ids.append(entry_id)
+            except (KeyError, TypeError, ValueError):
+                self._dead_letter(entry_id, fields, 'malformed')
+        if trimmed:
+            self._count('failed', len(trimmed))
+            self.redis.xack(self.stream, self.group, *trimmed)
+        if not batch:
+            return
+        exhausted = max((deliveries or {}).get(entry_id, 1) for entry_id in ids) >= self.max_deliveries
+        if not exhausted:
+            if self._write(batch, count_failed=False):
+                self.redis.xack(self.stream, self.group, *ids)
+                self._count('acked', len(ids))
+            return
+        logger.warning("ingest: batch of %d entries retried %d times; writing them one by one",
+                       len(ids), self.max_deliveries)
+        for entry_id, fields, reading in zip(ids, raw, batch):
+            if self._write([reading], count_failed=False):
+                self.redis.xack(self.stream, self.group, entry_id)
+                self._count('acked')
+            else:
+                self._dead_letter(entry_id, fields, 'write failed')
+
+    def _delivery_counts(self, ids: List[str]) -> Dict[str, int]:
+        """Times each pending entry was delivered (XPENDING)."""
+        pipe = self.redis.pipeline(transaction=False)
+        for entry_id in ids:
+            pipe.xpending_range(self.stream, self.group, min=entry_id, max=entry_id, count=1)
+        return {info[0]['message_id']: int(info[0]['times_delivered'])
+                for info in pipe.execute() if info}
+
+    def _claim_stale(self) -> None:
+        resp = self.redis.xautoclaim(self.stream, self.group, self.consumer,
+                                     min_idle_time=self.claim_idle_ms,
+                                     start_id='0-0', count=self.batch_size)
+        entries = resp[1] if len(resp) > 1 else []
+        if entries:
+            self._count('claimed', len(entries))
+            logger.info("ingest: claimed %d stale entries from %s", len(entries), self.stream)
+            self._process(entries, self._delivery_counts([entry_id for entry_id, _ in entries]))
+
+    def _loop(self) -> None:
+        last_claim = 0.0
+        ready = False
+        while not self._stop_evt.is_set():
+            try:
+                if not ready:
+                    self._ensure_group()
+                    ready = True
+                if time.monotonic() - last_claim >= self.claim_idle_ms / 1000.0:
+                    last_claim = time.monotonic()
+                    self._claim_stale()
+                resp = self.redis.xreadgroup(self.group, self.consumer, {self.stream: '>'},
+                                             count=self.batch_size, block=1000)
+                for _stream, entries in resp or []:
+                    self._process(entries)
+            except redis.RedisError as e:
+                logger.warning("ingest: stream consumer error: %s", e)
+                ready = False
+                self._stop_evt.wait(2.0)
+
+    # --- Persisted-reading fan-out across processes ---
+
+    def _fan_out(self, saved: List[ESP32TemperatureHumidity], held_ts: Sequence[int] = ()) -> None:
+        super()._fan_out(saved, held_ts)
+        if not saved:
+            return
+        message = json.dumps({
+            'origin': self.consumer,
+            'readings': [dataclasses.asdict(rec) for rec in saved],
+            # Earlier compressed rows stored with the batch: their days changed too
+            'held_ts': list(held_ts),
+        })
+        try:
+            self.redis.publish(self.channel, message)
+            self._count('published', len(saved))
+        except redis.RedisError as e:
+            logger.warning("ingest: publishing %d saved readings failed: %s", len(saved), e)
+
+    def _apply_remote(self, data: str) -> None:
+        """Fan out a batch persisted by another consumer as if written here."""
+        message = json.loads(data)
+        if message.get('origin') == self.consumer:
+            return
+        saved = [ESP32TemperatureHumidity(**r) for r in message.get('readings') or []]
+        ts_list = [int(ts) for ts in message.get('held_ts') or []]
+        for rec in saved:
+            ts_ms = int(datetime.fromisoformat(rec.timestamp).timestamp() * 1000)
+            self.ctrl.remember_latest(rec, ts_ms)
+            ts_list.append(ts_ms)
+        # This process's day cache (memory LRU and ETags) may hold those days
+        self.ctrl.invalidate_past_days(ts_list)
+        self._count('received', len(saved))
+        IngestQueue._fan_out(self, saved)
+
+    def _listen(self) -> None:
+        while not self._stop_evt.is_set():
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(self.channel)
+                while not self._stop_evt.is_set():
+                    msg = pubsub.get_message(timeout=1.0)
+                    if msg and msg.get('type') == 'message':
+                        try:
+                            self._apply_remote(msg['data'])
+                        except (KeyError, TypeError, ValueError) as e:
+                            logger.warning("ingest: malformed saved-readings message: %s", e)
+            except redis.RedisError as e:
+                logger.warning("ingest: saved-readings subscription error: %s", e)
+                self._stop_evt.wait(2.0)
+            finally:
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+
+    def flush(self) -> None:
+        """Nothing buffered in-process; pending entries stay in the stream."""
+        return None
+
+    def start(self) -> None:
+        """Start the consumer (when ``consume`` is set) and, with ``listen``,
+        the listener for readings persisted elsewhere."""
+        if self.consume:
+            super().start()
+        if not self.listen:
+            return
+        if self._listener and self._listener.is_alive():
+            return
+        self._stop_evt.clear()
+        self._listener = threading.Thread(target=self._listen, name="IngestSavedListener", daemon=True)
+        self._listener.start()
+
+
+def main() -> None:
+    """Run a standalone consumer that writes to DB_PATH.
+
+    The controller is built from the same storage settings as the web app
+    (group commit, compression, day cache). Persisted readings are published
+    on the stream's channel; the web processes update their caches, views
+    and thermostat from it.
+    """
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"))
+
+    worker = RedisStreamIngest(
+        Controller.from_settings(load_storage_settings()),
+        redis_url=os.getenv("INGEST_REDIS_URL", "redis://localhost:6379"),
+        stream=os.getenv("INGEST_STREAM", "ingest:esp32"),
+        maxlen=int(os.getenv("INGEST_STREAM_MAXLEN", "100000") or 100000),
+        batch_size=int(os.getenv("INGEST_BATCH_SIZE", "200") or 200),
+        listen=False,
+    )
+    worker.start()
+    try:
+        while True:
+            time.sleep(60)
+            logger.info("ingest: %s", worker.stats())
+    except KeyboardInterrupt:
+        worker.stop(wait=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""MQTT ingestion of sensor readings (paho-mqtt subscriber)."""
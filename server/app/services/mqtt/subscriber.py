@@ -0,0 +1,167 @@
+"""MQTT subscriber feeding sensor readings into the ingest pipeline.
+
+Sensors publish to ``<prefix>/<location>/temphum`` (QoS 1) a JSON object
+``{ temperature_c, humidity_pct, ts?, ac_on? }`` or a list of them. Each
+message is validated with the same rules as the REST endpoint and handed to
+``submit`` (normally ``IngestQueue.submit``), so persistence, caches and
+fan-out are shared. The client uses a persistent session (fixed client id,
+``clean_session=False``): the broker keeps QoS 1 messages while the server
+is down.
+
+``handle_message`` has no network dependency, so it can be exercised
+directly; end to end, run a local broker (``mosquitto -v``) and publish with
+``mosquitto_pub -q 1 -t home/WC/temphum -m '{"temperature_c":21.5,"humidity_pct":40}'``.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import paho.mqtt.client as mqtt
+
+from ..ingest.readings import parse_reading
+
+logger = logging.getLogger(__name__)
+
+
+class MqttIngest:
+    """Subscribe to sensor topics and submit parsed readings.
+
+    :param submit: ``submit(reading) -> bool``; False counts as dropped
+    :param host: broker host
+    :param port: broker port
+    :param topic_prefix: first topic level (``home`` → ``home/+/temphum``)
+    :param client_id: stable id for the persistent session
+    :param username: optional broker username
+    :param password: optional broker password
+    :param tls: connect with TLS (system CA bundle)
+    :param ac_state: returns the live AC state for fresh readings, or None
+    """
+
+    def __init__(
+        self,
+        submit: Callable[[Dict[str, Any]], bool],
+        host: str = "localhost",
+        port: int = 1883,
+        topic_prefix: str = "home",
+        client_id: str = "server-ingest",
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        tls: bool = False,
+        ac_state: Optional[Callable[[], Optional[bool]]] = None,
+        keepalive: int = 30,
+    ) -> None:
+        self.submit = submit
+        self.host = host
+        self.port = int(port)
+        self.topic_prefix = topic_prefix.strip('/')
+        self.topic = f"{self.topic_prefix}/+/temphum"
+        self.ac_state = ac_state
+        self.keepalive = int(keepalive)
+        self._lock = threading.Lock()
+        self.metrics: Dict[str, Any] = {
+            'connected': False,
+            'messages': 0,
+            'accepted': 0,
+            'rejected': 0,
+            'dropped': 0,
+            'last_message_at': None,
+        }
+
+        self.client = mqtt.Client(
+            callback_api_version=mqtt.CallbackAPIVersion.VERSION2,
+            client_id=client_id,
+            clean_session=False,
+        )
+        if username:
+            self.client.username_pw_set(username, password)
+        if tls:
+            self.client.tls_set()
+        self.client.reconnect_delay_set(min_delay=1, max_delay=60)
+        self.client.on_connect = self._on_connect
+        self.client.on_disconnect = self._on_disconnect
+        self.client.on_message = self._on_message
+
+    # --- Message handling ---
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.metrics[name] += n
+
+    def handle_message(self, topic: str, payload: bytes) -> List[Dict[str, Any]]:
+        """Parse and submit one message; returns the readings that were accepted."""
+        self._count('messages')
+        self.metrics['last_message_at'] = time.time()
+        parts = topic.split('/')
+        if len(parts) != 3 or parts[0] != self.topic_prefix or parts[2] != 'temphum':
+            self._count('rejected')
+            return []
+        location = parts[1]
+        try:
+            body = json.loads(payload)
+        except (TypeError, ValueError):
+            logger.warning("mqtt: undecodable payload on %s", topic)
+            self._count('rejected')
+            return []
+
+        now_ms = int(time.time() * 1000)
+        live_ac = None
+        accepted = []
+        for item in body if isinstance(body, list) else [body]:
+            try:
+                reading = parse_reading(item, now_ms, location=location)
+            except (ValueError, TypeError) as e:
+                logger.warning("mqtt: rejected reading on %s: %s", topic, e)
+                self._count('rejected')
+                continue
+            # Fresh readings get the live AC state; older ones use the event log
+            if reading['ac_on'] is None and self.ac_state is not None and now_ms - reading['ts_ms'] < 2 * 60 * 1000:
+                if live_ac is None:
+                    live_ac = self.ac_state()
+                reading['ac_on'] = live_ac
+            if self.submit(reading):
+                accepted.append(reading)
+            else:
+                self._count('dropped')
+        self._count('accepted', len(accepted))
+        return accepted
+
+    def _on_message(self, client, userdata, msg) -> None:
+        try:
+            self.handle_message(msg.topic, msg.payload)
+        except Exception as e:
+            logger.exception("mqtt: message handling failed: %s", e)
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties) -> None:
+        if reason_code.is_failure:
+            logger.warning("mqtt: connect to %s:%s failed: %s", self.host, self.port, reason_code)
+            return
+        self.metrics['connected'] = True
+        # (Re)subscribe on every connect; harmless with a persistent session
+        client.subscribe(self.topic, qos=1)
+        logger.info("mqtt: connected to %s:%s, subscribed to %s", self.host, self.port, self.topic)
+
+    def _on_disconnect(self, client, userdata, flags, reason_code, properties) -> None:
+        self.metrics['connected'] = False
+        logger.warning("mqtt: disconnected (%s); reconnecting", reason_code)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.metrics, topic=self.topic, broker=f"{self.host}:{self.port}")
+
+    # --- Lifecycle ---
+
+    def start(self) -> None:
+        """Connect in the background; paho's network loop reconnects on its own."""
+        self.client.connect_async(self.host, self.port, keepalive=self.keepalive)
+        self.client.loop_start()
+
+    def stop(self) -> None:
+        try:
+            self.client.disconnect()
+        finally:
+            self.client.loop_stop()
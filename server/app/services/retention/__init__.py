@@ -0,0 +1,2 @@
+"""Database retention: scheduled, batched pruning of time-series tables."""
+
@@ -0,0 +1,203 @@
+"""Scheduled, incremental retention for time-series tables.
+
+Replaces the former AFTER INSERT cleanup triggers. Each policy prunes one
+table either by age or by row count, in small bounded batches so that the
+write lock is released between batches and sensor inserts never wait on a
+long DELETE.
+"""
+
+from __future__ import annotations
+
+import logging
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+import pytz
+
+from ...core.database import DatabaseManager, ROLLUP_TABLES
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RetentionPolicy:
+    """How long rows of one table are kept.
+
+    Set ``max_age`` to prune rows whose ``ts_column`` is older than that, and/or
+    ``max_rows`` to keep only the newest N rows (by ``rowid``).
+    ``ts_format`` tells how the timestamp is stored: ``'iso'`` for ISO-8601
+    text, ``'epoch_ms'`` for integer milliseconds since the epoch.
+    """
+    table: str
+    max_age: Optional[timedelta] = None
+    max_rows: Optional[int] = None
+    ts_column: str = 'timestamp'
+    ts_format: str = 'iso'
+
+
+DEFAULT_POLICIES: List[RetentionPolicy] = [
+    RetentionPolicy('esp32_temphum', max_age=timedelta(days=7),
+                    ts_column='ts', ts_format='epoch_ms'),
+    RetentionPolicy('temphum', max_age=timedelta(days=7)),
+    RetentionPolicy('ac_events', max_age=timedelta(days=30)),
+    RetentionPolicy('images', max_rows=10),
+    # Rollups outlive raw readings; daily buckets are kept indefinitely
+    RetentionPolicy(ROLLUP_TABLES[60], max_age=timedelta(days=30),
+                    ts_column='bucket_ts', ts_format='epoch_ms'),
+    RetentionPolicy(ROLLUP_TABLES[900], max_age=timedelta(days=365),
+                    ts_column='bucket_ts', ts_format='epoch_ms'),
+    RetentionPolicy(ROLLUP_TABLES[3600], max_age=timedelta(days=3 * 365),
+                    ts_column='bucket_ts', ts_format='epoch_ms'),
+]
+
+
+class RetentionEngine:
+    """Apply retention policies on a schedule in a background thread.
+
+    :param db: shared DatabaseManager
+    :param policies: per-table policies (defaults to DEFAULT_POLICIES)
+    :param interval_s: seconds between runs
+    :param batch_size: rows deleted per statement
+    :param max_batches: cap on batches per table per run (bounds one run's work)
+    :param vacuum_pages: if > 0, run ``PRAGMA incremental_vacuum(N)`` after a
+        run that deleted rows (needs ``auto_vacuum=INCREMENTAL``)
+    :param on_pruned: called as ``on_pruned(policy, cutoff)`` after an
+        age-based policy deleted rows older than ``cutoff`` (local datetime)
+    """
+
+    def __init__(
+        self,
+        db: DatabaseManager,
+        policies: Optional[List[RetentionPolicy]] = None,
+        interval_s: float = 600.0,
+        batch_size: int = 500,
+        max_batches: int = 20,
+        pause_s: float = 0.05,
+        vacuum_pages: int = 0,
+        on_pruned: Optional[Callable[[RetentionPolicy, datetime], None]] = None,
+    ) -> None:
+        self.db = db
+        self.policies = list(DEFAULT_POLICIES if policies is None else policies)
+        self.interval_s = float(interval_s)
+        self.batch_size = max(1, int(batch_size))
+        self.max_batches = max(1, int(max_batches))
+        self.pause_s = max(0.0, float(pause_s))
+        self.vacuum_pages = max(0, int(vacuum_pages))
+        self.on_pruned = on_pruned
+        self.tz = pytz.timezone('Europe/Helsinki')
+        self.last_report: Dict[str, int] = {}
+        self.last_run_at: Optional[str] = None
+        self._stop_evt = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    # --- Single run ---
+
+    def run_once(self) -> Dict[str, int]:
+        """Apply every policy once. Returns rows deleted per table."""
+        report: Dict[str, int] = {}
+        for policy in self.policies:
+            try:
+                deleted = self._apply(policy)
+            except sqlite3.OperationalError as e:
+                # e.g. table not present in this database
+                logger.debug("retention: skipped %s: %s", policy.table, e)
+                continue
+            except Exception as e:
+                logger.exception("retention: policy for %s failed: %s", policy.table, e)
+                continue
+            report[policy.table] = deleted
+
+        total = sum(report.values())
+        if total and self.vacuum_pages:
+            self._incremental_vacuum()
+        if total:
+            logger.info("retention: removed %d rows %s", total,
+                        {k: v for k, v in report.items() if v})
+        self.last_report = report
+        self.last_run_at = datetime.now(self.tz).isoformat()
+        return report
+
+    def _apply(self, policy: RetentionPolicy) -> int:
+        deleted = 0
+        if policy.max_age is not None:
+            cutoff = datetime.now(self.tz) - policy.max_age
+            n = self._delete_batched(
+                policy,
+                f"SELECT rowid FROM {policy.table} WHERE {policy.ts_column} < ? LIMIT ?",
+                (self._cutoff(policy, cutoff),),
+            )
+            deleted += n
+            if n and self.on_pruned is not None:
+                try:
+                    self.on_pruned(policy, cutoff)
+                except Exception as e:
+                    logger.debug("retention: on_pruned hook failed: %s", e)
+        if policy.max_rows is not None:
+            row = self.db.fetchone(
+                f"SELECT rowid FROM {policy.table} ORDER BY rowid DESC LIMIT 1 OFFSET ?",
+                (int(policy.max_rows),),
+            )
+            if row is not None:
+                deleted += self._delete_batched(
+                    policy,
+                    f"SELECT rowid FROM {policy.table} WHERE rowid <= ? LIMIT ?",
+                    (row[0],),
+                )
+        return deleted
+
+    def _delete_batched(self, policy: RetentionPolicy, select_ids: str, params: tuple) -> int:
+        deleted = 0
+        for _ in range(self.max_batches):
+            cur = self.db.execute_query(
+                f"DELETE FROM {policy.table} WHERE rowid IN ({select_ids})",
+                params + (self.batch_size,),
+            )
+            n = max(0, cur.rowcount)
+            deleted += n
+            if n < self.batch_size:
+                break
+            # Let queued writers take the lock between batches
+            time.sleep(self.pause_s)
+        return deleted
+
+    def _cutoff(self, policy: RetentionPolicy, cutoff: datetime):
+        if policy.ts_format == 'epoch_ms':
+            return int(cutoff.timestamp() * 1000)
+        return cutoff.isoformat()
+
+    def _incremental_vacuum(self) -> None:
+        try:
+            if not self.db.incremental_vacuum(self.vacuum_pages):
+                logger.debug("retention: auto_vacuum is not INCREMENTAL; skipping vacuum")
+        except Exception as e:
+            logger.debug("retention: incremental_vacuum failed: %s", e)
+
+    # --- Scheduling ---
+
+    def _loop(self) -> None:
+        # First run right away so a restart after downtime catches up
+        while not self._stop_evt.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.exception("retention: run failed: %s", e)
+            if self._stop_evt.wait(self.interval_s):
+                break
+
+    def start(self) -> None:
+        """Start the background retention thread (idempotent)."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_evt.clear()
+        self._thread = threading.Thread(target=self._loop, name="RetentionEngine", daemon=True)
+        self._thread.start()
+
+    def stop(self, wait: bool = False) -> None:
+        """Stop the background retention thread."""
+        self._stop_evt.set()
+        if wait and self._thread:
+            self._thread.join()
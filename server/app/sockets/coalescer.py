@@ -0,0 +1,129 @@
+"""Coalescing, rate-limited broadcast of telemetry to browser views.
+
+Producers ``publish`` an event for a room under a key (e.g. the sensor
+location); until the room's next flush only the latest payload per
+(event, key) is kept, or, with ``merge``, field updates are folded into one
+dict. A flusher emits whatever is pending once per room interval, so a view
+receives at most one message per (event, key) per interval no matter how
+often sensors and the printer report.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class BroadcastCoalescer:
+    """Keep the latest value per (event, key) and flush per room at a fixed rate.
+
+    :param emit: ``emit(event, payload, to)``; ``to`` is a room or list of rooms
+    :param interval_s: default seconds between flushes of a room (0 = emit at once)
+    :param room_intervals: per-room overrides; ``'loc:*'`` covers every ``loc:`` room
+    """
+
+    def __init__(
+        self,
+        emit: Callable[[str, Any, Any], None],
+        interval_s: float = 1.0,
+        room_intervals: Optional[Dict[str, float]] = None,
+    ) -> None:
+        self.emit = emit
+        self.interval_s = max(0.0, float(interval_s))
+        self.room_intervals = {k: max(0.0, float(v)) for k, v in (room_intervals or {}).items()}
+        # room -> (event, key) -> (to, payload), in publish order
+        self._pending: Dict[str, "OrderedDict[Tuple[str, Any], Tuple[Any, Any]]"] = {}
+        self._last_flush: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._stop_evt = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._metrics = {'published': 0, 'emitted': 0}
+
+    def interval_for(self, room: str) -> float:
+        if room in self.room_intervals:
+            return self.room_intervals[room]
+        prefix = room.split(':', 1)[0] + ':*'
+        return self.room_intervals.get(prefix, self.interval_s)
+
+    def publish(self, event: str, key: Any, payload: Any, to: Any, merge: bool = False) -> None:
+        """Queue ``payload`` for the next flush of ``to``, replacing (or merging into) the pending one."""
+        room = to if isinstance(to, str) else to[0]
+        with self._lock:
+            self._metrics['published'] += 1
+            if self.interval_for(room) <= 0:
+                immediate = True
+            else:
+                immediate = False
+                pending = self._pending.setdefault(room, OrderedDict())
+                prev = pending.get((event, key))
+                if merge and prev is not None and isinstance(prev[1], dict) and isinstance(payload, dict):
+                    payload = {**prev[1], **payload}
+                pending[(event, key)] = (to, payload)
+        if immediate:
+            self._send(event, payload, to)
+
+    def _send(self, event: str, payload: Any, to: Any) -> None:
+        try:
+            self.emit(event, payload, to)
+        except Exception as e:
+            logger.debug("coalescer: emit of %s to %s failed: %s", event, to, e)
+            return
+        with self._lock:
+            self._metrics['emitted'] += 1
+
+    def flush(self, force: bool = False) -> None:
+        """Emit pending payloads of every room that is due (all rooms with ``force``)."""
+        now = time.monotonic()
+        batches = []
+        with self._lock:
+            for room, pending in self._pending.items():
+                if not pending:
+                    continue
+                if not force and now - self._last_flush.get(room, 0.0) < self.interval_for(room):
+                    continue
+                self._last_flush[room] = now
+                batches.append(list(pending.items()))
+                pending.clear()
+        for items in batches:
+            for (event, _key), (to, payload) in items:
+                self._send(event, payload, to)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._metrics)
+            out['pending'] = sum(len(p) for p in self._pending.values())
+        out['coalesced'] = out['published'] - out['emitted'] - out['pending']
+        return out
+
+    # --- Lifecycle ---
+
+    def _tick_s(self) -> float:
+        intervals = [v for v in [self.interval_s, *self.room_intervals.values()] if v > 0]
+        return max(0.05, min(intervals) / 4) if intervals else 0.25
+
+    def _loop(self) -> None:
+        tick = self._tick_s()
+        while not self._stop_evt.wait(tick):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.exception("coalescer: flush failed: %s", e)
+        self.flush(force=True)
+
+    def start(self) -> None:
+        """Start the flusher (a greenlet under eventlet; idempotent)."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_evt.clear()
+        self._thread = threading.Thread(target=self._loop, name="BroadcastCoalescer", daemon=True)
+        self._thread.start()
+
+    def stop(self, wait: bool = False) -> None:
+        self._stop_evt.set()
+        if wait and self._thread:
+            self._thread.join()
@@ -1,11 +1,43 @@
 import logging
+import time
 from flask import request, flash, current_app
-from flask_socketio import SocketIO
+from flask_socketio import SocketIO, join_room, leave_room
 from typing import Set, Any
 from flask_login import current_user
 
 from ..core.controller import Controller
+from ..core.state import StateStore
+from .replay import ReplayLog
 from ..services.ac.thermostat import ACThermostat
+from ..services.ingest.readings import live_max_age_s, live_readings
+
+# Room every connection of a role joins on connect
+VIEWS_ROOM = 'views'
+CLIENTS_ROOM = 'clients'
+ESP32_ROOM = 'esp32'
+# Topic rooms views subscribe to; sensor readings go to 'loc:<location>'
+# and 'loc:*' (views that show every location)
+THERMOSTAT_ROOM = 'thermostat'
+PRINTER_ROOM = 'printer'
+ALL_LOCATIONS_ROOM = 'loc:*'
+EVENT_TOPICS = {
+    'ac_status': THERMOSTAT_ROOM,
+    'ac_state': THERMOSTAT_ROOM,
+    'ac_command': THERMOSTAT_ROOM,
+    'thermostat_status': THERMOSTAT_ROOM,
+    'sleep_status': THERMOSTAT_ROOM,
+    'thermo_config': THERMOSTAT_ROOM,
+    'status': PRINTER_ROOM,
+    'image': PRINTER_ROOM,
+}
+MAX_SUBSCRIPTIONS = 32
+# Telemetry sent through the coalescer (latest value per key and interval);
+# printer status is sent as field deltas merged between flushes
+COALESCED_EVENTS = frozenset({'esp32_temphum', 'status', 'image'})
+
+
+def location_room(location: str) -> str:
+    return f'loc:{location}'
 
 
 class SocketEventHandler:
@@ -23,10 +55,19 @@ class SocketEventHandler:
         self.socketio = socketio
         self.ctrl = ctrl
         self.logger = logging.getLogger(__name__)
-        # Track currently connected sids by role
+        # Currently connected sids by role (bookkeeping; emits go to rooms)
         self.view_sids: Set[str] = set()
         self.client_sids: Set[str] = set()
         self.esp32_sids: Set[str] = set()
+        # Async ingest queue (set by services.bootstrap); None = write inline
+        self.ingest = None
+        # Broadcast coalescer (set by services.bootstrap); None = emit at once
+        self.coalescer = None
+        # Live state for snapshots (AC, thermostat, sleep, config, printer,
+        # latest readings); updated by every emit_to_views
+        self.state = StateStore(ctrl.get_latest_readings)
+        # Seq numbers + per-topic history for replay after reconnects
+        self.replay = ReplayLog()
         self._initialized = True
         socketio.on_event('connect',    self.handle_connect)
         socketio.on_event('disconnect', self.handle_disconnect)
@@ -35,6 +76,8 @@ class SocketEventHandler:
         socketio.on_event('status',     self.handle_status)
         socketio.on_event('printerAction', self.handle_printer_action)
         socketio.on_event('ac_control',   self.handle_ac_control)
+        socketio.on_event('subscribe',    self.handle_subscribe)
+        socketio.on_event('unsubscribe',  self.handle_unsubscribe)
 
     def handle_connect(self, auth):
         # Use Flask-Login session cookie for auth instead of API key
@@ -62,12 +105,17 @@ class SocketEventHandler:
         if sid:
             if role_l == 'view' or is_view:
                 self.view_sids.add(sid)
+                join_room(VIEWS_ROOM)
+                # Everything the page shows, from memory, to this view only
+                self.socketio.emit('snapshot', self._snapshot(), to=sid)
                 self.logger.info("View connected: %s (tracked)", sid)
             elif role_l in {'client', 'raspi', 'pi', 'printer', 'timelapse'}:
                 self.client_sids.add(sid)
+                join_room(CLIENTS_ROOM)
                 self.logger.info("Client connected: %s (tracked)", sid)
             elif role_l == 'esp32':
                 self.esp32_sids.add(sid)
+                join_room(ESP32_ROOM)
                 self.logger.info("ESP32 server connected: %s (tracked)", sid)
             else:
                 self.logger.info("Client connected (unclassified): %s", sid)
@@ -93,34 +141,89 @@ class SocketEventHandler:
         if not removed:
             self.logger.info("Client disconnected: %s", sid)
 
-    def emit_to_views(self, event: str, payload: Any = None) -> None:
-        """Emit event only to currently connected browser views (by sid)."""
-        # Iterate over a copy to avoid mutation during iteration
-        for sid in list(self.view_sids):
-            try:
+    def _snapshot(self) -> dict:
+        # seq lets a fresh view ask for replay from this point after a drop
+        return {**self.state.snapshot(), 'seq': self.replay.seq}
+
+    def handle_subscribe(self, data):
+        """Join topic rooms: ``{ topics: ['loc:WC', 'thermostat', ...], since?: seq }`` (views only).
+
+        With ``since`` the events of those topics broadcast after that
+        sequence number are replayed to this view; ``complete`` in the ack is
+        False when some were already dropped from the buffer.
+        """
+        sid = request.sid  # type: ignore
+        if sid not in self.view_sids:
+            return {'ok': False, 'error': 'not_a_view'}
+        topics = data.get('topics') if isinstance(data, dict) else None
+        if not isinstance(topics, list) or len(topics) > MAX_SUBSCRIPTIONS:
+            return {'ok': False, 'error': 'invalid_topics'}
+        joined = []
+        for topic in topics:
+            if not isinstance(topic, str):
+                continue
+            if topic in (THERMOSTAT_ROOM, PRINTER_ROOM) or (topic.startswith('loc:') and 4 < len(topic) <= 64):
+                join_room(topic)
+                joined.append(topic)
+        self.logger.debug("View %s subscribed to %s", sid, joined)
+        ack = {'ok': True, 'topics': joined}
+        since = data.get('since')
+        if isinstance(since, int) and not isinstance(since, bool):
+            events, complete = self.replay.since(since, joined)
+            for event, payload in events:
                 self.socketio.emit(event, payload, to=sid)
-            except Exception:
-                # If emit fails (e.g., stale sid), drop it
-                self.view_sids.discard(sid)
-                self.logger.debug("Removed stale view sid: %s", sid)
+            ack.update({'replayed': len(events), 'complete': complete})
+        return ack
+
+    def handle_unsubscribe(self, data):
+        """Leave topic rooms joined with ``subscribe``."""
+        topics = data.get('topics') if isinstance(data, dict) else None
+        if not isinstance(topics, list):
+            return {'ok': False, 'error': 'invalid_topics'}
+        for topic in topics:
+            if isinstance(topic, str) and topic not in (VIEWS_ROOM, CLIENTS_ROOM, ESP32_ROOM):
+                leave_room(topic)
+        return {'ok': True}
+
+    def broadcast(self, event: str, payload: Any, to: Any) -> None:
+        """Emit to rooms, stamping telemetry with a replayable ``seq``."""
+        self.socketio.emit(event, self.replay.stamp(event, payload, to), to=to)
+
+    def emit_to_views(self, event: str, payload: Any = None) -> None:
+        """Emit event to the browser views interested in it (one room emit).
+
+        Sensor readings go to the views subscribed to their location, AC and
+        printer events to the ``thermostat`` / ``printer`` topic rooms, and
+        everything else (flash messages, ...) to every view.
+        """
+        self.state.apply(event, payload)
+        key = None
+        if event == 'esp32_temphum' and isinstance(payload, dict) and payload.get('location'):
+            key = payload['location']
+            to: Any = [location_room(key), ALL_LOCATIONS_ROOM]
+        else:
+            to = EVENT_TOPICS.get(event, VIEWS_ROOM)
+        if self.coalescer is not None and event in COALESCED_EVENTS:
+            self.coalescer.publish(event, key, payload, to, merge=(event == 'status'))
+            return
+        try:
+            self.broadcast(event, payload, to)
+        except Exception as e:
+            self.logger.debug("Emit of %s to %s failed: %s", event, to, e)
 
     def emit_to_clients(self, event: str, payload: Any = None) -> None:
         """Emit event only to timelapse/pi clients (not views or esp32)."""
-        for sid in list(self.client_sids):
-            try:
-                self.socketio.emit(event, payload, to=sid)
-            except Exception:
-                self.client_sids.discard(sid)
-                self.logger.debug("Removed stale client sid: %s", sid)
+        try:
+            self.socketio.emit(event, payload, to=CLIENTS_ROOM)
+        except Exception as e:
+            self.logger.debug("Emit of %s to clients failed: %s", event, e)
 
     def emit_to_esp32(self, event: str, payload: Any = None) -> None:
         """Emit event only to esp32_server connections."""
-        for sid in list(self.esp32_sids):
-            try:
-                self.socketio.emit(event, payload, to=sid)
-            except Exception:
-                self.esp32_sids.discard(sid)
-                self.logger.debug("Removed stale esp32 sid: %s", sid)
+        try:
+            self.socketio.emit(event, payload, to=ESP32_ROOM)
+        except Exception as e:
+            self.logger.debug("Emit of %s to esp32 failed: %s", event, e)
 
     def flash(self, message, category):
         """Emit a flash message to the client."""
@@ -140,9 +243,10 @@ class SocketEventHandler:
             self.logger.warning("Bad esp32 temphum payload: %s", data)
             return
         # Derive current AC state if available
+        ac_thermo: ACThermostat | None = None
         try:
             from flask import current_app
-            ac_thermo: ACThermostat | None = getattr(
+            ac_thermo = getattr(
                 current_app, 'ac_thermostat', None)  # type: ignore
             ac_on_val: bool | None = bool(
                 ac_thermo.is_on) if ac_thermo is not None else None
@@ -154,14 +258,36 @@ class SocketEventHandler:
         except Exception:
             ac_on_val = None
 
+        if self.ingest is not None:
+            # Persist + broadcast happen on the ingest writer
+            try:
+                reading = {
+                    'location': location,
+                    'temperature': float(temp),
+                    'humidity': float(hum),
+                    'ts_ms': int(time.time() * 1000),
+                    'ac_on': ac_on_val,
+                }
+            except (TypeError, ValueError):
+                self.logger.warning("Bad esp32 temphum payload: %s", data)
+                return
+            if not self.ingest.submit(reading):
+                self.logger.warning("Ingest queue full; dropped socket reading for %s", location)
+            return
+
         saved = self.ctrl.record_esp32_temphum(
             location, temp, hum, ac_on=ac_on_val)
-        self.emit_to_views('esp32_temphum', {
-            'location': saved.location,
-            'temperature': saved.temperature,
-            'humidity':    saved.humidity,
-            'ac_on':       saved.ac_on
-        })
+        # Same as the REST sync path: newest live reading to views, and the
+        # thermostat checks a fresh reading on its own loop
+        for rec in live_readings(self.ctrl, [saved], live_max_age_s(ac_thermo)):
+            self.emit_to_views('esp32_temphum', {
+                'location': rec.location,
+                'temperature': rec.temperature,
+                'humidity':    rec.humidity,
+                'ac_on':       rec.ac_on
+            })
+            if ac_thermo is not None:
+                ac_thermo.on_reading(rec.location)
 
         self.logger.debug("Broadcasted esp32 temphum: %s", data)
 
@@ -171,6 +297,13 @@ class SocketEventHandler:
             self.logger.warning("Bad status payload: %s", data)
             return
         # saved = self.ctrl.update_status(data)
+        if isinstance(data, dict):
+            # Views keep the fields they have; send only what changed
+            known = self.state.get('printer')
+            delta = {k: v for k, v in data.items() if k not in known or known[k] != v}
+            if not delta:
+                return
+            data = delta
         self.emit_to_views('status', data)
         self.logger.debug("Broadcasted status: %s", data)
 
@@ -367,44 +500,8 @@ class SocketEventHandler:
                 ac_thermo.set_control_locations(list(locs))
                 return
             if action == 'status':
-                # Re-emit current statuses to requester(s)
-                self.emit_to_views(
-                    'ac_status', {'is_on': bool(ac_thermo.is_on)})
-                self.emit_to_views('thermostat_status', {
-                    'enabled': getattr(ac_thermo, '_enabled', True),
-                    'thermo_active': getattr(ac_thermo, '_enabled', True),
-                })
-                # Also emit current mode/fan
-                try:
-                    st = ac_thermo.ac.get_status()
-                    mode = st.get('mode') if isinstance(st, dict) else None
-                    fan = st.get('fan_speed_enum') if isinstance(
-                        st, dict) else None
-                except Exception:
-                    mode = None
-                    fan = None
-                self.emit_to_views(
-                    'ac_state', {'mode': mode, 'fan_speed': fan})
-                # Emit current sleep configuration as well
-                payload = {
-                    'sleep_enabled': bool(getattr(ac_thermo.cfg, 'sleep_active', True)),
-                    'sleep_start': getattr(ac_thermo.cfg, 'sleep_start', None),
-                    'sleep_stop': getattr(ac_thermo.cfg, 'sleep_stop', None),
-                    'sleep_time_active': bool(ac_thermo._is_sleep_time_window_now),
-                }
-                try:
-                    payload['sleep_schedule'] = getattr(
-                        ac_thermo.cfg, 'sleep_weekly', None)
-                except Exception:
-                    pass
-                self.emit_to_views('sleep_status', payload)
-                # Emit thermostat configuration
-                self.emit_to_views('thermo_config', {
-                    'setpoint_c': float(getattr(ac_thermo.cfg, 'target_temp', 0.0)),
-                    'pos_hysteresis': float(getattr(ac_thermo.cfg, 'pos_hysteresis', 0.0)),
-                    'neg_hysteresis': float(getattr(ac_thermo.cfg, 'neg_hysteresis', 0.0)),
-                    'control_locations': getattr(ac_thermo.cfg, 'control_locations', None),
-                })
+                # Current state from memory, to the requester only
+                self.socketio.emit('snapshot', self._snapshot(), to=request.sid)  # type: ignore
                 return
             if action == 'set_sleep_enabled':
                 en = bool(data.get('value'))
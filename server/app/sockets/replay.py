@@ -0,0 +1,81 @@
+"""Sequence numbers and per-topic ring buffers for view broadcasts.
+
+Every telemetry payload sent to views is stamped with a ``seq`` from one
+monotonically increasing counter and kept in a bounded buffer of its topic
+(``loc:<location>``, ``thermostat``, ``printer``). A view that reconnects
+sends the last ``seq`` it saw and is replayed only the events it missed.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Tuple
+
+REPLAY_TOPICS = frozenset({'thermostat', 'printer'})
+
+
+class ReplayLog:
+    """Stamp payloads with ``seq`` and keep the newest ``size`` per topic.
+
+    :param size: events kept per topic
+    """
+
+    def __init__(self, size: int = 256) -> None:
+        self.size = max(1, int(size))
+        self._seq = 0
+        self._buffers: Dict[str, Deque[Tuple[int, str, Any]]] = {}
+        # Highest seq evicted per topic; a replay from before it has a gap
+        self._evicted: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def seq(self) -> int:
+        return self._seq
+
+    @staticmethod
+    def topic_of(to: Any) -> str | None:
+        room = to if isinstance(to, str) else (to[0] if to else None)
+        if room is None:
+            return None
+        if room in REPLAY_TOPICS or (room.startswith('loc:') and room != 'loc:*'):
+            return room
+        return None
+
+    def stamp(self, event: str, payload: Any, to: Any) -> Any:
+        """Return ``payload`` with a new ``seq``, buffered under its topic.
+
+        Non-dict payloads and rooms that are not replayable pass unchanged.
+        """
+        topic = self.topic_of(to)
+        if topic is None or not isinstance(payload, dict):
+            return payload
+        with self._lock:
+            self._seq += 1
+            stamped = {**payload, 'seq': self._seq}
+            buf = self._buffers.get(topic)
+            if buf is None:
+                buf = self._buffers[topic] = deque(maxlen=self.size)
+            if len(buf) == buf.maxlen:
+                self._evicted[topic] = buf[0][0]
+            buf.append((self._seq, event, stamped))
+        return stamped
+
+    def since(self, seq: int, topics: Iterable[str]) -> Tuple[List[Tuple[str, Any]], bool]:
+        """Events of ``topics`` newer than ``seq`` in order, and whether none were lost.
+
+        ``'loc:*'`` stands for every location topic.
+        """
+        wanted = set(topics)
+        events: List[Tuple[int, str, Any]] = []
+        with self._lock:
+            # A cursor from the future means the server restarted
+            complete = seq <= self._seq
+            for topic, buf in self._buffers.items():
+                if topic not in wanted and not ('loc:*' in wanted and topic.startswith('loc:')):
+                    continue
+                if self._evicted.get(topic, 0) > seq:
+                    complete = False
+                events.extend(e for e in buf if e[0] > seq)
+        events.sort(key=lambda e: e[0])
+        return [(event, payload) for _, event, payload in events], complete
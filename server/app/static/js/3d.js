@@ -28,6 +28,8 @@ document.addEventListener('DOMContentLoaded', () => {
       if (lag > 3) video.currentTime = hls.liveSyncPosition;
     });
 
+    window.sioSubscribe(['printer']);
+
     socket.on('image', data => {
       fetch('/api/previewJpg')
         .then(response => response.blob())
@@ -79,7 +81,7 @@ document.addEventListener('DOMContentLoaded', () => {
       return `${h}:${m}`;
     }
 
-    socket.on('status', data => {
+    const onStatus = data => {
       console.log('ℹ️ Received status2v event:', data);
 
       if ('bed_temperature'    in data) bedTempEl.textContent    = data.bed_temperature.toFixed(1) + ' °C';
@@ -128,7 +130,12 @@ document.addEventListener('DOMContentLoaded', () => {
           ? '<button class="control-btn-status start-btn">Active</button>'
           : '<button class="control-btn-status stop-btn">Inactive</button>';
       }
-    });
+    };
+    socket.on('status', onStatus);
+    // Full printer status from the connect snapshot (may predate this script)
+    const onSnapshot = snap => { if (snap && snap.printer) onStatus(snap.printer); };
+    if (window.sioSnapshot) onSnapshot(window.sioSnapshot);
+    socket.on('snapshot', onSnapshot);
 
     socket.on('temphum2v', data => {
       console.log('🌡️ Received temphum2v event, data:', data);
@@ -26,6 +26,12 @@
   // Averaging window in minutes. Set to 0 or 1 for raw values.
   const DEFAULT_AVG_MINUTES = 0; // change default to 10 if you always want 10‑min bins
   let averagingMinutes = Number(window?.CHART_AVG_MINUTES ?? DEFAULT_AVG_MINUTES) || 0;
+  // Rows on screen and the server cursor (epoch ms of the newest row) for deltas
+  let currentRows      = [];
+  let currentCursor    = null;
+  let currentParams    = null;
+  let lastDeltaAt      = 0;
+  const DELTA_MIN_INTERVAL_MS = 30 * 1000;
 
   // — Utils —
   function formatDateISO(d) {
@@ -98,13 +104,64 @@
     titleTempEl.textContent = 'Lämpötila';
     titleHumEl.textContent  = 'Kosteus';
 
-    const url = `/api/esp32_temphum?date=${encodeURIComponent(dateStr)}&location=${encodeURIComponent(location)}`;
+    // Server buckets (averaging window) or LTTB-decimates to roughly one point per pixel
+    const params = new URLSearchParams({ start: dateStr, end: dateStr, locations: location });
+    if (averagingMinutes > 1) params.set('bucket', String(averagingMinutes * 60));
+    else params.set('points', String(Math.max(100, ctxTemp.canvas.clientWidth || 600)));
+    const url = `/api/esp32_temphum/range?${params}`;
+    currentParams = params;
+    currentCursor = null;
 
     fetch(url, { method: 'GET', headers: { 'Accept': 'application/json' } })
       .then(r => r.json())
       .then(data => {
-        // Expected shape: [{ temperature:Number, humidity:Number, timestamp:ISO }, ...]
-        const { labels, temps, hums } = aggregateByMinutes(data, averagingMinutes);
+        // Expected shape: { cursor, series: [{ location, points: [{ temperature, humidity, timestamp:ISO }, ...] }] }
+        currentRows = (data.series && data.series[0] && data.series[0].points) || [];
+        currentCursor = data.cursor ?? null;
+        renderRows(currentRows);
+      })
+      .catch(err => {
+        console.error('❗ Error fetching/rendering data:', err);
+        avgTempEl.textContent = 'Lämpötila: –';
+        avgHumEl.textContent  = 'Kosteus: –';
+      });
+  }
+
+  // — Append what is new since the cursor (today's chart, while open) —
+  function fetchDelta() {
+    if (!currentParams || currentCursor == null || modal.style.display !== 'flex') return;
+    if (formatDateISO(currentDate) !== formatDateISO(new Date())) return;
+    const since = currentCursor;
+    const params = new URLSearchParams(currentParams);
+    params.set('since', String(since));
+    fetch(`/api/esp32_temphum/range?${params}`, { headers: { 'Accept': 'application/json' } })
+      .then(r => r.json())
+      .then(data => {
+        const fresh = (data.series && data.series[0] && data.series[0].points) || [];
+        if (!fresh.length || currentCursor !== since) return;
+        // The row at the cursor may have been a still-filling bucket: replace it
+        currentRows = currentRows.filter(r => Date.parse(r.timestamp) < since).concat(fresh);
+        currentCursor = data.cursor ?? currentCursor;
+        renderRows(currentRows);
+      })
+      .catch(err => console.warn('Chart delta fetch failed:', err));
+  }
+
+  // Live readings of the shown location trigger a delta fetch (throttled);
+  // the shared socket is created by init_sio.js, which loads after this file
+  document.addEventListener('DOMContentLoaded', () => {
+    if (!window.socket) return;
+    window.socket.on('esp32_temphum', data => {
+      if (!data || data.location !== currentLocation) return;
+      const now = Date.now();
+      if (now - lastDeltaAt < DELTA_MIN_INTERVAL_MS) return;
+      lastDeltaAt = now;
+      fetchDelta();
+    });
+  });
+
+  function renderRows(rows) {
+        const { labels, temps, hums } = aggregateByMinutes(rows, 0);
 
         // Overall daily averages (raw from returned series after aggregation)
         const finiteT = temps.filter(Number.isFinite);
@@ -199,12 +256,6 @@
         // Make sure both charts size correctly after becoming visible
         chartTemp.resize();
         chartHum.resize();
-      })
-      .catch(err => {
-        console.error('❗ Error fetching/rendering data:', err);
-        avgTempEl.textContent = 'Lämpötila: –';
-        avgHumEl.textContent  = 'Kosteus: –';
-      });
   }
 
   function openAndRender(location) {
@@ -14,10 +14,45 @@ window.socket.on('connect_error', err => {
     console.error('Connection error:', err);
 });
 
+// Topic rooms this page wants ('loc:<location>', 'thermostat', 'printer');
+// rooms are per connection, so they are re-joined after every reconnect
+window.sioTopics = new Set();
+window.sioSubscribe = topics => {
+    const fresh = topics.filter(t => !window.sioTopics.has(t));
+    fresh.forEach(t => window.sioTopics.add(t));
+    if (fresh.length && window.socket.connected) {
+        window.socket.emit('subscribe', { topics: fresh });
+    }
+};
+
+// Highest broadcast sequence number seen; after a reconnect the server
+// replays what this page missed while it was offline
+window.sioLastSeq = null;
+window.socket.onAny((event, data) => {
+    if (!data || !Number.isInteger(data.seq)) return;
+    // A reconnect snapshot may arrive before 'connect' sends the cursor;
+    // it only seeds the cursor of a fresh page
+    if (event === 'snapshot' && window.sioLastSeq !== null) return;
+    if (data.seq > (window.sioLastSeq ?? -1)) window.sioLastSeq = data.seq;
+});
+
 window.socket.on('connect', () => {
     console.log('✅ Yhdistetty palvelimeen');
+    if (window.sioTopics.size) {
+        const msg = { topics: Array.from(window.sioTopics) };
+        if (window.sioLastSeq !== null) msg.since = window.sioLastSeq;
+        window.socket.emit('subscribe', msg, ack => {
+            if (ack && ack.replayed) console.log(`🔁 Replayed ${ack.replayed} missed events`);
+        });
+    }
 })
 
+// Consolidated state pushed on connect; kept for page scripts that attach later
+window.sioSnapshot = null;
+window.socket.on('snapshot', snap => {
+    window.sioSnapshot = snap;
+});
+
 window.socket.on('server_shutdown', () => {
     console.log('🔒 Server is shutting down...');
     window.socket && window.socket.disconnect();
@@ -183,6 +183,26 @@ function updateTile(data){
 }
 
 function initSIO(){
+  // Only the displayed locations (all of them when none are known yet)
+  const names = state.items.map(it => it.name).filter(Boolean);
+  window.sioSubscribe(['thermostat', ...(names.length ? names.map(n => 'loc:' + n) : ['loc:*'])]);
+  const applySnapshot = snap => {
+    if (!snap) return;
+    (snap.readings || []).forEach(updateTile);
+    if (snap.ac){
+      updateACIndicator(snap.ac.is_on);
+      if (snap.ac.mode) setModeUI(snap.ac.mode);
+      if (snap.ac.fan_speed) setFanUI(snap.ac.fan_speed);
+    }
+    if (snap.thermostat){
+      updateThermoIndicator('thermo_active' in snap.thermostat
+        ? !!snap.thermostat.thermo_active : !!snap.thermostat.enabled);
+    }
+    if (snap.sleep) setSleepUI(snap.sleep);
+    if (snap.config) setThermoConfigUI(snap.config);
+  };
+  if (window.sioSnapshot) applySnapshot(window.sioSnapshot);
+  socket.on('snapshot', applySnapshot);
   socket.on('esp32_temphum', data => {
     console.log('📡 Received esp32_temphum:', data);
     updateTile(data);
@@ -200,6 +220,11 @@ function initSIO(){
     if (data.mode) setModeUI(data.mode);
     if (data.fan_speed) setFanUI(data.fan_speed);
   });
+  socket.on('ac_command', data => {
+    console.log('📡 Received ac_command:', data);
+    // Results are queued server-side; only failures need the user's attention
+    if (data && !data.ok) showFlash('error', `AC ${data.action} ${data.status}${data.error ? ': ' + data.error : ''}`);
+  });
   socket.on('thermostat_status', data => {
     console.log('📡 Received thermostat_status:', data);
     if (!data) return;
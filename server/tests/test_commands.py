@@ -0,0 +1,108 @@
+import threading
+import time
+
+from app.services.ac.commands import CommandQueue
+from app.services.ac.controller import ACController
+
+
+class FakeSend:
+    """Records frames; answers from ``responses`` (last one repeats)."""
+
+    def __init__(self, *responses):
+        self.frames = []
+        self.responses = list(responses) or [{'dps': {}}]
+
+    def __call__(self, values):
+        self.frames.append(dict(values))
+        return self.responses[min(len(self.frames), len(self.responses)) - 1]
+
+
+def _run(queue: CommandQueue) -> None:
+    """Run the pending commands as the worker would, on this thread."""
+    queue._run_batch(queue._take())
+
+
+def test_coalesces_into_one_frame_last_value_wins():
+    send = FakeSend()
+    q = CommandQueue(send)
+    first = q.submit({4: 'cold'})
+    second = q.submit({4: 'wet', 5: 'low'})
+    _run(q)
+
+    assert send.frames == [{4: 'wet', 5: 'low'}]
+    assert first.status == 'superseded' and first.attempts == 0
+    assert second.status == 'done' and second.attempts == 1
+    assert q.stats()['frames'] == 1
+
+
+def test_partly_overridden_command_is_superseded():
+    send = FakeSend()
+    q = CommandQueue(send)
+    power_on = q.submit({1: True, 2: 16})
+    power_off = q.submit({1: False})
+    _run(q)
+
+    assert send.frames == [{1: False, 2: 16}]
+    assert power_on.status == 'superseded' and power_on.attempts == 1
+    assert power_off.status == 'done'
+    assert power_on.ok and power_off.ok
+
+
+def test_expired_command_times_out_unsent():
+    send = FakeSend()
+    q = CommandQueue(send)
+    cmd = q.submit({1: True}, timeout_s=0)
+    _run(q)
+
+    assert cmd.status == 'timeout' and not cmd.ok
+    assert send.frames == []
+
+
+def test_failed_frame_is_retried_then_fails():
+    send = FakeSend({'Err': '901', 'Error': 'Network Error'})
+    q = CommandQueue(send, retries=2, retry_delay_s=0)
+    results = []
+    cmd = q.submit({1: True}, on_result=lambda c: results.append(c.status))
+    _run(q)
+
+    assert cmd.status == 'failed' and cmd.error == 'Network Error'
+    assert cmd.attempts == 3 and len(send.frames) == 3
+    assert results == ['failed']
+
+
+def test_retry_succeeds():
+    send = FakeSend({'Err': '901'}, {'dps': {'1': True}})
+    q = CommandQueue(send, retries=2, retry_delay_s=0)
+    cmd = q.submit({1: True})
+    _run(q)
+
+    assert cmd.status == 'done' and cmd.attempts == 2
+    assert q.stats()['retries'] == 1
+
+
+def test_full_queue_rejects():
+    q = CommandQueue(FakeSend(), maxsize=1)
+    q.submit({1: True})
+    cmd = q.submit({1: False})
+
+    assert cmd.status == 'rejected' and cmd.wait(0)
+    assert q.stats()['pending'] == 1
+
+
+def test_set_values_times_out_when_the_send_hangs():
+    release = threading.Event()
+
+    class HangingDevice:
+        def set_multiple_values(self, data):
+            release.wait(10)
+            return {'dps': data}
+
+    ac = ACController(tinytuya_device=HangingDevice(), command_timeout_s=0.2, command_wait_slack_s=0.2)
+    try:
+        started = time.monotonic()
+        result = ac.set_values({ACController.POWER: True})
+        assert result['status'] == 'timeout' and not result['ok']
+        assert time.monotonic() - started < 2.0
+    finally:
+        release.set()
+        ac.commands.stop(wait=True)
@@ -0,0 +1,40 @@
+import threading
+
+import pytest
+
+from app.core.database import DatabaseManager
+
+
+@pytest.fixture
+def db(tmp_path):
+    DatabaseManager._instance = None
+    manager = DatabaseManager(str(tmp_path / "test.db"), group_commit_ms=50)
+    yield manager
+    manager.close()
+    DatabaseManager._instance = None
+
+
+def test_group_commit_write_then_executemany(db):
+    """transaction() must not wait on an open commit group's write lock."""
+    db.execute_query("INSERT INTO ac_events (timestamp, is_on, source) VALUES (?, ?, ?)",
+                     ("2026-01-01T00:00:00+02:00", 1, "test"))
+    # The group above is committed; open a new one and race executemany against it
+    errors = []
+
+    def grouped_write():
+        try:
+            db.execute_query("INSERT INTO ac_events (timestamp, is_on, source) VALUES (?, ?, ?)",
+                             ("2026-01-01T00:01:00+02:00", 0, "group"))
+        except Exception as e:  # pragma: no cover - reported below
+            errors.append(e)
+
+    writer = threading.Thread(target=grouped_write)
+    writer.start()
+    db.executemany("INSERT INTO ac_events (timestamp, is_on, source) VALUES (?, ?, ?)",
+                   [("2026-01-01T00:02:00+02:00", 1, "many"), ("2026-01-01T00:03:00+02:00", 0, "many")])
+    writer.join(timeout=5)
+
+    assert not writer.is_alive()
+    assert errors == []
+    assert db.fetchone("SELECT COUNT(*) AS n FROM ac_events")["n"] == 4
+
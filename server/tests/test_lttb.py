@@ -0,0 +1,48 @@
+import math
+
+import pytest
+
+from app.core.timeseries import lttb, lttb_indices
+
+
+def _wave(n: int):
+    xs = list(range(n))
+    return xs, [math.sin(i / 7.0) + (3.0 if i == n // 3 else 0.0) for i in xs]
+
+
+@pytest.mark.parametrize("threshold", [3, 10, 50, 199])
+def test_lttb_keeps_endpoints_and_threshold(threshold):
+    xs, ys = _wave(200)
+    picked = lttb_indices(xs, ys, threshold)
+
+    assert len(picked) == threshold
+    assert picked[0] == 0 and picked[-1] == len(xs) - 1
+    assert picked == sorted(set(picked))
+
+
+def test_lttb_keeps_a_spike():
+    xs, ys = _wave(200)
+    assert len(xs) // 3 in lttb_indices(xs, ys, 20)
+
+
+@pytest.mark.parametrize("n, threshold, expected", [
+    (5, 10, [0, 1, 2, 3, 4]),  # nothing to drop
+    (5, 5, [0, 1, 2, 3, 4]),
+    (2, 1, [0, 1]),
+    (5, 2, [0, 4]),
+    (5, 1, [0]),
+    (5, 0, []),
+])
+def test_lttb_small_inputs(n, threshold, expected):
+    xs = list(range(n))
+    assert lttb_indices(xs, [float(x) for x in xs], threshold) == expected
+
+
+def test_lttb_multi_metric_union():
+    items = [(i, math.sin(i / 5.0), 10.0 if i == 77 else 0.0) for i in range(300)]
+    out = lttb(items, 30, lambda it: it[0], lambda it: it[1], lambda it: it[2])
+
+    assert out[0] == items[0] and out[-1] == items[-1]
+    assert items[77] in out
+    assert len(out) <= 30
+    assert out == sorted(out)
@@ -0,0 +1,102 @@
+import json
+import random
+import time
+
+import pytest
+
+from app.services.ac.schedule import WEEKDAYS, SleepSchedule, parse_hhmm
+
+# Monday 2026-10-12 00:00 local time
+MONDAY = time.mktime((2026, 10, 12, 0, 0, 0, 0, 0, -1))
+
+
+def _at(day: int, hhmm: str) -> float:
+    h, m = map(int, hhmm.split(':'))
+    return time.mktime((2026, 10, 12 + day, h, m, 0, 0, 0, -1))
+
+
+def _legacy_is_active(now, active, start, stop, weekly):
+    """The per-call lookup the thermostat used before the interval table."""
+    if not active:
+        return False
+    lt = time.localtime(now)
+    now_m = lt.tm_hour * 60 + lt.tm_min
+
+    def window(a, b):
+        a, b = parse_hhmm(a), parse_hhmm(b)
+        if a is None or b is None or a == b:
+            return False
+        return a <= now_m < b if a < b else (now_m >= a or now_m < b)
+
+    if weekly:
+        schedule = json.loads(weekly)
+        key = WEEKDAYS[lt.tm_wday]
+        if key in schedule:
+            day = schedule.get(key) or {}
+            return window((day.get('start') or '').strip() or None, (day.get('stop') or '').strip() or None)
+    return window(start, stop)
+
+
+def _random_schedules(n: int, seed: int = 1):
+    rng = random.Random(seed)
+
+    def hhmm():
+        return rng.choice([None, f"{rng.randrange(24):02d}:{rng.choice([0, 15, 30]):02d}"])
+
+    for _ in range(n):
+        weekly = None
+        if rng.random() < 0.6:
+            days = rng.sample(WEEKDAYS, rng.randrange(8))
+            weekly = json.dumps({d: {'start': hhmm(), 'stop': hhmm()} for d in days})
+        yield rng.random() < 0.9, hhmm(), hhmm(), weekly
+
+
+@pytest.mark.parametrize("active, start, stop, weekly", list(_random_schedules(60)))
+def test_matches_legacy_lookup(active, start, stop, weekly):
+    schedule = SleepSchedule(active, start, stop, weekly)
+    for minute in range(0, 7 * 1440 + 60, 11):
+        now = MONDAY + minute * 60 + 13
+        assert schedule.is_active(now) == _legacy_is_active(now, active, start, stop, weekly), time.ctime(now)
+
+
+@pytest.mark.parametrize("active, start, stop, weekly", list(_random_schedules(60, seed=2)))
+def test_next_transition_flips_state(active, start, stop, weekly):
+    schedule = SleepSchedule(active, start, stop, weekly)
+    now = MONDAY + 3 * 86400 + 5 * 3600 + 7
+    nxt = schedule.next_transition(now)
+    if nxt is None:
+        assert schedule.is_active(now) == schedule.is_active(now + 7 * 86400)
+        return
+    state = schedule.is_active(now)
+    assert schedule.is_active(nxt - 1) == state
+    assert schedule.is_active(nxt + 1) != state
+
+
+def test_wrapping_window_belongs_to_its_day():
+    schedule = SleepSchedule(True, '23:00', '07:00',
+                             weekly=json.dumps({'tue': {'start': '01:00', 'stop': '02:00'}}))
+    assert schedule.is_active(_at(0, '23:30'))       # Monday night
+    assert not schedule.is_active(_at(1, '03:00'))   # Tuesday uses its own window
+    assert schedule.is_active(_at(1, '01:30'))
+    assert schedule.is_active(_at(2, '06:59'))       # Wednesday falls back
+
+
+def test_disabled_schedule_is_never_active():
+    schedule = SleepSchedule(False, '00:00', '23:59')
+    assert not schedule.is_active(_at(0, '12:00'))
+    assert schedule.next_transition(_at(0, '12:00')) is None
+
+
+def test_override_suppresses_until_it_expires():
+    schedule = SleepSchedule(True, '23:00', '07:00')
+    now = _at(0, '23:30')
+    schedule.suppress(now + 600, now)
+
+    assert not schedule.is_active(now)
+    assert schedule.override_until(now) == now + 600
+    assert schedule.next_transition(now) == now + 600
+
+    recompiled = SleepSchedule(True, '22:00', '07:00')
+    recompiled.copy_overrides(schedule, now)
+    assert not recompiled.is_active(now)
+    assert recompiled.is_active(now + 601)
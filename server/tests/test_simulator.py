@@ -0,0 +1,50 @@
+from app.core.models import ThermostatConf
+from app.services.ac.simulator import Replay, simulate
+
+START = 1_788_000_000.0  # fixed epoch, so sleep windows and dates never matter
+
+
+def _replay(hours: float = 6.0) -> Replay:
+    """Room warming towards 28 °C; recorded AC cools 2 °C/h between 24 and 25 °C."""
+    temp, on, last = 24.5, False, -1e9
+    readings, events = [], []
+    t = START
+    while t < START + hours * 3600:
+        temp += ((28.0 - temp) / (4 * 3600) - (2.0 / 3600 if on else 0.0)) * 30
+        if not on and temp >= 25.0 and t - last >= 300:
+            on, last = True, t
+            events.append((t, True))
+        elif on and temp <= 24.0 and t - last >= 300:
+            on, last = False, t
+            events.append((t, False))
+        readings.append((t, 'A', round(temp, 2)))
+        t += 30
+    return Replay(['A'], START, START + hours * 3600, readings, events, False)
+
+
+def _base(**kwargs) -> ThermostatConf:
+    return ThermostatConf(sleep_active=False, smooth_window=1, poll_interval_s=60, **kwargs)
+
+
+def test_simulate_replays_thermostat_cycles():
+    replay = _replay()
+    result = simulate(replay, {'target_temp': 24.5, 'pos_hysteresis': 0.5, 'neg_hysteresis': 0.5},
+                      base=_base(min_on_s=300, min_off_s=300))
+
+    assert result['hours'] == 6.0
+    assert result['recorded_cycles'] == sum(1 for _, is_on in replay.ac_events if is_on)
+    assert result['cycles'] >= 1
+    assert 0.0 < result['duty'] < 1.0
+    # Steps come from readings and the poll fallback, not from a fixed tick
+    assert result['steps'] >= 6 * 60
+    assert result['out_of_band_h'] < 1.0
+
+
+def test_simulate_respects_min_on():
+    replay = _replay()
+    short = simulate(replay, {'target_temp': 24.5}, base=_base(min_on_s=60, min_off_s=60))
+    long = simulate(replay, {'target_temp': 24.5}, base=_base(min_on_s=7200, min_off_s=7200))
+
+    # Fewer cycles, and the AC stays on for at least min_on once it started
+    assert 1 <= long['cycles'] < short['cycles']
+    assert long['runtime_h'] >= 2.0